@@ -21,6 +21,8 @@ if not os.getenv('DB_PORT'):
     os.environ['DB_PORT'] = os.getenv('DB_PORT', '3306')
 if not os.getenv('DB_NAME'):
     os.environ['DB_NAME'] = os.getenv('DB_NAME', 'jieke')
+# 脚本进程不恢复、不领取后台任务
+os.environ['JOB_RECOVERY'] = 'false'
 
 from main import app, db
 from models.user import User
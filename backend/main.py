@@ -4,9 +4,6 @@ from __future__ import annotations
 
 import base64
 import os
-import threading
-import time
-import uuid
 from io import BytesIO
 from typing import Any, Dict
 
@@ -14,10 +11,9 @@ from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from PIL import Image
-from ultralytics import YOLO
 
 from middleware import require_auth
-from models import db
+from models import AnalysisJob, db
 from routes.auth import auth_bp
 from routes.medical_images import medical_images_bp
 from routes.result_display import result_display_bp
@@ -27,7 +23,15 @@ from routes.yolo_detection import yolo_detection_bp
 from routes.video_detection import video_detection_bp
 from routes.model_comparison import model_comparison_bp
 from routes.reconstruction import reconstruction_bp
+from routes.jobs import jobs_bp
+from utils.feature_pool import configure_feature_pool
+from utils.identity_cache import configure_identity_cache
 from utils.image_processing import postprocess_results, preprocess_image
+from utils.inference_telemetry import get_inference_telemetry
+from utils.job_queue import get_job_queue, init_job_queue, register_job_handler
+from utils.metrics_sampler import init_metrics_sampler
+from utils.model_registry import configure_model_registry, get_model_registry, inference_lock
+from utils.result_cache import configure_result_cache
 
 os.environ.setdefault("KMP_DUPLICATE_LIB_OK", "TRUE")
 os.environ.setdefault("OMP_NUM_THREADS", "1")
@@ -96,11 +100,64 @@ def create_app(config_overrides: Dict[str, Any] | None = None) -> Flask:
             os.path.join(os.path.dirname(backend_root), "tumorDetection", "images", "TCGA_HT_A61A_20000127_45.tif"),
         ),
         AUTO_LOAD_MODEL=os.getenv("AUTO_LOAD_MODEL", "true").lower() == "true",
+        # 进程级模型注册表：所有已缓存模型的内存上限（MB）与首次加载预热开关
+        MODEL_REGISTRY_MAX_MB=float(os.getenv("MODEL_REGISTRY_MAX_MB", "2048")),
+        MODEL_REGISTRY_WARMUP=os.getenv("MODEL_REGISTRY_WARMUP", "true").lower() == "true",
+        # YOLO批量检测：每个mini-batch的图像数与并行解码线程数
+        YOLO_BATCH_SIZE=int(os.getenv("YOLO_BATCH_SIZE", "16")),
+        YOLO_DECODE_WORKERS=int(os.getenv("YOLO_DECODE_WORKERS", "4")),
+        # NII三维重建：UNet每次前向推理的切片数上限（内存不足时自动减半）
+        BRAIN_UNET_BATCH_SIZE=int(os.getenv("BRAIN_UNET_BATCH_SIZE", "16")),
+        # NII三维重建：跳过无脑组织的切片，只将脑部包围盒（外扩NII_ROI_MARGIN体素）送入UNet
+        NII_ROI_CROP=os.getenv("NII_ROI_CROP", "true").lower() == "true",
+        NII_ROI_MARGIN=int(os.getenv("NII_ROI_MARGIN", "8")),
+        # 网格多级细节（LOD）：请求 lod=true 时生成的各级面数比例
+        MESH_LOD_RATIOS=os.getenv("MESH_LOD_RATIOS", "1.0,0.25,0.05"),
+        # 后台任务队列：同时执行的分析任务数上限
+        JOB_WORKERS=int(os.getenv("JOB_WORKERS", "2")),
+        # 任务心跳间隔与失联超时（秒）：心跳超时的运行中任务由其他进程重新排队
+        JOB_HEARTBEAT_INTERVAL=float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10")),
+        JOB_STALE_TIMEOUT=float(os.getenv("JOB_STALE_TIMEOUT", "60")),
+        # 恢复失联/遗留的排队任务（init_db.py、migrate_db.py 等离线脚本中关闭）
+        JOB_RECOVERY=os.getenv("JOB_RECOVERY", "true").lower() == "true",
+        # 上传后台预计算（预览、默认模型分割、影像组学）；每个用户同时运行的后台任务数上限
+        UPLOAD_PRECOMPUTE=os.getenv("UPLOAD_PRECOMPUTE", "false").lower() == "true",
+        JOB_BACKGROUND_PER_USER=int(os.getenv("JOB_BACKGROUND_PER_USER", "1")),
+        # NII三维重建后对整个肿瘤体积提取3D影像组学特征
+        NII_RADIOMICS=os.getenv("NII_RADIOMICS", "true").lower() == "true",
+        # 影像组学工作进程数（3D切片块与2D特征族并行），<=1 时串行计算
+        RADIOMICS_WORKERS=int(os.getenv("RADIOMICS_WORKERS", "2")),
+        # 2D影像组学单个特征族的超时时间（秒），超时的特征族返回空结果
+        RADIOMICS_FAMILY_TIMEOUT=float(os.getenv("RADIOMICS_FAMILY_TIMEOUT", "30")),
+        # 分析结果缓存：按(文件哈希, 权重哈希, 模型类型, 阈值)缓存掩码/指标/特征，超出上限按LRU淘汰；0 表示禁用
+        RESULT_CACHE_DIR=os.getenv("RESULT_CACHE_DIR", os.path.join(backend_root, "cache", "results")),
+        RESULT_CACHE_MAX_MB=float(os.getenv("RESULT_CACHE_MAX_MB", "512")),
+        # 认证身份缓存：is_active / is_admin 标志的缓存时间（秒），0 表示每次请求都查询数据库
+        AUTH_CACHE_TTL=float(os.getenv("AUTH_CACHE_TTL", "30")),
+        # 系统监控：后台采样间隔（秒，0 表示不启动采样线程）与保留的历史样本数
+        METRICS_SAMPLE_INTERVAL=float(os.getenv("METRICS_SAMPLE_INTERVAL", "5")),
+        METRICS_HISTORY=int(os.getenv("METRICS_HISTORY", "120")),
+        # 推理遥测：/metrics（Prometheus文本格式）只允许本机访问
+        PROMETHEUS_LOCAL_ONLY=os.getenv("PROMETHEUS_LOCAL_ONLY", "true").lower() == "true",
     )
 
     if config_overrides:
         app.config.update(config_overrides)
 
+    configure_model_registry(
+        memory_budget_mb=app.config["MODEL_REGISTRY_MAX_MB"],
+        warmup=app.config["MODEL_REGISTRY_WARMUP"],
+    )
+    configure_feature_pool(
+        max_workers=app.config["RADIOMICS_WORKERS"],
+        timeout=app.config["RADIOMICS_FAMILY_TIMEOUT"],
+    )
+    configure_result_cache(
+        directory=app.config["RESULT_CACHE_DIR"],
+        max_mb=app.config["RESULT_CACHE_MAX_MB"],
+    )
+    configure_identity_cache(ttl=app.config["AUTH_CACHE_TTL"])
+
     os.makedirs(app.config["UPLOADS_DIR"], exist_ok=True)
 
     CORS(app)
@@ -109,6 +166,19 @@ def create_app(config_overrides: Dict[str, Any] | None = None) -> Flask:
 
     register_blueprints(app)
     register_core_routes(app)
+    init_job_queue(
+        app,
+        max_workers=app.config["JOB_WORKERS"],
+        background_per_user=app.config["JOB_BACKGROUND_PER_USER"],
+        heartbeat_interval=app.config["JOB_HEARTBEAT_INTERVAL"],
+        stale_timeout=app.config["JOB_STALE_TIMEOUT"],
+        recovery=app.config["JOB_RECOVERY"],
+    )
+    init_metrics_sampler(
+        app,
+        interval=app.config["METRICS_SAMPLE_INTERVAL"],
+        history=app.config["METRICS_HISTORY"],
+    )
 
     if app.config.get("AUTO_LOAD_MODEL", True):
         load_model(app)
@@ -122,6 +192,7 @@ def register_blueprints(app: Flask) -> None:
     app.register_blueprint(result_display_bp, url_prefix="/api/results")
     app.register_blueprint(user_management_bp, url_prefix="/api/admin")
     app.register_blueprint(extra_bp, url_prefix="/api")
+    app.register_blueprint(jobs_bp, url_prefix="/api/jobs")
     app.register_blueprint(video_detection_bp, url_prefix="/api/video")
     app.register_blueprint(yolo_detection_bp, url_prefix="/api/yolo")
     app.register_blueprint(model_comparison_bp, url_prefix="/api/model")
@@ -147,13 +218,14 @@ def resolve_weight_path(app: Flask, weight_path: str | None) -> str:
 
 def load_model(app: Flask) -> None:
     model_path = resolve_weight_path(app, app.config.get("MODEL_PATH"))
+    registry = get_model_registry()
     try:
         app.logger.info(f"Loading YOLO model from {model_path}")
-        app.extensions["yolo_model"] = YOLO(model_path)
+        app.extensions["yolo_model"] = registry.get(model_path, "yolo")
     except Exception:
         app.logger.warning("Fallback to ultralytics default segmentation model")
         # 使用分割模型而非检测模型
-        app.extensions["yolo_model"] = YOLO("yolov8n-seg.pt")
+        app.extensions["yolo_model"] = registry.get("yolov8n-seg.pt", "yolo")
 
 
 def get_model(app: Flask):
@@ -164,8 +236,6 @@ def get_model(app: Flask):
 # 核心路由注册
 # -----------------------------
 def register_core_routes(app: Flask) -> None:
-    seg_jobs: Dict[str, Dict[str, Any]] = {}
-
     # 统一的uploads静态文件服务
     @app.route("/uploads/<path:subpath>/<path:filename>")
     def serve_uploads(subpath: str, filename: str):
@@ -210,50 +280,58 @@ def register_core_routes(app: Flask) -> None:
     def health_check():
         return jsonify({"status": "healthy", "model_loaded": get_model(app) is not None})
 
-    def run_segmentation_job(job_id: str, cfg: dict):
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        if app.config.get("PROMETHEUS_LOCAL_ONLY", True) and request.remote_addr not in ("127.0.0.1", "::1"):
+            return jsonify({"error": "仅允许本机访问"}), 403
+        return app.response_class(
+            get_inference_telemetry().prometheus_text(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+    @register_job_handler("segmentation")
+    def run_segmentation_job(ctx):
+        cfg = ctx.params
+        ctx.update(1, "加载模型", force=True)
+        weight_path = resolve_weight_path(app, cfg.get("weightPath"))
+        conf = float(cfg.get("conf", 0.25))
+        registry = get_model_registry()
         try:
-            seg_jobs[job_id] = {"progress": 1, "status": "running"}
-            weight_path = resolve_weight_path(app, cfg.get("weightPath"))
-            conf = float(cfg.get("conf", 0.25))
-            try:
-                yolo = YOLO(weight_path)
-            except Exception:
-                fallback = app.config.get("MODEL_PATH")
-                yolo = YOLO(fallback if fallback and os.path.exists(fallback) else "yolov8n.pt")
-
-            sample_image = app.config.get("SAMPLE_IMAGE")
-            for p in [10, 25, 40, 60, 80]:
-                seg_jobs[job_id]["progress"] = p
-                time.sleep(0.5)
-            if sample_image and os.path.exists(sample_image):
-                img = Image.open(sample_image)
-                _ = yolo(img)
-            seg_jobs[job_id]["progress"] = 100
-            seg_jobs[job_id]["status"] = "done"
-        except Exception as exc:
-            seg_jobs[job_id] = {"progress": 0, "status": "error", "error": str(exc)}
+            yolo = registry.get(weight_path, "yolo")
+        except Exception:
+            fallback = app.config.get("MODEL_PATH")
+            yolo = registry.get(fallback if fallback and os.path.exists(fallback) else "yolov8n.pt", "yolo")
+
+        sample_image = app.config.get("SAMPLE_IMAGE")
+        ctx.update(40, "执行分割", force=True)
+        if sample_image and os.path.exists(sample_image):
+            img = Image.open(sample_image)
+            with inference_lock(yolo):
+                results = yolo(img, conf=conf)
+            get_inference_telemetry().record_ultralytics("yolo", yolo, results)
+        return {"status": "done"}, 200
 
     @app.route("/segmentation/start", methods=["POST"])
     def segmentation_start():
         try:
             cfg = request.get_json() or {}
-            job_id = uuid.uuid4().hex
-            t = threading.Thread(target=run_segmentation_job, args=(job_id, cfg), daemon=True)
-            t.start()
-            return jsonify({"id": job_id})
+            job = get_job_queue().submit("segmentation", cfg)
+            return jsonify({"id": job.id})
         except Exception as exc:
             return jsonify({"error": f"启动失败: {str(exc)}"}), 500
 
     @app.route("/segmentation/<job_id>/progress", methods=["GET"])
     def segmentation_progress(job_id: str):
-        info = seg_jobs.get(job_id)
-        if not info:
+        job = AnalysisJob.query.get(job_id)
+        if not job or job.job_type != "segmentation":
             return jsonify({"progress": 0, "status": "unknown"}), 404
+        # 保持旧接口的状态取值: running / done / error
+        status = {"completed": "done", "failed": "error", "cancelled": "error"}.get(job.status, "running")
         return jsonify(
             {
-                "progress": info.get("progress", 0),
-                "status": info.get("status", "running"),
-                "error": info.get("error"),
+                "progress": job.progress or 0,
+                "status": status,
+                "error": job.error or ("任务已取消" if job.status == "cancelled" else None),
             }
         )
 
@@ -279,7 +357,9 @@ def register_core_routes(app: Flask) -> None:
             if model is None:
                 return jsonify({"error": "模型未加载"}), 500
 
-            results = model(processed_image)
+            with inference_lock(model):
+                results = model(processed_image)
+            get_inference_telemetry().record_ultralytics("yolo", model, results)
             processed_results = postprocess_results(results)
             return jsonify({"message": "检测完成", "results": processed_results})
         except Exception as exc:
@@ -305,14 +385,18 @@ def register_core_routes(app: Flask) -> None:
             if model is None:
                 return jsonify({"error": "模型未加载"}), 500
 
-            results = model(processed_image)
+            with inference_lock(model):
+                results = model(processed_image)
+            get_inference_telemetry().record_ultralytics("yolo", model, results)
             processed_results = postprocess_results(results)
             return jsonify({"message": "检测完成", "results": processed_results})
         except Exception as exc:
             return jsonify({"error": f"检测时出错: {str(exc)}"}), 500
 
 
-app = create_app()
+# multiprocessing 的 forkserver/spawn 子进程以 __mp_main__ 名义重新执行入口脚本，此时不创建应用
+if __name__ != "__mp_main__":
+    app = create_app()
 
 
 if __name__ == "__main__":
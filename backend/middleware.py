@@ -2,7 +2,9 @@
 from functools import wraps
 from flask import jsonify
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from werkzeug.local import LocalProxy
 from models.user import User, db
+from utils.identity_cache import get_identity_cache
 
 def get_current_user():
     """获取当前认证用户"""
@@ -15,6 +17,10 @@ def get_current_user():
         return User.query.get(current_user_id)
     return None
 
+def _current_user_proxy(user_id):
+    """当前用户的延迟加载代理：视图函数实际访问用户属性时才查询数据库"""
+    return LocalProxy(lambda: User.query.get(user_id))
+
 def require_auth(f):
     """
     需要认证的装饰器
@@ -23,10 +29,10 @@ def require_auth(f):
     def decorated_function(*args, **kwargs):
         try:
             verify_jwt_in_request()
-            current_user = get_current_user()
-            if not current_user or not current_user.is_active:
+            identity = get_identity_cache().get(get_jwt_identity())
+            if not identity or not identity.is_active:
                 return jsonify({'message': '用户未激活或不存在'}), 403
-            return f(current_user, *args, **kwargs)
+            return f(_current_user_proxy(identity.id), *args, **kwargs)
         except Exception as e:
             return jsonify({'message': '认证失败', 'error': str(e)}), 401
     return decorated_function
@@ -39,10 +45,10 @@ def require_admin(f):
     def decorated_function(*args, **kwargs):
         try:
             verify_jwt_in_request()
-            current_user = get_current_user()
-            if not current_user or not current_user.is_active or not current_user.is_admin:
+            identity = get_identity_cache().get(get_jwt_identity())
+            if not identity or not identity.is_active or not identity.is_admin:
                 return jsonify({'message': '需要管理员权限'}), 403
-            return f(current_user, *args, **kwargs)
+            return f(_current_user_proxy(identity.id), *args, **kwargs)
         except Exception as e:
             return jsonify({'message': '认证失败', 'error': str(e)}), 401
     return decorated_function
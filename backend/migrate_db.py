@@ -0,0 +1,164 @@
+"""数据库迁移脚本 - 将已有数据库升级到当前模型结构（可重复执行）
+
+1. db.create_all() 只创建缺失的表，不会给已存在的表添加列和索引；
+   本脚本对比模型定义与数据库中已有的列和索引，添加缺失的（可空）列并创建缺失的索引。
+2. 旧版 medical_images 表中的 yolo_* / unet_* 检测结果列迁移为 detection_runs 记录
+   （旧列保留不删除，确认数据无误后可手动删除）。
+
+大表建索引耗时较长，请在业务低峰期运行：python migrate_db.py
+"""
+
+import os
+import sys
+
+# 从.env文件中读取配置
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+# 脚本进程不恢复、不领取后台任务
+os.environ['JOB_RECOVERY'] = 'false'
+
+from sqlalchemy import MetaData, Table, inspect, select, text
+
+from main import app, db
+from models.detection_run import DetectionRun
+
+# 每批写入的迁移记录数
+BATCH_SIZE = 1000
+
+
+def migrate_columns():
+    """给已存在的表添加模型中新增的列（只支持可空列），返回新增的 表.列 列表"""
+    added = []
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = db.engine.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                print(f'[警告] 跳过非空列 {table.name}.{column.name}，请手动迁移')
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            print(f'添加列 {table.name}.{column.name} ({column_type}) ...')
+            with db.engine.begin() as conn:
+                conn.execute(text(
+                    f'ALTER TABLE {preparer.quote(table.name)} '
+                    f'ADD COLUMN {preparer.quote(column.name)} {column_type}'
+                ))
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def migrate_indexes():
+    """创建模型中定义但数据库中缺失的索引，返回新建的索引名列表"""
+    created = []
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            columns = ', '.join(column.name for column in index.columns)
+            print(f'创建索引 {index.name} ON {table.name} ({columns}) ...')
+            index.create(bind=db.engine)
+            created.append(index.name)
+    return created
+
+
+def migrate_detection_runs():
+    """
+    把旧版宽表中的检测结果迁移为 detection_runs 记录（每个影像每个模型一条）
+
+    只迁移 <model>_total_pixels 非空（确实运行过检测）且尚无该模型检测记录的影像。
+
+    Returns:
+        {模型类型: 迁移条数}
+    """
+    legacy_columns = {column['name'] for column in inspect(db.engine).get_columns('medical_images')}
+    table = None
+    migrated = {}
+    for model_type, fields in DetectionRun.LEGACY_FIELDS.items():
+        present = [name for name in fields if f'{model_type}_{name}' in legacy_columns]
+        if f'{model_type}_total_pixels' not in legacy_columns:
+            continue
+        if table is None:
+            table = Table('medical_images', MetaData(), autoload_with=db.engine)
+
+        migrated_ids = select(DetectionRun.image_id).where(DetectionRun.model_type == model_type)
+        query = select(
+            table.c.id, table.c.updated_at, *(table.c[f'{model_type}_{name}'] for name in present)
+        ).where(
+            table.c[f'{model_type}_total_pixels'].isnot(None),
+            table.c.id.notin_(migrated_ids)
+        )
+
+        count = 0
+        for row in db.session.execute(query).mappings().all():
+            db.session.add(DetectionRun(
+                image_id=row['id'],
+                model_type=model_type,
+                source='legacy',
+                created_at=row['updated_at'],
+                **{name: row[f'{model_type}_{name}'] for name in present}
+            ))
+            count += 1
+            if count % BATCH_SIZE == 0:
+                db.session.commit()
+        db.session.commit()
+        print(f'迁移 {model_type.upper()} 检测结果 {count} 条')
+        migrated[model_type] = count
+    return migrated
+
+
+def migrate_database():
+    with app.app_context():
+        print('=' * 60)
+        print('数据库迁移')
+        print('=' * 60)
+        print(f'数据库URL: {app.config["SQLALCHEMY_DATABASE_URI"]}')
+        print()
+
+        # 新增的表直接创建（含索引）
+        db.create_all()
+
+        added = migrate_columns()
+        if added:
+            print(f'[成功] 新增列 {len(added)} 个')
+        else:
+            print('[成功] 列已是最新')
+
+        created = migrate_indexes()
+        if created:
+            print(f'[成功] 新建索引 {len(created)} 个')
+        else:
+            print('[成功] 索引已是最新')
+
+        migrated = migrate_detection_runs()
+        if migrated:
+            print(f'[成功] 旧版检测结果迁移完成: {migrated}')
+
+        print()
+        print('=' * 60)
+        print('[成功] 数据库迁移完成')
+        print('=' * 60)
+
+
+if __name__ == '__main__':
+    try:
+        migrate_database()
+    except Exception as e:
+        print(f'[错误] 迁移失败: {e}', file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
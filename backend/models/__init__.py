@@ -5,5 +5,7 @@ db = SQLAlchemy()
 
 from .user import User
 from .medical_image import MedicalImage, Dataset
+from .analysis_job import AnalysisJob
+from .detection_run import DetectionRun
 
-__all__ = ['db', 'User', 'MedicalImage', 'Dataset']
\ No newline at end of file
+__all__ = ['db', 'User', 'MedicalImage', 'Dataset', 'AnalysisJob', 'DetectionRun']
\ No newline at end of file
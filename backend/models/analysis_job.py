@@ -0,0 +1,59 @@
+from . import db  # 从同级目录的__init__.py导入db
+from datetime import datetime
+import json
+try:
+    from sqlalchemy.dialects.mysql import LONGTEXT as MYSQL_LONGTEXT
+except Exception:
+    MYSQL_LONGTEXT = None
+
+
+class AnalysisJob(db.Model):
+    """后台分析任务（分割、NII重建、视频检测等耗时操作）"""
+    __tablename__ = 'analysis_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    job_type = db.Column(db.String(50), nullable=False, index=True)
+    # 状态: queued, running, completed, failed, cancelled
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    progress = db.Column(db.Float, default=0.0)  # 0-100
+    message = db.Column(db.String(255))  # 当前阶段描述
+    params = db.Column(db.Text)  # 任务参数JSON（重启后据此重新执行）
+    result = db.Column(db.Text().with_variant(MYSQL_LONGTEXT, 'mysql') if MYSQL_LONGTEXT else db.Text)
+    result_status = db.Column(db.Integer)  # 与同步接口一致的HTTP状态码
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    attempts = db.Column(db.Integer, default=0)
+    # 执行该任务的进程（主机:PID:随机后缀）与其最近一次心跳；心跳超时的运行中任务会被重新排队
+    worker_id = db.Column(db.String(64))
+    heartbeat_at = db.Column(db.DateTime)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def get_params(self):
+        return json.loads(self.params) if self.params else {}
+
+    def get_result(self):
+        return json.loads(self.result) if self.result else None
+
+    def to_dict(self):
+        """将任务对象转换为字典（不含结果正文）"""
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress': round(self.progress or 0.0, 1),
+            'message': self.message,
+            'error': self.error,
+            'cancel_requested': bool(self.cancel_requested),
+            'attempts': self.attempts,
+            'has_result': self.result is not None,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<AnalysisJob {self.id} {self.job_type} {self.status}>'
@@ -0,0 +1,123 @@
+from . import db  # 从同级目录的__init__.py导入db
+from datetime import datetime
+try:
+    from sqlalchemy.dialects.mysql import LONGTEXT as MYSQL_LONGTEXT
+except Exception:
+    MYSQL_LONGTEXT = None
+
+
+class DetectionRun(db.Model):
+    """单次模型检测结果（每个影像、每个模型、每次运行一行，保留历史）"""
+    __tablename__ = 'detection_runs'
+    __table_args__ = (
+        # 查询某影像某模型的最新结果 / 历史记录
+        db.Index('ix_detection_runs_image_model', 'image_id', 'model_type', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    image_id = db.Column(db.Integer, db.ForeignKey('medical_images.id'), nullable=False)
+    model_type = db.Column(db.String(20), nullable=False)  # 'yolo' 或 'unet'
+    model_version = db.Column(db.String(50))
+    source = db.Column(db.String(50))  # 产生结果的接口: detection, analysis, comparison, legacy
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 基础检测信息
+    has_tumor = db.Column(db.Boolean, default=False)
+    num_instances = db.Column(db.Integer, default=0)
+    avg_confidence = db.Column(db.Float)  # 平均置信度 (0-1)
+    tumor_ratio = db.Column(db.Float)  # 肿瘤占脑区面积比例 (%)
+    tumor_pixels = db.Column(db.Integer)
+    total_pixels = db.Column(db.Integer)
+
+    # 分割掩码相关
+    mask_path = db.Column(db.String(500))
+    mask_overlay_path = db.Column(db.String(500))
+
+    # 肿瘤位置和几何特征
+    tumor_centroid_x = db.Column(db.Float)
+    tumor_centroid_y = db.Column(db.Float)
+    tumor_bbox_x1 = db.Column(db.Float)
+    tumor_bbox_y1 = db.Column(db.Float)
+    tumor_bbox_x2 = db.Column(db.Float)
+    tumor_bbox_y2 = db.Column(db.Float)
+
+    # 术前评估
+    risk_level = db.Column(db.String(50))  # 'low', 'medium', 'high'
+    surgical_accessibility = db.Column(db.String(50))  # 'easy', 'moderate', 'difficult'
+    proximity_to_vessels = db.Column(db.Float)  # 与血管的最小距离 (mm)
+    proximity_to_eloquent_area = db.Column(db.Float)  # 与言语功能区的距离 (mm)
+
+    # 检测质量评估
+    segmentation_quality = db.Column(db.Float)  # 分割质量评分 (0-1)
+    inference_time = db.Column(db.Float)  # 推理耗时 (秒)
+
+    # 大文本字段（JSON字符串），按需加载：query.options(db.undefer_group('blobs'))
+    instances = db.deferred(db.Column(db.Text().with_variant(MYSQL_LONGTEXT, 'mysql') if MYSQL_LONGTEXT else db.Text),
+                            group='blobs')
+    location_description = db.deferred(db.Column(db.Text), group='blobs')
+    diagnostic_report = db.deferred(db.Column(db.Text), group='blobs')
+
+    image = db.relationship('MedicalImage', backref=db.backref(
+        'detection_runs', lazy='dynamic', cascade='all, delete-orphan'))
+
+    # 旧版 medical_images 宽表中 <model_type>_<字段> 列对应的结果字段（MedicalImage.to_dict 兼容视图）
+    LEGACY_FIELDS = {
+        'yolo': (
+            'has_tumor', 'num_instances', 'avg_confidence', 'tumor_ratio', 'tumor_pixels', 'total_pixels',
+            'instances', 'mask_path', 'mask_overlay_path', 'tumor_centroid_x', 'tumor_centroid_y',
+            'tumor_bbox_x1', 'tumor_bbox_y1', 'tumor_bbox_x2', 'tumor_bbox_y2', 'risk_level',
+            'surgical_accessibility', 'location_description', 'proximity_to_vessels',
+            'proximity_to_eloquent_area', 'segmentation_quality', 'model_version', 'inference_time',
+            'diagnostic_report'
+        ),
+        'unet': (
+            'has_tumor', 'num_instances', 'avg_confidence', 'tumor_ratio', 'tumor_pixels', 'total_pixels',
+            'instances', 'mask_path', 'mask_overlay_path', 'tumor_centroid_x', 'tumor_centroid_y',
+            'tumor_bbox_x1', 'tumor_bbox_y1', 'tumor_bbox_x2', 'tumor_bbox_y2', 'risk_level',
+            'surgical_accessibility', 'location_description', 'model_version'
+        )
+    }
+
+    # 没有检测记录时旧版字段的默认值
+    LEGACY_DEFAULTS = {'has_tumor': False, 'num_instances': 0}
+
+    @classmethod
+    def legacy_view(cls, run, model_type):
+        """按旧版宽表字段名（yolo_has_tumor 等）展开检测结果，run为None时返回默认值"""
+        return {
+            f'{model_type}_{name}': getattr(run, name) if run is not None else cls.LEGACY_DEFAULTS.get(name)
+            for name in cls.LEGACY_FIELDS[model_type]
+        }
+
+    def to_dict(self):
+        """将检测记录转换为字典（不含大文本字段）"""
+        return {
+            'id': self.id,
+            'image_id': self.image_id,
+            'model_type': self.model_type,
+            'model_version': self.model_version,
+            'source': self.source,
+            'has_tumor': self.has_tumor,
+            'num_instances': self.num_instances,
+            'avg_confidence': self.avg_confidence,
+            'tumor_ratio': self.tumor_ratio,
+            'tumor_pixels': self.tumor_pixels,
+            'total_pixels': self.total_pixels,
+            'mask_path': self.mask_path,
+            'mask_overlay_path': self.mask_overlay_path,
+            'centroid': {'x': self.tumor_centroid_x, 'y': self.tumor_centroid_y},
+            'bbox': {
+                'x1': self.tumor_bbox_x1,
+                'y1': self.tumor_bbox_y1,
+                'x2': self.tumor_bbox_x2,
+                'y2': self.tumor_bbox_y2
+            },
+            'risk_level': self.risk_level,
+            'surgical_accessibility': self.surgical_accessibility,
+            'segmentation_quality': self.segmentation_quality,
+            'inference_time': self.inference_time,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<DetectionRun {self.id} image={self.image_id} {self.model_type}>'
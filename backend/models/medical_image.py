@@ -1,6 +1,8 @@
 from . import db  # 从同级目录的__init__.py导入db
 from datetime import datetime
+import json
 import os
+from .detection_run import DetectionRun
 try:
     from sqlalchemy.dialects.mysql import LONGTEXT as MYSQL_LONGTEXT
 except Exception:
@@ -8,7 +10,20 @@ except Exception:
 
 class MedicalImage(db.Model):
     __tablename__ = 'medical_images'
-    
+    # 复合索引：与按用户过滤、按上传时间倒序（id为同一时间的次序）列出影像的查询一致
+    # 已有数据库通过 migrate_db.py 补建
+    __table_args__ = (
+        # 影像列表默认排序与游标分页
+        db.Index('ix_medical_images_owner_uploaded', 'uploaded_by', 'uploaded_at', 'id'),
+        # NII重建文件列表（last_model_used = 'nii_reconstruction'）
+        db.Index('ix_medical_images_owner_model_uploaded', 'uploaded_by', 'last_model_used', 'uploaded_at'),
+        # 按模态 / 是否检出肿瘤过滤的列表
+        db.Index('ix_medical_images_owner_modality_uploaded', 'uploaded_by', 'modality', 'uploaded_at'),
+        db.Index('ix_medical_images_owner_tumor_uploaded', 'uploaded_by', 'tumor_detected', 'uploaded_at'),
+        # 按患者过滤
+        db.Index('ix_medical_images_owner_patient', 'uploaded_by', 'patient_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
@@ -23,18 +38,20 @@ class MedicalImage(db.Model):
     patient_name = db.Column(db.String(255))
     age = db.Column(db.Integer)
     gender = db.Column(db.String(20))
-    diagnosis = db.Column(db.Text)
+    diagnosis = db.deferred(db.Column(db.Text), group='results')
     status = db.Column(db.String(50), default='new')  # 状态: new, processing, completed
     
     # 检测结果字段
-    detection_results = db.Column(db.Text)
+    # 大文本结果字段延迟加载（group='results'），归属校验等普通查询不读取
+    detection_results = db.deferred(db.Column(db.Text), group='results')
     # Use db.Text with a MySQL LONGTEXT variant when available to avoid
     # SQLite compilation errors (SQLite doesn't know LONGTEXT)
-    detection_result = db.Column(db.Text().with_variant(MYSQL_LONGTEXT, 'mysql') if MYSQL_LONGTEXT else db.Text)
+    detection_result = db.deferred(db.Column(db.Text().with_variant(MYSQL_LONGTEXT, 'mysql') if MYSQL_LONGTEXT else db.Text),
+                                   group='results')
     tumor_detected = db.Column(db.Boolean, default=False)
     confidence_score = db.Column(db.Float)
     segmentation_mask_path = db.Column(db.String(500))
-    annotation_data = db.Column(db.Text)
+    annotation_data = db.deferred(db.Column(db.Text), group='results')
     is_annotated = db.Column(db.Boolean, default=False)
     is_validated = db.Column(db.Boolean, default=False)
     
@@ -44,81 +61,13 @@ class MedicalImage(db.Model):
     max_diameter = db.Column(db.Float)  # 最大直径 (mm)
     
     # 影像组学特征
-    radiomics_features = db.Column(db.Text)  # 影像组学特征JSON字符串
+    radiomics_features = db.deferred(db.Column(db.Text), group='results')  # 影像组学特征JSON字符串
     
     # 手术规划
-    surgical_plan = db.Column(db.Text)  # 手术规划JSON字符串
-    
-    # ========== YOLO11脑肿瘤检测结果字段 ==========
-    # 基础检测信息
-    yolo_has_tumor = db.Column(db.Boolean, default=False)  # 是否检测到肿瘤
-    yolo_num_instances = db.Column(db.Integer, default=0)  # 检测到的肿瘤实例数
-    yolo_avg_confidence = db.Column(db.Float)  # 平均置信度 (0-1)
-    yolo_tumor_ratio = db.Column(db.Float)  # 肿瘤占脑区面积比例 (%)
-    yolo_tumor_pixels = db.Column(db.Integer)  # 肿瘤像素数
-    yolo_total_pixels = db.Column(db.Integer)  # 总像素数
-    
-    # 实例级别信息 (JSON格式，存储每个检测实例的详细信息)
-    yolo_instances = db.Column(db.Text().with_variant(MYSQL_LONGTEXT, 'mysql') if MYSQL_LONGTEXT else db.Text)
-    
-    # 分割掩码相关
-    yolo_mask_path = db.Column(db.String(500))  # 分割掩码路径
-    yolo_mask_overlay_path = db.Column(db.String(500))  # 掩码叠加图路径
-    
-    # 肿瘤位置和几何特征
-    yolo_tumor_centroid_x = db.Column(db.Float)  # 肿瘤中心X坐标
-    yolo_tumor_centroid_y = db.Column(db.Float)  # 肿瘤中心Y坐标
-    yolo_tumor_bbox_x1 = db.Column(db.Float)  # 外接矩形左上角X
-    yolo_tumor_bbox_y1 = db.Column(db.Float)  # 外接矩形左上角Y
-    yolo_tumor_bbox_x2 = db.Column(db.Float)  # 外接矩形右下角X
-    yolo_tumor_bbox_y2 = db.Column(db.Float)  # 外接矩形右下角Y
-    
-    # 术前规划相关字段
-    yolo_risk_level = db.Column(db.String(50))  # 风险等级: 'low', 'medium', 'high'
-    yolo_surgical_accessibility = db.Column(db.String(50))  # 手术可达性: 'easy', 'moderate', 'difficult'
-    yolo_location_description = db.Column(db.Text)  # 肿瘤位置描述
-    yolo_proximity_to_vessels = db.Column(db.Float)  # 与血管的最小距离 (mm)
-    yolo_proximity_to_eloquent_area = db.Column(db.Float)  # 与言语功能区的距离 (mm)
-    
-    # 检测质量评估
-    yolo_segmentation_quality = db.Column(db.Float)  # 分割质量评分 (0-1)
-    yolo_model_version = db.Column(db.String(50))  # 使用的YOLO模型版本
-    yolo_inference_time = db.Column(db.Float)  # 推理耗时 (秒)
-    
-    # 诊断建议
-    yolo_diagnostic_report = db.Column(db.Text)  # 诊断报告 (JSON)
-    
-    # ========== UNet脑肿瘤检测结果字段 ==========
-    # 基础检测信息
-    unet_has_tumor = db.Column(db.Boolean, default=False)  # 是否检测到肿瘤
-    unet_num_instances = db.Column(db.Integer, default=0)  # 检测到的肿瘤实例数
-    unet_avg_confidence = db.Column(db.Float)  # 平均置信度 (0-1)
-    unet_tumor_ratio = db.Column(db.Float)  # 肿瘤占脑区面积比例 (%)
-    unet_tumor_pixels = db.Column(db.Integer)  # 肿瘤像素数
-    unet_total_pixels = db.Column(db.Integer)  # 总像素数
-    
-    # 实例级别信息
-    unet_instances = db.Column(db.Text)
-    
-    # 分割掩码相关
-    unet_mask_path = db.Column(db.String(500))  # 分割掩码路径
-    unet_mask_overlay_path = db.Column(db.String(500))  # 掩码叠加图路径
-    
-    # 肿瘤位置信息
-    unet_tumor_centroid_x = db.Column(db.Float)  # 肿瘤中心X坐标
-    unet_tumor_centroid_y = db.Column(db.Float)  # 肿瘤中心Y坐标
-    unet_tumor_bbox_x1 = db.Column(db.Float)  # 外接矩形左上角X
-    unet_tumor_bbox_y1 = db.Column(db.Float)  # 外接矩形左上角Y
-    unet_tumor_bbox_x2 = db.Column(db.Float)  # 外接矩形右下角X
-    unet_tumor_bbox_y2 = db.Column(db.Float)  # 外接矩形右下角Y
-    
-    # 临床评估
-    unet_risk_level = db.Column(db.String(50))  # 风险等级: 'low', 'medium', 'high'
-    unet_surgical_accessibility = db.Column(db.String(50))  # 手术可达性: 'easy', 'moderate', 'difficult'
-    unet_location_description = db.Column(db.Text)  # 肿瘤位置描述
+    surgical_plan = db.deferred(db.Column(db.Text), group='results')  # 手术规划JSON字符串
     
-    # 检测质量评估
-    unet_model_version = db.Column(db.String(50))  # 使用的UNet模型版本
+    # YOLO / UNet 的逐次检测结果保存在 detection_runs 表（DetectionRun），
+    # to_dict 中的 yolo_* / unet_* 字段由各模型最新一次结果生成
     
     # 记录最后使用的模型
     last_model_used = db.Column(db.String(20))  # 'yolo' 或 'unet'
@@ -129,9 +78,141 @@ class MedicalImage(db.Model):
     
     # 关系
     user = db.relationship('User', backref=db.backref('medical_images', lazy=True))
-    
-    def to_dict(self):
-        """将医学影像对象转换为字典"""
+
+    # 列表页所需的列（列表查询只加载这些列，大文本字段延迟加载）
+    LIST_COLUMNS = (
+        'id', 'filename', 'original_filename', 'filepath', 'file_size', 'mime_type',
+        'patient_id', 'patient_name', 'age', 'gender', 'scan_date', 'modality', 'body_part',
+        'status', 'tumor_detected', 'confidence_score', 'is_annotated', 'is_validated',
+        'last_model_used', 'uploaded_at', 'updated_at', 'uploaded_by'
+    )
+
+    # 检测/分析结果的大文本字段（JSON字符串），通过详情接口单独获取
+    DETAIL_COLUMNS = (
+        'detection_results', 'detection_result', 'annotation_data', 'radiomics_features',
+        'surgical_plan', 'diagnosis'
+    )
+    # 详情接口中来自最新检测记录的字段：旧版字段名 -> (模型类型, DetectionRun字段)
+    DETAIL_RUN_FIELDS = {
+        'yolo_instances': ('yolo', 'instances'),
+        'yolo_diagnostic_report': ('yolo', 'diagnostic_report'),
+        'yolo_location_description': ('yolo', 'location_description'),
+        'unet_instances': ('unet', 'instances'),
+        'unet_location_description': ('unet', 'location_description'),
+    }
+
+    @classmethod
+    def list_load_options(cls):
+        """列表查询的列投影选项：query.options(*MedicalImage.list_load_options())"""
+        from sqlalchemy.orm import load_only
+        return [load_only(*(getattr(cls, name) for name in cls.LIST_COLUMNS))]
+
+    def to_list_dict(self):
+        """列表页使用的精简字典（只访问 LIST_COLUMNS 中的列，不触发延迟字段加载）"""
+        thumbnail_url = self.thumbnail_url()
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'original_filename': self.original_filename,
+            'file_url': self.file_url,
+            # 列表页使用小尺寸缩略图作为预览
+            'preview_url': thumbnail_url,
+            'thumbnail_url': thumbnail_url,
+            'file_size': self.file_size,
+            'mime_type': self.mime_type,
+            'patient_id': self.patient_id,
+            'patient_name': self.patient_name,
+            'age': self.age,
+            'gender': self.gender,
+            'scan_date': self.scan_date.isoformat() if self.scan_date else None,
+            'modality': self.modality,
+            'body_part': self.body_part,
+            'status': self.status or 'new',
+            'tumor_detected': self.tumor_detected,
+            'confidence_score': self.confidence_score,
+            'is_annotated': self.is_annotated,
+            'is_validated': self.is_validated,
+            'last_model_used': self.last_model_used,
+            'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'uploaded_by': self.uploaded_by
+        }
+
+    def to_detail_dict(self, fields=None):
+        """
+        大文本结果字段（JSON字符串解析为对象，无法解析时保留原字符串）
+
+        Args:
+            fields: 需要返回的字段名列表，None表示 DETAIL_COLUMNS 与 DETAIL_RUN_FIELDS 全部
+        """
+        result = {'id': self.id}
+        runs = {}
+        for name in fields or (*self.DETAIL_COLUMNS, *self.DETAIL_RUN_FIELDS):
+            if name in self.DETAIL_RUN_FIELDS:
+                model_type, run_field = self.DETAIL_RUN_FIELDS[name]
+                if model_type not in runs:
+                    runs[model_type] = self.latest_run(model_type, with_blobs=True)
+                value = getattr(runs[model_type], run_field, None)
+            else:
+                value = getattr(self, name)
+            if isinstance(value, str) and value[:1] in ('{', '['):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            result[name] = value
+        return result
+
+    def latest_run(self, model_type, with_blobs=False):
+        """
+        指定模型最新一次检测记录（没有时返回None）
+
+        Args:
+            with_blobs: 是否同时加载实例/诊断报告等大文本字段
+        """
+        query = self.detection_runs.filter_by(model_type=model_type)
+        if with_blobs:
+            query = query.options(db.undefer_group('blobs'))
+        return query.order_by(DetectionRun.id.desc()).first()
+
+    @classmethod
+    def latest_runs(cls, images, model_types=('yolo', 'unet'), with_blobs=False):
+        """
+        批量读取多个影像各模型的最新检测记录（一次查询，用于列表页）
+
+        Args:
+            images: 影像对象列表
+            model_types: 需要的模型类型
+            with_blobs: 是否同时加载实例/诊断报告等大文本字段
+
+        Returns:
+            {影像id: {模型类型: DetectionRun}}，没有检测记录的模型不在字典中
+        """
+        image_ids = [image.id for image in images]
+        runs = {image_id: {} for image_id in image_ids}
+        if not image_ids:
+            return runs
+        latest_ids = db.session.query(db.func.max(DetectionRun.id)).filter(
+            DetectionRun.image_id.in_(image_ids),
+            DetectionRun.model_type.in_(model_types)
+        ).group_by(DetectionRun.image_id, DetectionRun.model_type)
+        query = DetectionRun.query.filter(DetectionRun.id.in_(latest_ids.scalar_subquery()))
+        if with_blobs:
+            query = query.options(db.undefer_group('blobs'))
+        for run in query:
+            runs[run.image_id][run.model_type] = run
+        return runs
+
+    def to_dict(self, runs=None):
+        """
+        将医学影像对象转换为字典
+
+        Args:
+            runs: 预先读取的各模型最新检测记录 {模型类型: DetectionRun}（见 latest_runs），
+                  None 时逐个查询
+        """
+        if runs is None:
+            runs = {model_type: self.latest_run(model_type, with_blobs=True) for model_type in ('yolo', 'unet')}
         return {
             'id': self.id,
             'filename': self.filename,
@@ -139,6 +220,7 @@ class MedicalImage(db.Model):
             'filepath': self.filepath,
             'file_url': self.file_url,
             'preview_url': self.preview_url,
+            'thumbnail_url': self.thumbnail_url(),
             'file_size': self.file_size,
             'mime_type': self.mime_type,
             'patient_id': self.patient_id,
@@ -164,54 +246,12 @@ class MedicalImage(db.Model):
             'max_diameter': self.max_diameter,
             'radiomics_features': self.radiomics_features,
             'surgical_plan': self.surgical_plan,
-            # YOLO11检测结果
-            'yolo_has_tumor': self.yolo_has_tumor,
-            'yolo_num_instances': self.yolo_num_instances,
-            'yolo_avg_confidence': self.yolo_avg_confidence,
-            'yolo_tumor_ratio': self.yolo_tumor_ratio,
-            'yolo_tumor_pixels': self.yolo_tumor_pixels,
-            'yolo_total_pixels': self.yolo_total_pixels,
-            'yolo_instances': self.yolo_instances,
-            'yolo_mask_path': self.yolo_mask_path,
-            'yolo_mask_overlay_path': self.yolo_mask_overlay_path,
-            'yolo_tumor_centroid_x': self.yolo_tumor_centroid_x,
-            'yolo_tumor_centroid_y': self.yolo_tumor_centroid_y,
-            'yolo_tumor_bbox_x1': self.yolo_tumor_bbox_x1,
-            'yolo_tumor_bbox_y1': self.yolo_tumor_bbox_y1,
-            'yolo_tumor_bbox_x2': self.yolo_tumor_bbox_x2,
-            'yolo_tumor_bbox_y2': self.yolo_tumor_bbox_y2,
-            'yolo_risk_level': self.yolo_risk_level,
-            'yolo_surgical_accessibility': self.yolo_surgical_accessibility,
-            'yolo_location_description': self.yolo_location_description,
-            'yolo_proximity_to_vessels': self.yolo_proximity_to_vessels,
-            'yolo_proximity_to_eloquent_area': self.yolo_proximity_to_eloquent_area,
-            'yolo_segmentation_quality': self.yolo_segmentation_quality,
-            'yolo_model_version': self.yolo_model_version,
-            'yolo_inference_time': self.yolo_inference_time,
-            'yolo_diagnostic_report': self.yolo_diagnostic_report,
-            # UNet检测结果
-            'unet_has_tumor': self.unet_has_tumor,
-            'unet_num_instances': self.unet_num_instances,
-            'unet_avg_confidence': self.unet_avg_confidence,
-            'unet_tumor_ratio': self.unet_tumor_ratio,
-            'unet_tumor_pixels': self.unet_tumor_pixels,
-            'unet_total_pixels': self.unet_total_pixels,
-            'unet_instances': self.unet_instances,
-            'unet_mask_path': self.unet_mask_path,
-            'unet_mask_overlay_path': self.unet_mask_overlay_path,
-            'unet_tumor_centroid_x': self.unet_tumor_centroid_x,
-            'unet_tumor_centroid_y': self.unet_tumor_centroid_y,
-            'unet_tumor_bbox_x1': self.unet_tumor_bbox_x1,
-            'unet_tumor_bbox_y1': self.unet_tumor_bbox_y1,
-            'unet_tumor_bbox_x2': self.unet_tumor_bbox_x2,
-            'unet_tumor_bbox_y2': self.unet_tumor_bbox_y2,
-            'unet_risk_level': self.unet_risk_level,
-            'unet_surgical_accessibility': self.unet_surgical_accessibility,
-            'unet_location_description': self.unet_location_description,
-            'unet_model_version': self.unet_model_version,
+            # YOLO11 / UNet 检测结果（各模型最新一次检测记录，兼容旧版字段名）
+            **DetectionRun.legacy_view(runs.get('yolo'), 'yolo'),
+            **DetectionRun.legacy_view(runs.get('unet'), 'unet'),
             # 模型选择
             'last_model_used': self.last_model_used,
-            'uploaded_at': self.uploaded_at.isoformat(),
+            'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
             'updated_at': self.updated_at.isoformat(),
             'uploaded_by': self.uploaded_by
         }
@@ -227,8 +267,11 @@ class MedicalImage(db.Model):
     
     @property
     def preview_url(self):
-        from flask import current_app
-        import os
+        """预览图URL：优先使用缩略图金字塔的最大一级，兼容旧版上传生成的 _preview.png"""
+        from utils.thumbnails import PREVIEW_SIZE, find_thumbnail
+        thumbnail = find_thumbnail(self.filepath, PREVIEW_SIZE)
+        if thumbnail:
+            return f'/uploads/medical_images/{os.path.basename(thumbnail)}'
         base = os.path.splitext(os.path.basename(self.filepath))[0]
         preview_filename = f'{base}_preview.png'
         preview_path = os.path.join(os.path.dirname(self.filepath), preview_filename)
@@ -236,8 +279,20 @@ class MedicalImage(db.Model):
             return f'/uploads/medical_images/{preview_filename}'
         return None
     
+    def thumbnail_url(self, size=None):
+        """指定尺寸缩略图的URL（默认列表页尺寸），尚未生成时退回预览图"""
+        from utils.thumbnails import LIST_THUMBNAIL_SIZE, find_thumbnail
+        thumbnail = find_thumbnail(self.filepath, size or LIST_THUMBNAIL_SIZE)
+        if thumbnail:
+            return f'/uploads/medical_images/{os.path.basename(thumbnail)}'
+        return self.preview_url
+    
     def delete_file(self):
-        """删除物理文件"""
+        """删除物理文件（含缩略图）"""
+        from utils.thumbnails import all_thumbnail_paths
+        for thumbnail in all_thumbnail_paths(self.filepath):
+            if os.path.exists(thumbnail):
+                os.remove(thumbnail)
         if os.path.exists(self.filepath):
             os.remove(self.filepath)
         if self.segmentation_mask_path and os.path.exists(self.segmentation_mask_path):
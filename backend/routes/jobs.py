@@ -0,0 +1,99 @@
+"""
+后台任务路由
+查询任务进度、获取结果、取消任务
+"""
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from models import AnalysisJob
+from utils.identity_cache import get_identity_cache
+from utils.job_queue import get_job_queue
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+def _get_accessible_job(job_id):
+    """获取当前用户可访问的任务（管理员可访问全部）"""
+    job = AnalysisJob.query.get(job_id)
+    if job is None:
+        return None
+    current_user_id = int(get_jwt_identity())
+    if job.created_by == current_user_id:
+        return job
+    identity = get_identity_cache().get(current_user_id)
+    return job if identity and identity.is_admin else None
+
+
+@jobs_bp.route('', methods=['GET'])
+@jwt_required()
+def list_jobs():
+    """
+    列出当前用户的任务
+
+    GET /api/jobs?status=running&job_type=nii_reconstruction&limit=20
+    """
+    try:
+        query = AnalysisJob.query.filter(AnalysisJob.created_by == int(get_jwt_identity()))
+        status = request.args.get('status')
+        if status:
+            query = query.filter(AnalysisJob.status == status)
+        job_type = request.args.get('job_type')
+        if job_type:
+            query = query.filter(AnalysisJob.job_type == job_type)
+        limit = min(request.args.get('limit', 20, type=int), 100)
+
+        jobs = query.order_by(AnalysisJob.created_at.desc()).limit(limit).all()
+        return jsonify({'jobs': [job.to_dict() for job in jobs]}), 200
+    except Exception as e:
+        current_app.logger.error(f"获取任务列表失败: {e}")
+        return jsonify({'error': f'获取任务列表失败: {str(e)}'}), 500
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """查询任务状态与进度"""
+    job = _get_accessible_job(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+@jwt_required()
+def get_job_result(job_id):
+    """
+    获取任务结果
+
+    已完成（或执行失败）的任务返回与同步接口相同的响应体和状态码；
+    未结束的任务返回 202 及当前进度。
+    """
+    job = _get_accessible_job(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+
+    if job.status in ('queued', 'running'):
+        return jsonify(job.to_dict()), 202
+    if job.status == 'cancelled':
+        return jsonify({'error': '任务已取消', 'job': job.to_dict()}), 409
+
+    result = job.get_result()
+    if result is None:
+        return jsonify({'error': job.error or '任务没有结果', 'job': job.to_dict()}), 500
+    return jsonify(result), job.result_status or 200
+
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_job(job_id):
+    """取消排队中或运行中的任务"""
+    job = _get_accessible_job(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+
+    if not get_job_queue().cancel(job_id):
+        return jsonify({'error': '任务已结束，无法取消', 'job': job.to_dict()}), 409
+
+    job = AnalysisJob.query.get(job_id)
+    return jsonify({'message': '已请求取消', 'job': job.to_dict()}), 200
@@ -3,11 +3,16 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db
 from models.user import User
 from models.medical_image import MedicalImage, Dataset, dataset_images
+from models.detection_run import DetectionRun
 from utils.image_processing import preprocess_image
+from utils.job_queue import register_job_handler, get_job_queue, PRIORITY_BACKGROUND
+from utils.thumbnails import generate_thumbnails
 from werkzeug.utils import secure_filename
 from PIL import Image
+from sqlalchemy.orm import load_only
 import os
 import json
+import base64
 from datetime import datetime
 from typing import List
 
@@ -25,6 +30,70 @@ def get_upload_folder():
     backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     return os.path.join(backend_root, 'uploads', 'medical_images')
 
+def precompute_requested():
+    """上传请求是否启用后台预计算（表单字段 precompute 优先，其次为 UPLOAD_PRECOMPUTE 配置）"""
+    value = request.form.get('precompute')
+    if value is None or value == '':
+        return bool(current_app.config.get('UPLOAD_PRECOMPUTE', False))
+    return value.lower() in ('1', 'true', 'yes')
+
+
+@register_job_handler('preview_generation', priority=PRIORITY_BACKGROUND)
+def run_preview_generation_job(ctx):
+    """后台任务：生成缩略图金字塔（64/256/1024）"""
+    medical_image = MedicalImage.query.filter_by(
+        id=ctx.params['image_id'], uploaded_by=ctx.user_id
+    ).first()
+    if not medical_image or not os.path.exists(medical_image.filepath):
+        return {'error': '医学影像不存在或已删除'}, 404
+
+    ctx.update(10, '生成缩略图', force=True)
+    generate_thumbnails(medical_image.filepath)
+    return {
+        'image_id': medical_image.id,
+        'preview_url': medical_image.preview_url,
+        'thumbnail_url': medical_image.thumbnail_url()
+    }, 200
+
+
+# 上传预计算使用的置信度阈值（与分析接口的默认值一致，保证打开病例时命中结果缓存）
+PRECOMPUTE_CONF = 0.25
+
+
+@register_job_handler('upload_precompute', priority=PRIORITY_BACKGROUND)
+def run_upload_precompute_job(ctx):
+    """后台任务：上传后生成缩略图，并以默认模型完成分割、定量分析与影像组学（写入结果缓存）"""
+    from routes.result_display import load_analysis_image, compute_image_analysis
+
+    medical_image = MedicalImage.query.filter_by(
+        id=ctx.params['image_id'], uploaded_by=ctx.user_id
+    ).first()
+    if not medical_image or not os.path.exists(medical_image.filepath):
+        return {'error': '医学影像不存在或已删除'}, 404
+
+    ctx.update(5, '生成缩略图', force=True)
+    try:
+        generate_thumbnails(medical_image.filepath)
+    except Exception as e:
+        current_app.logger.warning(f"缩略图生成失败（影像ID={medical_image.id}）: {e}")
+
+    ctx.update(20, '默认模型分割与特征提取', force=True)
+    image_np = load_analysis_image(medical_image.filepath)
+    analysis = compute_image_analysis(
+        medical_image.filepath, image_np, conf=PRECOMPUTE_CONF,
+        progress=ctx.stage(20, 95, '默认模型分割与特征提取')
+    )
+    segmentation = analysis['segmentation']
+    return {
+        'image_id': medical_image.id,
+        'preview_url': medical_image.preview_url,
+        'thumbnail_url': medical_image.thumbnail_url(),
+        'has_tumor': segmentation['has_tumor'],
+        'num_instances': segmentation['num_instances'],
+        'cached': analysis['cached']
+    }, 200
+
+
 @medical_images_bp.route('/upload', methods=['POST'])
 @jwt_required()
 def upload_medical_image():
@@ -111,76 +180,28 @@ def upload_medical_image():
             uploaded_by=current_user_id
         )
         
-        # 生成预览PNG
-        preview_path = None
-        try:
-            from PIL import Image
-            import numpy as np
-            ext = os.path.splitext(filepath)[1].lower()
-            if lower_name.endswith('.nii') or lower_name.endswith('.nii.gz'):
-                try:
-                    import nibabel as nib
-                    img = nib.load(filepath)
-                    data = img.get_fdata()
-                    if data.ndim == 3:
-                        z = data.shape[2] // 2
-                        slice2d = data[:, :, z]
-                    elif data.ndim == 4:
-                        z = data.shape[2] // 2
-                        slice2d = data[:, :, z, 0]
-                    else:
-                        slice2d = np.squeeze(data)
-                    slice2d = slice2d.astype(np.float32)
-                    mn, mx = float(slice2d.min()), float(slice2d.max())
-                    norm = (slice2d - mn) / (mx - mn + 1e-6)
-                    arr = (norm * 255.0).clip(0, 255).astype(np.uint8)
-                    img_pil = Image.fromarray(arr)
-                    preview_filename = f"{os.path.splitext(unique_filename)[0]}_preview.png"
-                    preview_path = os.path.join(upload_folder, preview_filename)
-                    img_pil.save(preview_path)
-                except Exception:
-                    preview_path = None
-            elif ext == '.dcm':
-                try:
-                    import pydicom
-                    ds = pydicom.dcmread(filepath)
-                    arr = ds.pixel_array
-                    arr = arr.astype(np.float32)
-                    mn, mx = float(arr.min()), float(arr.max())
-                    norm = (arr - mn) / (mx - mn + 1e-6)
-                    arr = (norm * 255.0).clip(0, 255).astype(np.uint8)
-                    if arr.ndim == 2:
-                        img_pil = Image.fromarray(arr)
-                    else:
-                        img_pil = Image.fromarray(arr)
-                    preview_filename = f"{os.path.splitext(unique_filename)[0]}_preview.png"
-                    preview_path = os.path.join(upload_folder, preview_filename)
-                    img_pil.save(preview_path)
-                except Exception:
-                    preview_path = None
-            else:
-                try:
-                    img_pil = Image.open(filepath)
-                    preview_filename = f"{os.path.splitext(unique_filename)[0]}_preview.png"
-                    preview_path = os.path.join(upload_folder, preview_filename)
-                    img_pil.save(preview_path)
-                except Exception:
-                    preview_path = None
-        except Exception:
-            preview_path = None
-
         # 添加到数据库
         db.session.add(medical_image)
         db.session.commit()
         
         current_app.logger.info(f"医学影像上传成功: ID={medical_image.id}, 文件={medical_image.filename}")
         
-        return jsonify({
+        response = {
             'message': '医学影像上传成功',
             'image_id': medical_image.id,
             'filename': medical_image.filename,
             'image': medical_image.to_dict()  # 返回完整信息用于调试
-        }), 201
+        }
+        # 缩略图（及可选的默认模型预计算）在后台任务中生成，不阻塞上传请求
+        if precompute_requested():
+            job = get_job_queue().submit('upload_precompute', {'image_id': medical_image.id},
+                                         user_id=current_user_id)
+            response['precompute_job_id'] = job.id
+        else:
+            job = get_job_queue().submit('preview_generation', {'image_id': medical_image.id},
+                                         user_id=current_user_id)
+        response['preview_job_id'] = job.id
+        return jsonify(response), 201
         
     except Exception as e:
         db.session.rollback()
@@ -189,6 +210,21 @@ def upload_medical_image():
         current_app.logger.error(f"上传医学影像失败: {str(e)}\n{error_detail}")
         return jsonify({'error': f'上传失败: {str(e)}'}), 500
 
+def encode_list_cursor(image: MedicalImage) -> str:
+    """列表游标：最后一条记录的 (上传时间, id)，URL安全的base64编码；上传时间为空时记为 null"""
+    uploaded_at = image.uploaded_at.isoformat() if image.uploaded_at else None
+    payload = json.dumps({'t': uploaded_at, 'id': image.id})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_list_cursor(token: str):
+    """解析列表游标，无效时返回None"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        cursor_time = datetime.fromisoformat(payload['t']) if payload['t'] is not None else None
+        return cursor_time, int(payload['id'])
+    except Exception:
+        return None
+
 @medical_images_bp.route('/list', methods=['GET'])
 @jwt_required()
 def list_medical_images():
@@ -203,7 +239,14 @@ def list_medical_images():
         # 分页参数
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
-        per_page = min(per_page, 100)  # 限制最大每页数量
+        per_page = max(1, min(per_page, 100))  # 限制每页数量在 1~100 之间
+        # 游标分页：传入 cursor 参数（首页传空值）时按游标翻页，不统计总数
+        use_cursor = 'cursor' in request.args
+        cursor = None
+        if use_cursor and request.args.get('cursor'):
+            cursor = decode_list_cursor(request.args['cursor'])
+            if cursor is None:
+                return jsonify({'error': '无效的分页游标'}), 400
         
         # 过滤参数
         patient_id = request.args.get('patient_id')
@@ -212,10 +255,12 @@ def list_medical_images():
         is_annotated = request.args.get('is_annotated', type=bool)
         is_validated = request.args.get('is_validated', type=bool)
         tumor_detected = request.args.get('tumor_detected')
+        # 返回字段：默认精简列表字段；view=full 返回完整字段（含检测结果等大文本）
+        full_view = request.args.get('view') == 'full'
         
         # 构建查询 - 排除NII文件（用于3D规划的文件）
         # 注意：必须使用 or_ 和 is_not 来正确处理 NULL 值
-        from sqlalchemy import or_
+        from sqlalchemy import and_, or_
         query = MedicalImage.query.filter(
             MedicalImage.uploaded_by == current_user_id,
             or_(
@@ -239,11 +284,36 @@ def list_medical_images():
         if tumor_detected is not None:
             query = query.filter(MedicalImage.tumor_detected == (tumor_detected.lower() == 'true'))
         
-        # 执行查询
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        images = pagination.items
+        # 精简模式只查询列表所需的列，大文本结果字段不从数据库读取
+        if not full_view:
+            query = query.options(*MedicalImage.list_load_options())
+        
+        # 按上传时间倒序（与 ix_medical_images_owner_uploaded 索引顺序一致）
+        query = query.order_by(MedicalImage.uploaded_at.desc(), MedicalImage.id.desc())
         
-        current_app.logger.info(f"查询结果: 找到{len(images)}条记录, 总数{pagination.total}")
+        # 执行查询
+        if use_cursor:
+            if cursor is not None:
+                cursor_time, cursor_id = cursor
+                # 倒序时上传时间为空的记录排在最后（MySQL / SQLite 一致）
+                if cursor_time is None:
+                    query = query.filter(MedicalImage.uploaded_at.is_(None), MedicalImage.id < cursor_id)
+                else:
+                    query = query.filter(or_(
+                        MedicalImage.uploaded_at < cursor_time,
+                        and_(MedicalImage.uploaded_at == cursor_time, MedicalImage.id < cursor_id),
+                        MedicalImage.uploaded_at.is_(None)
+                    ))
+            # 多取一条判断是否还有下一页
+            images = query.limit(per_page + 1).all()
+            has_more = len(images) > per_page
+            images = images[:per_page]
+            next_cursor = encode_list_cursor(images[-1]) if has_more else None
+            current_app.logger.info(f"查询结果: 找到{len(images)}条记录, has_more={has_more}")
+        else:
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            images = pagination.items
+            current_app.logger.info(f"查询结果: 找到{len(images)}条记录, 总数{pagination.total}")
         
         # 调试：输出前几条记录的关键信息
         if len(images) > 0:
@@ -263,8 +333,30 @@ def list_medical_images():
             if recent:
                 current_app.logger.info(f"  最近一条记录: ID={recent.id}, last_model_used={recent.last_model_used}")
         
+        # 列表页使用小尺寸缩略图作为预览，避免加载原尺寸预览图
+        # 完整字段模式下一次查询整页影像的最新检测记录，避免每条记录单独查询
+        latest_runs = MedicalImage.latest_runs(images, with_blobs=True) if full_view else {}
+        items = []
+        for img in images:
+            if full_view:
+                item = img.to_dict(runs=latest_runs[img.id])
+                item['preview_url'] = item['thumbnail_url']
+            else:
+                item = img.to_list_dict()
+            items.append(item)
+        
+        if use_cursor:
+            return jsonify({
+                'images': items,
+                'pagination': {
+                    'per_page': per_page,
+                    'next_cursor': next_cursor,
+                    'has_more': has_more
+                }
+            }), 200
+        
         return jsonify({
-            'images': [img.to_dict() for img in images],
+            'images': items,
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -302,6 +394,79 @@ def get_medical_image(image_id):
         current_app.logger.error(f"获取医学影像失败: {str(e)}")
         return jsonify({'error': '获取影像信息失败'}), 500
 
+@medical_images_bp.route('/<int:image_id>/details', methods=['GET'])
+@jwt_required()
+def get_medical_image_details(image_id):
+    """获取医学影像的检测/分析结果大文本字段（列表接口不返回这些字段）
+
+    查询参数 fields 可指定逗号分隔的字段名，只读取这些列。
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        try:
+            current_user_id = int(current_user_id)
+        except Exception:
+            pass
+        
+        fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+        unknown = [f for f in fields
+                   if f not in MedicalImage.DETAIL_COLUMNS and f not in MedicalImage.DETAIL_RUN_FIELDS]
+        if unknown:
+            return jsonify({'error': f"不支持的字段: {', '.join(unknown)}"}), 400
+        fields = fields or [*MedicalImage.DETAIL_COLUMNS, *MedicalImage.DETAIL_RUN_FIELDS]
+        # 影像表中的字段按列投影读取，检测记录字段由 to_detail_dict 从最新检测记录读取
+        columns = [name for name in fields if name in MedicalImage.DETAIL_COLUMNS]
+        
+        medical_image = MedicalImage.query.options(
+            load_only(MedicalImage.id, *(getattr(MedicalImage, name) for name in columns))
+        ).filter(
+            MedicalImage.id == image_id,
+            MedicalImage.uploaded_by == current_user_id
+        ).first()
+        
+        if not medical_image:
+            return jsonify({'error': '医学影像不存在或无权限访问'}), 404
+        
+        return jsonify(medical_image.to_detail_dict(fields)), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"获取医学影像详情失败: {str(e)}")
+        return jsonify({'error': '获取影像详情失败'}), 500
+
+@medical_images_bp.route('/<int:image_id>/runs', methods=['GET'])
+@jwt_required()
+def list_detection_runs(image_id):
+    """获取医学影像的检测记录历史（新的在前，不含大文本字段）
+
+    查询参数 model_type 可只返回指定模型（yolo / unet）的记录。
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        try:
+            current_user_id = int(current_user_id)
+        except Exception:
+            pass
+        
+        medical_image = MedicalImage.query.options(load_only(MedicalImage.id)).filter(
+            MedicalImage.id == image_id,
+            MedicalImage.uploaded_by == current_user_id
+        ).first()
+        
+        if not medical_image:
+            return jsonify({'error': '医学影像不存在或无权限访问'}), 404
+        
+        query = medical_image.detection_runs
+        model_type = request.args.get('model_type')
+        if model_type:
+            query = query.filter_by(model_type=model_type)
+        runs = query.order_by(DetectionRun.id.desc()).all()
+        
+        return jsonify({'runs': [run.to_dict() for run in runs], 'total': len(runs)}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"获取检测记录失败: {str(e)}")
+        return jsonify({'error': '获取检测记录失败'}), 500
+
 @medical_images_bp.route('/<int:image_id>', methods=['PUT'])
 @jwt_required()
 def update_medical_image(image_id):
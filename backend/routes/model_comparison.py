@@ -7,9 +7,13 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db
 from models.medical_image import MedicalImage
+from models.detection_run import DetectionRun
 from utils.model_manager import ModelManager
+from utils.result_cache import get_result_cache
 import os
 import json
+import time
+import numpy as np
 from datetime import datetime
 
 model_comparison_bp = Blueprint('model_comparison', __name__)
@@ -64,17 +68,32 @@ def predict_with_model(image_id):
             else:
                 full_weight_path = os.path.join(backend_root, 'weights', 'ResNeXt50_best.pt')
         
-        # 加载模型
-        device = 'cuda' if current_app.config.get('USE_GPU', False) else 'cpu'
-        model, detected_type = manager.load_model(
-            full_weight_path,
-            model_type=model_type,
-            conf_threshold=conf_threshold,
-            device=device
+        # 同一文件、权重与阈值的预测结果命中缓存时跳过模型加载与推理
+        result_cache = get_result_cache()
+        cache_key = result_cache.key_for(
+            'model_prediction', medical_image.filepath, full_weight_path,
+            model_type=model_type, conf=conf_threshold, imgsz=256
         )
-        
-        # 预测
-        result = manager.predict(model, detected_type, medical_image.filepath)
+        cached = result_cache.get(cache_key)
+        # 推理耗时（秒），命中缓存时未运行模型为None
+        inference_time = None
+        if cached:
+            detected_type, result = restore_prediction(*cached)
+        else:
+            # 加载模型
+            device = 'cuda' if current_app.config.get('USE_GPU', False) else 'cpu'
+            model, detected_type = manager.load_model(
+                full_weight_path,
+                model_type=model_type,
+                conf_threshold=conf_threshold,
+                device=device
+            )
+            
+            # 预测
+            start_time = time.perf_counter()
+            result = manager.predict(model, detected_type, medical_image.filepath)
+            inference_time = round(time.perf_counter() - start_time, 3)
+            store_prediction(result_cache, cache_key, detected_type, result)
         
         # 保存预测结果和可视化
         uploads_root = os.path.dirname(current_app.config.get('UPLOADS_DIR', ''))
@@ -125,17 +144,24 @@ def predict_with_model(image_id):
         # 保存结果到数据库
         from models.medical_image import db
         
+        # 保存本次检测记录（YOLO与UNet结果字段相同，按模型类型区分）
+        run = DetectionRun(
+            image=medical_image,
+            model_type=detected_type,
+            source='comparison',
+            model_version='YOLO11' if detected_type == 'yolo' else 'UNet (ResNeXt50)'
+        )
+        run.has_tumor = result['tumor_detected']
+        run.num_instances = result['metrics']['num_instances']
+        run.tumor_ratio = result['metrics']['tumor_ratio']
+        run.avg_confidence = result['metrics']['avg_confidence']
+        run.tumor_pixels = result['metrics']['tumor_pixels']
+        run.total_pixels = result['metrics']['total_pixels']
+        run.mask_overlay_path = overlay_url
+        run.inference_time = inference_time
+        
+        # 构建实例信息并序列化为JSON
         if detected_type == 'yolo':
-            # 保存YOLO结果
-            medical_image.yolo_has_tumor = result['tumor_detected']
-            medical_image.yolo_num_instances = result['metrics']['num_instances']
-            medical_image.yolo_tumor_ratio = result['metrics']['tumor_ratio']
-            medical_image.yolo_avg_confidence = result['metrics']['avg_confidence']
-            medical_image.yolo_tumor_pixels = result['metrics']['tumor_pixels']
-            medical_image.yolo_total_pixels = result['metrics']['total_pixels']
-            medical_image.yolo_mask_overlay_path = overlay_url
-            
-            # 构建完整的实例信息并序列化为JSON
             if result['segmentation_result']['confidences']:
                 import json
                 yolo_instances = [
@@ -150,95 +176,46 @@ def predict_with_model(image_id):
                         result['segmentation_result']['masks']
                     ))
                 ]
-                medical_image.yolo_instances = json.dumps(yolo_instances)
+                run.instances = json.dumps(yolo_instances)
+        elif 'instances' in result and result['instances']:
+            import json
+            run.instances = json.dumps(result['instances'])
+        
+        # 计算位置信息（如果有检测到肿瘤）
+        if result['tumor_detected'] and result['segmentation_result']['boxes']:
+            boxes = result['segmentation_result']['boxes']
+            # 使用第一个（最大）实例的边界框
+            bbox = boxes[0]
+            run.tumor_bbox_x1 = float(bbox[0])
+            run.tumor_bbox_y1 = float(bbox[1])
+            run.tumor_bbox_x2 = float(bbox[2])
+            run.tumor_bbox_y2 = float(bbox[3])
             
-            # 计算位置信息（如果有检测到肿瘤）
-            if result['tumor_detected'] and result['segmentation_result']['boxes']:
-                boxes = result['segmentation_result']['boxes']
-                # 使用第一个（最大）实例的边界框
-                bbox = boxes[0]
-                medical_image.yolo_tumor_bbox_x1 = float(bbox[0])
-                medical_image.yolo_tumor_bbox_y1 = float(bbox[1])
-                medical_image.yolo_tumor_bbox_x2 = float(bbox[2])
-                medical_image.yolo_tumor_bbox_y2 = float(bbox[3])
-                
-                # 计算中心点
-                centroid_x = (bbox[0] + bbox[2]) / 2
-                centroid_y = (bbox[1] + bbox[3]) / 2
-                medical_image.yolo_tumor_centroid_x = float(centroid_x)
-                medical_image.yolo_tumor_centroid_y = float(centroid_y)
-                
-                # 计算风险等级
-                from routes.yolo_detection import calculate_risk_level, calculate_surgical_accessibility, generate_location_description
-                medical_image.yolo_risk_level = calculate_risk_level(
-                    result['metrics']['tumor_ratio'], 
-                    result['metrics']['num_instances']
-                )
-                
-                # 计算手术可达性（使用已读取的image变量）
-                img_height, img_width = image.shape[:2]
-                medical_image.yolo_surgical_accessibility = calculate_surgical_accessibility(
-                    centroid_x, centroid_y, img_width, img_height
-                )
-                
-                # 生成位置描述
-                medical_image.yolo_location_description = generate_location_description(
-                    bbox, img_width, img_height
-                )
+            # 计算中心点
+            centroid_x = (bbox[0] + bbox[2]) / 2
+            centroid_y = (bbox[1] + bbox[3]) / 2
+            run.tumor_centroid_x = float(centroid_x)
+            run.tumor_centroid_y = float(centroid_y)
             
-            # 保存模型版本
-            medical_image.yolo_model_version = 'YOLO11'
-        else:
-            # 保存UNet结果到新字段
-            medical_image.unet_has_tumor = result['tumor_detected']
-            medical_image.unet_num_instances = result['metrics']['num_instances']
-            medical_image.unet_tumor_ratio = result['metrics']['tumor_ratio']
-            medical_image.unet_avg_confidence = result['metrics']['avg_confidence']
-            medical_image.unet_tumor_pixels = result['metrics']['tumor_pixels']
-            medical_image.unet_total_pixels = result['metrics']['total_pixels']
-            medical_image.unet_mask_overlay_path = overlay_url
+            # 计算风险等级
+            from routes.yolo_detection import calculate_risk_level, calculate_surgical_accessibility, generate_location_description
+            run.risk_level = calculate_risk_level(
+                result['metrics']['tumor_ratio'], 
+                result['metrics']['num_instances']
+            )
             
-            # 序列化instances为JSON
-            if 'instances' in result and result['instances']:
-                import json
-                medical_image.unet_instances = json.dumps(result['instances'])
+            # 计算手术可达性（使用已读取的image变量）
+            img_height, img_width = image.shape[:2]
+            run.surgical_accessibility = calculate_surgical_accessibility(
+                centroid_x, centroid_y, img_width, img_height
+            )
             
-            # 计算位置信息（如果有检测到肿瘤）
-            if result['tumor_detected'] and result['segmentation_result']['boxes']:
-                boxes = result['segmentation_result']['boxes']
-                # 使用第一个（最大）实例的边界框
-                bbox = boxes[0]
-                medical_image.unet_tumor_bbox_x1 = float(bbox[0])
-                medical_image.unet_tumor_bbox_y1 = float(bbox[1])
-                medical_image.unet_tumor_bbox_x2 = float(bbox[2])
-                medical_image.unet_tumor_bbox_y2 = float(bbox[3])
-                
-                # 计算中心点
-                centroid_x = (bbox[0] + bbox[2]) / 2
-                centroid_y = (bbox[1] + bbox[3]) / 2
-                medical_image.unet_tumor_centroid_x = float(centroid_x)
-                medical_image.unet_tumor_centroid_y = float(centroid_y)
-                
-                # 计算风险等级
-                from routes.yolo_detection import calculate_risk_level, calculate_surgical_accessibility, generate_location_description
-                medical_image.unet_risk_level = calculate_risk_level(
-                    result['metrics']['tumor_ratio'], 
-                    result['metrics']['num_instances']
-                )
-                
-                # 计算手术可达性（使用已读取的image变量）
-                img_height, img_width = image.shape[:2]
-                medical_image.unet_surgical_accessibility = calculate_surgical_accessibility(
-                    centroid_x, centroid_y, img_width, img_height
-                )
-                
-                # 生成位置描述
-                medical_image.unet_location_description = generate_location_description(
-                    bbox, img_width, img_height
-                )
-            
-            # 保存模型版本
-            medical_image.unet_model_version = 'UNet (ResNeXt50)'
+            # 生成位置描述
+            run.location_description = generate_location_description(
+                bbox, img_width, img_height
+            )
+        
+        db.session.add(run)
             
         # 记录最后使用的模型
         medical_image.last_model_used = detected_type
@@ -258,6 +235,7 @@ def predict_with_model(image_id):
                 **result['metrics'],
                 'tumor_detected': result['tumor_detected'],
                 'overlay_url': overlay_url,
+                'from_cache': bool(cached),
                 'num_instances': result['metrics']['num_instances'],
                 'instances': [
                     {
@@ -278,6 +256,28 @@ def predict_with_model(image_id):
         return jsonify({'error': f'预测失败: {str(e)}'}), 500
 
 
+def store_prediction(result_cache, cache_key, detected_type, result):
+    """将预测结果写入结果缓存（实例掩码存为数组，其余字段存为元数据）"""
+    masks = result['segmentation_result'].get('masks') or []
+    arrays = {f'mask_{i}': np.asarray(mask) for i, mask in enumerate(masks)}
+    meta = {
+        'model_type': detected_type,
+        'num_masks': len(masks),
+        'result': {
+            **result,
+            'segmentation_result': {k: v for k, v in result['segmentation_result'].items() if k != 'masks'}
+        }
+    }
+    result_cache.put(cache_key, arrays, meta)
+
+
+def restore_prediction(arrays, meta):
+    """从缓存条目还原 (模型类型, 预测结果)"""
+    result = meta['result']
+    result['segmentation_result']['masks'] = [arrays[f'mask_{i}'] for i in range(meta['num_masks'])]
+    return meta['model_type'], result
+
+
 @model_comparison_bp.route('/compare/<int:image_id>', methods=['POST'])
 @jwt_required()
 def compare_models(image_id):
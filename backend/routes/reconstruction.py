@@ -5,19 +5,33 @@
 import os
 import json
 import cv2
-from flask import Blueprint, request, jsonify, current_app, send_file
+import hashlib
+from flask import Blueprint, request, jsonify, current_app, send_file, send_from_directory
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import numpy as np
 
 from models.medical_image import MedicalImage, db
+from models.detection_run import DetectionRun
+from utils.nifti_volume import open_nifti
+from utils.job_queue import (
+    register_job_handler,
+    get_job_queue,
+    wants_async,
+    job_accepted_response
+)
 from utils.mesh_reconstruction import (
     reconstruct_3d_from_slices,
     reconstruct_3d_from_nii,
     export_to_stl,
+    export_to_glb,
+    mesh_arrays_to_lists,
     mesh_to_json
 )
+from utils.mesh_metrics import compute_mesh_metrics
+from utils.mesh_decimation import build_lod_levels, parse_lod_ratios
+from utils.volumetric_radiomics import extract_volumetric_radiomics
 
 
 reconstruction_bp = Blueprint('reconstruction', __name__, url_prefix='/api/reconstruction')
@@ -34,6 +48,10 @@ def upload_nii_for_reconstruction():
         file: NII文件 (.nii 或 .nii.gz)
         spacing: 可选，体素间距 JSON字符串 [1.0, 1.0, 1.0]
         use_unet: 可选，是否使用UNet分割 (true/false)
+        mesh_format: 可选，json（默认，网格内联在响应中）或 glb（网格写入二进制GLB文件，
+            响应中只返回 mesh_url，文件名为内容哈希，可长期缓存）
+        lod: 可选，true 按 MESH_LOD_RATIOS 生成多级细节，或显式比例如 "1,0.25,0.05"；
+            model_data.lods 按从粗到细列出各级GLB地址，前端先加载最粗一级再按需细化
     
     Returns:
         {
@@ -86,259 +104,485 @@ def upload_nii_for_reconstruction():
         # 解析参数
         spacing = json.loads(request.form.get('spacing', '[1.0, 1.0, 1.0]'))
         use_unet = request.form.get('use_unet', 'false').lower() == 'true'
-        
-        # 加载NII文件并重建
+        mesh_format = request.form.get('mesh_format', 'json').lower()
+        if mesh_format not in MESH_FORMATS:
+            return jsonify({'error': f'不支持的mesh_format: {mesh_format}', 'supported': list(MESH_FORMATS)}), 400
         try:
-            import nibabel as nib
-            nii = nib.load(nii_path)
-            volume = nii.get_fdata()
-            H, W, D = volume.shape
+            lod_ratios = parse_lod_ratios(
+                request.form.get('lod'),
+                default=parse_lod_ratios(current_app.config.get('MESH_LOD_RATIOS', '1.0,0.25,0.05'))
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 异步模式：立即返回任务ID，重建在后台任务中执行
+        if wants_async():
+            job = get_job_queue().submit('nii_reconstruction', {
+                'nii_path': nii_path,
+                'filename': filename,
+                'original_filename': file.filename,
+                'spacing': spacing,
+                'use_unet': use_unet,
+                'mesh_format': mesh_format,
+                'lod_ratios': lod_ratios
+            }, user_id=int(current_user_id))
+            return jsonify(job_accepted_response(job)), 202
+        
+        payload, status_code = process_nii_reconstruction(
+            nii_path, filename, file.filename, current_user_id, spacing, use_unet,
+            mesh_format=mesh_format, lod_ratios=lod_ratios
+        )
+        return jsonify(payload), status_code
             
-            current_app.logger.info(f"NII文件维度: {H}x{W}x{D}")
+    except Exception as e:
+        current_app.logger.exception("upload_nii_for_reconstruction外层异常")
+        import traceback
+        return jsonify({
+            'error': f'请求处理失败: {str(e)}',
+            'type': type(e).__name__,
+            'detail': traceback.format_exc() if current_app.debug else str(e)
+        }), 500
             
-            # 如果使用UNet进行分割
-            if use_unet:
-                # 尝试加载UNet模型
-                try:
-                    from utils.predictor import BrainTumorPredictor
-                    
-                    # 灵活查找权重文件 - 支持多种路径结构
-                    backend_dir = os.path.dirname(os.path.abspath(__file__))
-                    backend_root = os.path.dirname(backend_dir)
-                    
-                    possible_paths = [
-                        # 1. backend/weights/ (用户指定的位置)
-                        os.path.join(backend_root, 'weights', 'ResNeXt50_best.pt'),
-                        os.path.join('backend', 'weights', 'ResNeXt50_best.pt'),
-                        # 2. backend/ai/brain_tumor/weights/ (参考代码位置)
-                        os.path.join(backend_root, 'ai', 'brain_tumor', 'weights', 'ResNeXt50_best.pt'),
-                        # 3. 相对路径
-                        'weights/ResNeXt50_best.pt',
-                        'ResNeXt50_best.pt',
-                        # 4. 绝对路径（如果用户提供）
-                        r'E:\python_demo\tumorDetection\tumorDetection\backend\weights\ResNeXt50_best.pt'
-                    ]
-                    
-                    model_path = None
-                    for path in possible_paths:
-                        if os.path.exists(path):
-                            model_path = os.path.abspath(path)
-                            break
-                    
-                    if not model_path:
-                        return jsonify({
-                            'error': 'UNet模型文件不存在',
-                            'hint': f'请将ResNeXt50_best.pt放置到: backend/weights/ 目录下',
-                            'searched_paths': possible_paths[:3]  # 只显示主要路径
-                        }), 400
-                    
-                    current_app.logger.info(f"找到UNet模型: {model_path}")
-                    
-                    # 检查是否有GPU
-                    import torch
-                    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-                    current_app.logger.info(f"使用设备: {device}")
-                    
-                    predictor = BrainTumorPredictor(model_path, device=device, threshold=0.1)
-                    
-                    current_app.logger.info("开始UNet逐切片预测（包含脑部轮廓提取）...")
-                    reconstruction_data = reconstruct_3d_from_nii(
-                        nii_path, predictor, spacing=tuple(spacing), include_brain_outline=True
-                    )
-                    
-                    if reconstruction_data is None:
-                        return jsonify({
-                            'error': '3D重建失败',
-                            'hint': 'UNet预测未检测到肿瘤区域，请检查NII文件内容'
-                        }), 400
-                    
-                except ImportError as e:
-                    current_app.logger.error(f"UNet模块导入失败: {e}")
-                    return jsonify({
-                        'error': 'UNet模型加载失败',
-                        'detail': str(e),
-                        'hint': '请检查ai/brain_tumor/inference/predictor.py是否存在'
-                    }), 500
-                except Exception as e:
-                    current_app.logger.error(f"UNet预测失败: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    return jsonify({
-                        'error': 'UNet预测过程出错',
-                        'detail': str(e)
-                    }), 500
-            else:
-                # 假设NII文件已经是分割好的掩码（直接二值化）
-                current_app.logger.info("使用直接二值化方法处理NII文件")
+    except Exception as e:
+        current_app.logger.exception("NII上传失败")
+        return jsonify({
+            'error': f'上传失败: {str(e)}',
+            'detail': str(e),
+            'type': type(e).__name__
+        }), 500
+
+
+def process_nii_reconstruction(nii_path, filename, original_filename, user_id, spacing, use_unet,
+                               progress=None, mesh_format='json', lod_ratios=None):
+    """
+    NII文件3D重建的完整流程（同步接口与后台任务共用）
+
+    Args:
+        nii_path: 已保存的NII文件路径
+        filename: 安全化后的文件名
+        original_filename: 上传时的原始文件名
+        user_id: 上传用户ID
+        spacing: 体素间距 [x, y, z]
+        use_unet: 是否使用UNet分割
+        progress: 可选的进度回调 progress(done, total)，按切片调用
+
+    Returns:
+        (payload, status_code)
+    """
+    # 加载NII文件并重建
+    radiomics_enabled = current_app.config.get('NII_RADIOMICS', True)
+    mask_volume = None
+    try:
+        # 只读取头信息获取维度，体素数据按需读取
+        with open_nifti(nii_path) as nifti:
+            H, W, D = nifti.shape[:3]
+        
+        current_app.logger.info(f"NII文件维度: {H}x{W}x{D}")
+        
+        # 如果使用UNet进行分割
+        if use_unet:
+            # 尝试加载UNet模型
+            try:
+                from utils.model_registry import get_model_registry
                 
-                # 导入mesh_reconstruction模块
-                from utils.mesh_reconstruction import extract_brain_outline
+                # 灵活查找权重文件 - 支持多种路径结构
+                backend_dir = os.path.dirname(os.path.abspath(__file__))
+                backend_root = os.path.dirname(backend_dir)
                 
-                masks = []
-                for i in range(D):
-                    slice_img = volume[:, :, i]
-                    
-                    # 归一化到0-255
-                    if slice_img.max() > slice_img.min():
-                        slice_normalized = cv2.normalize(
-                            slice_img, None, 0, 255, cv2.NORM_MINMAX
-                        ).astype(np.uint8)
-                    else:
-                        # 全零切片
-                        slice_normalized = np.zeros_like(slice_img, dtype=np.uint8)
-                    
-                    # 二值化（阈值127）
-                    _, binary_mask = cv2.threshold(
-                        slice_normalized, 127, 255, cv2.THRESH_BINARY
-                    )
-                    masks.append(binary_mask)
+                possible_paths = [
+                    # 1. backend/weights/ (用户指定的位置)
+                    os.path.join(backend_root, 'weights', 'ResNeXt50_best.pt'),
+                    os.path.join('backend', 'weights', 'ResNeXt50_best.pt'),
+                    # 2. backend/ai/brain_tumor/weights/ (参考代码位置)
+                    os.path.join(backend_root, 'ai', 'brain_tumor', 'weights', 'ResNeXt50_best.pt'),
+                    # 3. 相对路径
+                    'weights/ResNeXt50_best.pt',
+                    'ResNeXt50_best.pt',
+                    # 4. 绝对路径（如果用户提供）
+                    r'E:\python_demo\tumorDetection\tumorDetection\backend\weights\ResNeXt50_best.pt'
+                ]
                 
-                current_app.logger.info(f"已处理{D}个切片，开始3D重建...")
+                model_path = None
+                for path in possible_paths:
+                    if os.path.exists(path):
+                        model_path = os.path.abspath(path)
+                        break
                 
-                # 3D重建
-                vertices, faces, normals, tumor_volume = reconstruct_3d_from_slices(
-                    masks, spacing=tuple(spacing), smooth=True
-                )
+                if not model_path:
+                    return {
+                        'error': 'UNet模型文件不存在',
+                        'hint': f'请将ResNeXt50_best.pt放置到: backend/weights/ 目录下',
+                        'searched_paths': possible_paths[:3]  # 只显示主要路径
+                    }, 400
                 
-                if vertices is None or len(vertices) == 0:
-                    current_app.logger.warning("Marching cubes未生成有效网格")
-                    
-                    # 诊断信息
-                    non_zero_slices = sum(1 for m in masks if np.any(m > 0))
-                    total_voxels = sum(np.sum(m > 0) for m in masks)
-                    
-                    return jsonify({
-                        'error': '3D重建失败',
-                        'hint': 'NII文件可能不包含有效的肿瘤区域，或需要启用use_unet=true进行分割',
-                        'diagnostics': {
-                            'total_slices': D,
-                            'non_zero_slices': non_zero_slices,
-                            'total_voxels': int(total_voxels),
-                            'volume_shape': [H, W, D],
-                            'volume_min': float(np.min(volume)),
-                            'volume_max': float(np.max(volume))
-                        }
-                    }), 400
+                current_app.logger.info(f"找到UNet模型: {model_path}")
                 
-                current_app.logger.info(f"3D重建成功: 顶点={len(vertices)}, 面={len(faces)}, 体积={tumor_volume:.2f}mm³")
+                # 检查是否有GPU
+                import torch
+                device = 'cuda' if torch.cuda.is_available() else 'cpu'
+                current_app.logger.info(f"使用设备: {device}")
                 
-                reconstruction_data = {
-                    'vertices': vertices.tolist(),
-                    'faces': faces.tolist(),
-                    'normals': normals.tolist(),
-                    'volume': float(tumor_volume),
-                    'dimensions': {'height': H, 'width': W, 'depth': D},
-                    'voxel_count': int(np.sum(np.stack(masks, axis=2) > 127)),
-                    'spacing': spacing
-                }
+                predictor = get_model_registry().get(
+                    model_path, 'brain_unet', device=device, threshold=0.1
+                )
                 
-                # 也为直接二值化分支添加脑部轮廓
-                try:
-                    current_app.logger.info("尝试提取脑部轮廓（直接二值化模式）...")
-                    brain_data = extract_brain_outline(volume, tuple(spacing))
-                    if brain_data:
-                        reconstruction_data['brain_outline'] = brain_data
-                        current_app.logger.info(f"[成功] 脑部轮廓添加成功: 顶点{len(brain_data['vertices'])}, 面{len(brain_data['faces'])}")
-                    else:
-                        current_app.logger.warning("[警告] 脑部轮廓提取返回None")
-                except Exception as brain_err:
-                    current_app.logger.error(f"脑部轮廓提取失败: {brain_err}")
-            
-            # 保存到数据库（使用专用标记，与普通医学影像区分）
-            medical_image = MedicalImage(
-                filename=filename,
-                original_filename=file.filename,
-                filepath=nii_path,  # 使用filepath而不是file_url
-                uploaded_by=current_user_id,
-                last_model_used='nii_reconstruction'  # 专用标记，用于过滤
-            )
-            db.session.add(medical_image)
-            db.session.commit()
+                current_app.logger.info("开始UNet批量切片预测（包含脑部轮廓提取）...")
+                reconstruction_data = reconstruct_3d_from_nii(
+                    nii_path, predictor, spacing=tuple(spacing), include_brain_outline=True,
+                    batch_size=current_app.config.get('BRAIN_UNET_BATCH_SIZE', 16),
+                    crop_roi=current_app.config.get('NII_ROI_CROP', True),
+                    roi_margin=current_app.config.get('NII_ROI_MARGIN', 8),
+                    progress_callback=progress,
+                    return_mask=radiomics_enabled
+                )
+                
+                if reconstruction_data is None:
+                    return {
+                        'error': '3D重建失败',
+                        'hint': 'UNet预测未检测到肿瘤区域，请检查NII文件内容'
+                    }, 400
+                mask_volume = reconstruction_data.pop('mask_volume', None)
+                
+            except ImportError as e:
+                current_app.logger.error(f"UNet模块导入失败: {e}")
+                return {
+                    'error': 'UNet模型加载失败',
+                    'detail': str(e),
+                    'hint': '请检查ai/brain_tumor/inference/predictor.py是否存在'
+                }, 500
+            except Exception as e:
+                current_app.logger.error(f"UNet预测失败: {e}")
+                import traceback
+                traceback.print_exc()
+                return {
+                    'error': 'UNet预测过程出错',
+                    'detail': str(e)
+                }, 500
+        else:
+            # 假设NII文件已经是分割好的掩码（直接二值化）
+            current_app.logger.info("使用直接二值化方法处理NII文件")
             
-            # 计算分析数据
-            volume_cm3 = reconstruction_data['volume'] / 1000
-            surface_area = estimate_surface_area(reconstruction_data['faces'], reconstruction_data['vertices'])
-            vertices_array = np.array(reconstruction_data['vertices'])
-            centroid = vertices_array.mean(axis=0)
+            # 导入mesh_reconstruction模块
+            from utils.mesh_reconstruction import extract_brain_outline
             
-            bbox_min = vertices_array.min(axis=0)
-            bbox_max = vertices_array.max(axis=0)
+            # 按切片块流式读取，逐切片归一化并二值化
+            masks = []
+            volume_min, volume_max = np.inf, -np.inf
+            with open_nifti(nii_path) as nifti:
+                for start, stop, slab in nifti.iter_slabs(slab_size=16):
+                    volume_min = min(volume_min, float(slab.min()))
+                    volume_max = max(volume_max, float(slab.max()))
+                    for i in range(stop - start):
+                        slice_img = slab[:, :, i]
+                        
+                        # 归一化到0-255
+                        if slice_img.max() > slice_img.min():
+                            slice_normalized = cv2.normalize(
+                                slice_img.astype(np.float64), None, 0, 255, cv2.NORM_MINMAX
+                            ).astype(np.uint8)
+                        else:
+                            # 全零切片
+                            slice_normalized = np.zeros(slice_img.shape, dtype=np.uint8)
+                        
+                        # 二值化（阈值127）
+                        _, binary_mask = cv2.threshold(
+                            slice_normalized, 127, 255, cv2.THRESH_BINARY
+                        )
+                        masks.append(binary_mask)
+                        if progress:
+                            progress(start + i + 1, D)
             
-            # 计算不规则度和紧凑度
-            bbox_volume = np.prod(bbox_max - bbox_min)
-            compactness = reconstruction_data['volume'] / bbox_volume if bbox_volume > 0 else 0
+            current_app.logger.info(f"已处理{D}个切片，开始3D重建...")
             
-            # 风险评分
-            risk_score = calculate_risk_score(
-                volume_cm3,
-                compactness,
-                centroid
+            # 3D重建
+            vertices, faces, normals, tumor_volume = reconstruct_3d_from_slices(
+                masks, spacing=tuple(spacing), smooth=True
             )
             
-            analysis_data = {
-                'volume': reconstruction_data['volume'],
-                'volume_cm3': volume_cm3,
-                'surface_area': surface_area,
-                'centroid': centroid.tolist(),
-                'bounding_box': {
-                    'min': bbox_min.tolist(),
-                    'max': bbox_max.tolist()
-                },
-                'compactness': float(compactness),
-                'risk_score': float(risk_score),
-                'voxel_count': reconstruction_data['voxel_count']
-            }
-            
-            # 验证返回数据
-            has_brain_outline = 'brain_outline' in reconstruction_data
-            current_app.logger.info(f"返回数据包含脑部轮廓: {has_brain_outline}")
-            if has_brain_outline:
-                current_app.logger.info(f"  脑部轮廓顶点数: {len(reconstruction_data['brain_outline']['vertices'])}")
-                current_app.logger.info(f"  脑部轮廓面数: {len(reconstruction_data['brain_outline']['faces'])}")
-            
-            return jsonify({
-                'success': True,
-                'image_id': medical_image.id,
-                'model_data': reconstruction_data,
-                'analysis': analysis_data,
-                'message': '3D重建成功'
-            }), 200
-            
-        except Exception as e:
-            current_app.logger.exception("NII文件处理失败")
-            import traceback
-            error_detail = traceback.format_exc()
-            current_app.logger.error(f"完整错误堆栈:\n{error_detail}")
+            if vertices is None or len(vertices) == 0:
+                current_app.logger.warning("Marching cubes未生成有效网格")
+                
+                # 诊断信息
+                non_zero_slices = sum(1 for m in masks if np.any(m > 0))
+                total_voxels = sum(np.sum(m > 0) for m in masks)
+                
+                return {
+                    'error': '3D重建失败',
+                    'hint': 'NII文件可能不包含有效的肿瘤区域，或需要启用use_unet=true进行分割',
+                    'diagnostics': {
+                        'total_slices': D,
+                        'non_zero_slices': non_zero_slices,
+                        'total_voxels': int(total_voxels),
+                        'volume_shape': [H, W, D],
+                        'volume_min': volume_min,
+                        'volume_max': volume_max
+                    }
+                }, 400
             
-            # 清理已上传的文件
-            if 'nii_path' in locals() and os.path.exists(nii_path):
-                try:
-                    os.remove(nii_path)
-                except:
-                    pass
+            current_app.logger.info(f"3D重建成功: 顶点={len(vertices)}, 面={len(faces)}, 体积={tumor_volume:.2f}mm³")
             
-            return jsonify({
-                'error': f'NII处理失败: {str(e)}',
-                'type': type(e).__name__,
-                'detail': error_detail if current_app.debug else str(e)
-            }), 500
+            mask_volume = np.stack(masks, axis=2)
+            del masks
+            reconstruction_data = {
+                'vertices': vertices,
+                'faces': faces,
+                'normals': normals,
+                'volume': float(tumor_volume),
+                'dimensions': {'height': H, 'width': W, 'depth': D},
+                'voxel_count': int(np.count_nonzero(mask_volume > 127)),
+                'spacing': spacing
+            }
             
+            # 也为直接二值化分支添加脑部轮廓
+            try:
+                current_app.logger.info("尝试提取脑部轮廓（直接二值化模式）...")
+                # 脑部轮廓需要整体阈值，读取一次原始类型体积
+                with open_nifti(nii_path) as nifti:
+                    volume = nifti.read()
+                brain_data = extract_brain_outline(volume, tuple(spacing))
+                if brain_data:
+                    reconstruction_data['brain_outline'] = brain_data
+                    current_app.logger.info(f"[成功] 脑部轮廓添加成功: 顶点{len(brain_data['vertices'])}, 面{len(brain_data['faces'])}")
+                else:
+                    current_app.logger.warning("[警告] 脑部轮廓提取返回None")
+            except Exception as brain_err:
+                current_app.logger.error(f"脑部轮廓提取失败: {brain_err}")
+        
+        # 保存到数据库（使用专用标记，与普通医学影像区分）
+        medical_image = MedicalImage(
+            filename=filename,
+            original_filename=original_filename,
+            filepath=nii_path,  # 使用filepath而不是file_url
+            uploaded_by=user_id,
+            last_model_used='nii_reconstruction'  # 专用标记，用于过滤
+        )
+        db.session.add(medical_image)
+        db.session.commit()
+        
+        # 3D影像组学（整个肿瘤体积），失败不影响重建结果
+        radiomics_features = None
+        if radiomics_enabled and mask_volume is not None:
+            try:
+                radiomics_features = extract_volumetric_radiomics(
+                    nii_path, mask_volume, spacing=tuple(spacing),
+                    max_workers=current_app.config.get('RADIOMICS_WORKERS', 2)
+                )
+                if radiomics_features:
+                    medical_image.radiomics_features = json.dumps(radiomics_features)
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning(f"3D影像组学特征提取失败: {e}")
+                radiomics_features = None
+        mask_volume = None
+        
+        # 计算分析数据（向量化网格度量）
+        volume_cm3 = reconstruction_data['volume'] / 1000
+        metrics = compute_mesh_metrics(
+            reconstruction_data['vertices'], reconstruction_data['faces'],
+            volume=reconstruction_data['volume']
+        )
+        centroid = metrics['centroid']
+        
+        # 风险评分
+        risk_score = calculate_risk_score(
+            volume_cm3,
+            metrics['compactness'],
+            centroid
+        )
+        
+        analysis_data = {
+            'volume': reconstruction_data['volume'],
+            'volume_cm3': volume_cm3,
+            'surface_area': metrics['surface_area'],
+            'mesh_volume': metrics['mesh_volume'],
+            'centroid': centroid.tolist(),
+            'bounding_box': {
+                'min': metrics['bounding_box']['min'].tolist(),
+                'max': metrics['bounding_box']['max'].tolist()
+            },
+            'compactness': float(metrics['compactness']),
+            'sphericity': metrics['sphericity'],
+            'risk_score': float(risk_score),
+            'voxel_count': reconstruction_data['voxel_count']
+        }
+        
+        # 验证返回数据
+        has_brain_outline = 'brain_outline' in reconstruction_data
+        current_app.logger.info(f"返回数据包含脑部轮廓: {has_brain_outline}")
+        if has_brain_outline:
+            current_app.logger.info(f"  脑部轮廓顶点数: {len(reconstruction_data['brain_outline']['vertices'])}")
+            current_app.logger.info(f"  脑部轮廓面数: {len(reconstruction_data['brain_outline']['faces'])}")
+        
+        if mesh_format == 'glb':
+            model_data = save_mesh_glb(reconstruction_data)
+        else:
+            model_data = mesh_arrays_to_lists(reconstruction_data)
+        if lod_ratios:
+            model_data['lods'] = save_mesh_lods(reconstruction_data, lod_ratios)
+        
+        return {
+            'success': True,
+            'image_id': medical_image.id,
+            'model_data': model_data,
+            'analysis': analysis_data,
+            'radiomics_features': radiomics_features,
+            'message': '3D重建成功'
+        }, 200
+        
     except Exception as e:
-        current_app.logger.exception("upload_nii_for_reconstruction外层异常")
+        current_app.logger.exception("NII文件处理失败")
         import traceback
-        return jsonify({
-            'error': f'请求处理失败: {str(e)}',
+        error_detail = traceback.format_exc()
+        current_app.logger.error(f"完整错误堆栈:\n{error_detail}")
+        
+        # 清理已上传的文件
+        if 'nii_path' in locals() and os.path.exists(nii_path):
+            try:
+                os.remove(nii_path)
+            except:
+                pass
+        
+        return {
+            'error': f'NII处理失败: {str(e)}',
             'type': type(e).__name__,
-            'detail': traceback.format_exc() if current_app.debug else str(e)
-        }), 500
-            
-    except Exception as e:
-        current_app.logger.exception("NII上传失败")
-        return jsonify({
-            'error': f'上传失败: {str(e)}',
-            'detail': str(e),
-            'type': type(e).__name__
-        }), 500
+            'detail': error_detail if current_app.debug else str(e)
+        }, 500
+
+@register_job_handler('nii_reconstruction')
+def run_nii_reconstruction_job(ctx):
+    """后台任务：NII文件3D重建（切片处理占进度的5-90%）"""
+    params = ctx.params
+    ctx.update(1, '加载NII文件', force=True)
+    return process_nii_reconstruction(
+        params['nii_path'], params['filename'], params['original_filename'], ctx.user_id,
+        params.get('spacing', [1.0, 1.0, 1.0]), params.get('use_unet', False),
+        progress=ctx.stage(5, 90, '切片处理中'),
+        mesh_format=params.get('mesh_format', 'json'),
+        lod_ratios=params.get('lod_ratios')
+    )
+
+
+MESH_FORMATS = ('json', 'glb')
+
+
+def get_mesh_dir():
+    """二进制网格文件目录 backend/uploads/meshes"""
+    backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    mesh_dir = os.path.join(backend_root, 'uploads', 'meshes')
+    os.makedirs(mesh_dir, exist_ok=True)
+    return mesh_dir
+
+
+def write_mesh_glb(meshes):
+    """
+    将网格列表写入GLB文件
+
+    文件名取GLB内容的SHA-256，内容不变则URL不变，可按不可变资源缓存。
+
+    Returns:
+        (mesh_url, mesh_size)
+    """
+    glb = export_to_glb(meshes)
+    mesh_filename = f"{hashlib.sha256(glb).hexdigest()[:32]}.glb"
+    mesh_path = os.path.join(get_mesh_dir(), mesh_filename)
+    if not os.path.exists(mesh_path):
+        tmp_path = f"{mesh_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(glb)
+        os.replace(tmp_path, mesh_path)
+    return f'/api/reconstruction/meshes/{mesh_filename}', len(glb)
+
+
+def save_mesh_glb(reconstruction_data):
+    """将肿瘤网格（及脑部轮廓）写入GLB文件，返回不含网格数组的 model_data"""
+    meshes = [{
+        'name': 'tumor',
+        'vertices': reconstruction_data['vertices'],
+        'faces': reconstruction_data['faces'],
+        'normals': reconstruction_data.get('normals')
+    }]
+    brain_outline = reconstruction_data.get('brain_outline')
+    if brain_outline:
+        meshes.append({
+            'name': 'brain_outline',
+            'vertices': brain_outline['vertices'],
+            'faces': brain_outline['faces']
+        })
+
+    mesh_url, mesh_size = write_mesh_glb(meshes)
+
+    model_data = {
+        key: value for key, value in reconstruction_data.items()
+        if key not in ('vertices', 'faces', 'normals', 'brain_outline')
+    }
+    model_data.update({
+        'mesh_format': 'glb',
+        'mesh_url': mesh_url,
+        'mesh_size': mesh_size,
+        'vertex_count': int(len(reconstruction_data['vertices'])),
+        'face_count': int(len(reconstruction_data['faces'])),
+        'meshes': [m['name'] for m in meshes]
+    })
+    if brain_outline:
+        model_data['brain_outline'] = {
+            'vertex_count': int(len(brain_outline['vertices'])),
+            'face_count': int(len(brain_outline['faces']))
+        }
+    return model_data
+
+
+def save_mesh_lods(reconstruction_data, ratios):
+    """
+    生成肿瘤网格（及脑部轮廓）的多级细节，每级写入一个GLB文件
+
+    Returns:
+        [{'ratio', 'mesh_url', 'mesh_size', 'vertex_count', 'face_count', 'brain_outline'}, ...]
+        按从粗到细排序
+    """
+    tumor_levels = build_lod_levels(reconstruction_data['vertices'], reconstruction_data['faces'], ratios)
+    brain_outline = reconstruction_data.get('brain_outline')
+    brain_levels = build_lod_levels(brain_outline['vertices'], brain_outline['faces'], ratios) \
+        if brain_outline else [None] * len(tumor_levels)
+
+    lods = []
+    for tumor, brain in zip(tumor_levels, brain_levels):
+        meshes = [dict(tumor, name='tumor')]
+        if brain is not None:
+            meshes.append(dict(brain, name='brain_outline'))
+        mesh_url, mesh_size = write_mesh_glb(meshes)
+        lod = {
+            'ratio': tumor['ratio'],
+            'mesh_url': mesh_url,
+            'mesh_size': mesh_size,
+            'vertex_count': int(len(tumor['vertices'])),
+            'face_count': int(len(tumor['faces']))
+        }
+        if brain is not None:
+            lod['brain_outline'] = {
+                'vertex_count': int(len(brain['vertices'])),
+                'face_count': int(len(brain['faces']))
+            }
+        lods.append(lod)
+
+    current_app.logger.info(
+        "网格LOD: " + ", ".join(f"{lod['ratio']:g}→{lod['face_count']}面" for lod in lods)
+    )
+    return lods
+
+
+@reconstruction_bp.route('/meshes/<path:mesh_filename>', methods=['GET'])
+def get_mesh_file(mesh_filename):
+    """
+    获取二进制网格文件（GLB）
+
+    GET /api/reconstruction/meshes/<sha256>.glb
+    与 /uploads 静态文件一致不校验JWT；文件名为内容哈希，设置长期缓存。
+    """
+    return send_from_directory(
+        get_mesh_dir(), secure_filename(mesh_filename),
+        mimetype='model/gltf-binary', max_age=31536000
+    )
 
 
 @reconstruction_bp.route('/generate/<int:image_id>', methods=['POST'])
@@ -386,11 +630,9 @@ def generate_3d_model(image_id):
         spacing = data.get('spacing', [1.0, 1.0, 1.0])
         export_stl_flag = data.get('export_stl', False)
         
-        # 检查是否有分割结果
-        if model_type == 'yolo':
-            mask_path = medical_image.yolo_mask_path
-        else:
-            mask_path = medical_image.unet_mask_path
+        # 检查是否有分割结果（该模型最新一次检测记录）
+        run = medical_image.latest_run('yolo' if model_type == 'yolo' else 'unet')
+        mask_path = run.mask_path if run else None
         
         if not mask_path or not os.path.exists(mask_path):
             return jsonify({'error': f'未找到{model_type.upper()}分割结果，请先运行分割'}), 400
@@ -460,24 +702,17 @@ def analyze_tumor_3d(image_id):
         # 基于已有的2D数据估算3D参数
         model_used = medical_image.last_model_used or 'yolo'
         
-        if model_used == 'yolo':
-            tumor_pixels = medical_image.yolo_tumor_pixels or 0
-            total_pixels = medical_image.yolo_total_pixels or 1
-            bbox_x1 = medical_image.yolo_tumor_bbox_x1
-            bbox_y1 = medical_image.yolo_tumor_bbox_y1
-            bbox_x2 = medical_image.yolo_tumor_bbox_x2
-            bbox_y2 = medical_image.yolo_tumor_bbox_y2
-            centroid_x = medical_image.yolo_tumor_centroid_x
-            centroid_y = medical_image.yolo_tumor_centroid_y
-        else:
-            tumor_pixels = medical_image.unet_tumor_pixels or 0
-            total_pixels = medical_image.unet_total_pixels or 1
-            bbox_x1 = medical_image.unet_tumor_bbox_x1
-            bbox_y1 = medical_image.unet_tumor_bbox_y1
-            bbox_x2 = medical_image.unet_tumor_bbox_x2
-            bbox_y2 = medical_image.unet_tumor_bbox_y2
-            centroid_x = medical_image.unet_tumor_centroid_x
-            centroid_y = medical_image.unet_tumor_centroid_y
+        run = medical_image.latest_run('yolo' if model_used == 'yolo' else 'unet')
+        if run is None:
+            run = DetectionRun()
+        tumor_pixels = run.tumor_pixels or 0
+        total_pixels = run.total_pixels or 1
+        bbox_x1 = run.tumor_bbox_x1
+        bbox_y1 = run.tumor_bbox_y1
+        bbox_x2 = run.tumor_bbox_x2
+        bbox_y2 = run.tumor_bbox_y2
+        centroid_x = run.tumor_centroid_x
+        centroid_y = run.tumor_centroid_y
         
         # 估算3D体积（假设切片厚度1mm，像素间距1mm）
         pixel_spacing = 1.0  # mm
@@ -610,23 +845,6 @@ def plan_surgical_path(image_id):
         return jsonify({'error': f'规划失败: {str(e)}'}), 500
 
 
-def estimate_surface_area(faces, vertices):
-    """
-    估算表面积
-    """
-    vertices_array = np.array(vertices)
-    faces_array = np.array(faces)
-    
-    total_area = 0
-    for face in faces_array:
-        v0, v1, v2 = vertices_array[face]
-        # 三角形面积
-        area = 0.5 * np.linalg.norm(np.cross(v1 - v0, v2 - v0))
-        total_area += area
-    
-    return total_area
-
-
 def calculate_risk_score(volume_cm3, compactness, centroid):
     """
     计算风险评分 (0-10)
@@ -685,8 +903,11 @@ def list_nii_files():
     try:
         current_user_id = get_jwt_identity()
         
-        # 查询NII重建文件
-        nii_files = MedicalImage.query.filter(
+        # 查询NII重建文件（只读取返回所需的列）
+        from sqlalchemy.orm import load_only
+        nii_files = MedicalImage.query.options(
+            load_only(MedicalImage.id, MedicalImage.filename, MedicalImage.original_filename, MedicalImage.uploaded_at)
+        ).filter(
             MedicalImage.uploaded_by == current_user_id,
             MedicalImage.last_model_used == 'nii_reconstruction'
         ).order_by(MedicalImage.uploaded_at.desc()).all()
@@ -16,10 +16,15 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 # ===============================
 from models import db
 from models.medical_image import MedicalImage
+from models.detection_run import DetectionRun
 from utils.segmentation import visualize_segmentation_result
 from utils.quantitative_analysis import TumorQuantitativeAnalyzer
 from utils.surgical_planning import generate_surgical_plan
 from utils.radiomics import extract_radiomics_features
+from utils.feature_context import FeatureContext
+from utils.result_cache import get_result_cache
+
+from utils.job_queue import register_job_handler, get_job_queue, wants_async, job_accepted_response
 
 from config.paths import TMP_DIR
 
@@ -45,336 +50,481 @@ def analyze_medical_image(image_id):
         except Exception:
             pass
 
-        # =============================
-        # 2️⃣ 获取影像记录
-        # =============================
-        medical_image = MedicalImage.query.filter(
-            MedicalImage.id == image_id,
-            MedicalImage.uploaded_by == current_user_id
-        ).first()
-
-        if not medical_image:
-            return jsonify({'error': '医学影像不存在或无权限访问'}), 404
-
-        if not os.path.exists(medical_image.filepath):
-            return jsonify({'error': '影像文件不存在'}), 404
-
-        # =============================
-        # 3️⃣ 加载影像
-        # =============================
-        from PIL import Image
+        data = request.get_json(silent=True) or {}
 
-        ext = os.path.splitext(medical_image.filepath)[1].lower()
-        is_nii = medical_image.filepath.lower().endswith(('.nii', '.nii.gz'))
+        # 异步模式：校验影像后立即返回任务ID，分析在后台任务中执行
+        if wants_async():
+            medical_image = MedicalImage.query.filter(
+                MedicalImage.id == image_id,
+                MedicalImage.uploaded_by == current_user_id
+            ).first()
+            if not medical_image:
+                return jsonify({'error': '医学影像不存在或无权限访问'}), 404
+            job = get_job_queue().submit('image_analysis', {
+                'image_id': image_id,
+                'options': data
+            }, user_id=current_user_id)
+            return jsonify(job_accepted_response(job)), 202
+
+        payload, status_code = run_image_analysis(image_id, current_user_id, data)
+        return jsonify(payload), status_code
 
-        try:
-            if ext == '.dcm':
-                import pydicom
-                ds = pydicom.dcmread(medical_image.filepath)
-                arr = ds.pixel_array.astype(np.float32)
-                arr = (arr - arr.min()) / (arr.max() - arr.min() + 1e-6)
-                arr = (arr * 255).astype(np.uint8)
-                image_np = np.stack([arr] * 3, axis=-1)
-
-            elif is_nii:
-                import nibabel as nib
-                img = nib.load(medical_image.filepath)
-                data = img.get_fdata()
-                z = data.shape[2] // 2
-                slice2d = data[:, :, z]
-                slice2d = (slice2d - slice2d.min()) / (slice2d.max() - slice2d.min() + 1e-6)
-                arr = (slice2d * 255).astype(np.uint8)
-                image_np = np.stack([arr] * 3, axis=-1)
+    except Exception as e:
+        current_app.logger.exception("分析医学影像失败")
+        return jsonify({'error': f'分析失败: {str(e)}'}), 500
 
-            else:
-                image_np = np.array(Image.open(medical_image.filepath).convert('RGB'))
 
-        except Exception as e:
-            current_app.logger.exception("影像加载失败")
-            return jsonify({'error': f'影像加载失败: {str(e)}'}), 400
+def run_image_analysis(image_id, current_user_id, data, progress=None):
+    """
+    医学影像分析的完整流程（同步接口与后台任务共用）
+
+    Args:
+        image_id: 影像ID
+        current_user_id: 当前用户ID（仅可分析本人上传的影像）
+        data: 请求参数 {'conf': float, 'weightPath': str}
+        progress: 可选的进度回调 progress(done, total)，每完成一个阶段调用
+
+    Returns:
+        (payload, status_code)
+    """
+    # =============================
+    # 2️⃣ 获取影像记录
+    # =============================
+    medical_image = MedicalImage.query.filter(
+        MedicalImage.id == image_id,
+        MedicalImage.uploaded_by == current_user_id
+    ).first()
+
+    if not medical_image:
+        return {'error': '医学影像不存在或无权限访问'}, 404
+
+    if not os.path.exists(medical_image.filepath):
+        return {'error': '影像文件不存在'}, 404
+
+    # =============================
+    # 3️⃣ 加载影像
+    # =============================
+    try:
+        image_np = load_analysis_image(medical_image.filepath)
+    except Exception as e:
+        current_app.logger.exception("影像加载失败")
+        return {'error': f'影像加载失败: {str(e)}'}, 400
 
-        h, w = image_np.shape[:2]
+    h, w = image_np.shape[:2]
 
-        # =============================
-        # 4️⃣ 获取参数：置信度阈值和权重路径
-        # =============================
-        data = request.get_json(silent=True) or {}
-        try:
-            conf = float(data.get('conf', 0.25))
-        except Exception:
-            conf = 0.25
-        
-        weight_path = data.get('weightPath', None)
-        current_app.logger.info(f"使用置信度: {conf}, 权重路径: {weight_path}")
+    if progress:
+        progress(1, 6)
 
-        # =============================
-        # 5️⃣ 使用 YOLO 模型进行真实分割（参考YOLO11推理脚本）
-        # =============================
-        try:
-            from utils.segmentation import TumorSegmentation
+    # =============================
+    # 4️⃣ 获取参数：置信度阈值和权重路径
+    # =============================
+    try:
+        conf = float(data.get('conf', 0.25))
+    except Exception:
+        conf = 0.25
+    
+    weight_path = data.get('weightPath', None)
+    current_app.logger.info(f"使用置信度: {conf}, 权重路径: {weight_path}")
+
+    # =============================
+    # 5️⃣ YOLO 分割 + 定量分析 + 影像组学（命中结果缓存时跳过）
+    # =============================
+    analysis = compute_image_analysis(medical_image.filepath, image_np, conf, weight_path, progress=progress)
+    segmentation = analysis['segmentation']
+    quantitative_report = analysis['quantitative_analysis']
+    radiomics_features = analysis['radiomics_features']
+    feature_context = analysis['context']
+    
+    pred_mask = segmentation['pred_mask']
+    has_tumor = segmentation['has_tumor']
+    num_instances = segmentation['num_instances']
+    avg_confidence = segmentation['avg_confidence']
+    instances_info = segmentation['instances_info']
+    metrics = segmentation['metrics']
+    boxes = segmentation['boxes']
+
+    # =============================
+    # 6️⃣ 计算风险等级和手术可达性
+    # =============================
+    # 风险等级判断
+    # 肿瘤位置（简化）
+    tumor_location = medical_image.body_part or '脑部中央区域'
+
+    # 从 metrics 中获取更精确的值（tumor_ratio: 百分比，tumor_area_ratio: 小数）
+    tumor_ratio_pct = metrics.get('tumor_ratio', 0.0) if isinstance(metrics, dict) else 0.0
+    tumor_area_ratio = metrics.get('tumor_area_ratio', 0.0) if isinstance(metrics, dict) else 0.0
+    tumor_pixels = metrics.get('tumor_pixels', 0) if isinstance(metrics, dict) else 0
+
+    # 计算风险等级（基于小数形式的 tumor_area_ratio）
+    risk_level = 'low'
+    if has_tumor:
+        if tumor_area_ratio > 0.15:  # 面积占比超过15%
+            risk_level = 'high'
+        elif tumor_area_ratio > 0.05:  # 面积占比5%-15%
+            risk_level = 'medium'
+
+    # 手术可达性（简化判断，基于小数形式）
+    surgical_accessibility = 'moderate'
+    if has_tumor:
+        if tumor_area_ratio < 0.05:
+            surgical_accessibility = 'easy'
+        elif tumor_area_ratio > 0.15:
+            surgical_accessibility = 'difficult'
+
+    segmentation_metrics = {
+        'has_tumor': has_tumor,
+        'num_instances': num_instances,
+        'tumor_ratio': tumor_ratio_pct,  # 百分比
+        'avg_confidence': avg_confidence,
+        'risk_level': risk_level,
+        'surgical_accessibility': surgical_accessibility,
+        'location': tumor_location,
+        'tumor_count': num_instances,
+        'tumor_area_ratio': tumor_area_ratio,  # 小数形式
+        'total_tumor_pixels': int(tumor_pixels)
+    }
+
+    # =============================
+    # 7️⃣ overlay 生成并保存
+    # =============================
+    overlay_data_url = None
+    mask_filename = None
+    overlay_filename = None
+    
+    try:
+        # 生成叠加图
+        overlay_np = visualize_segmentation_result(
+            image_np, {'masks': [pred_mask]}
+        )
+        ok, buf = cv2.imencode('.png', overlay_np.astype(np.uint8))
+        if ok:
+            overlay_data_url = (
+                "data:image/png;base64," +
+                base64.b64encode(buf).decode()
+            )
             
-            # 初始化分割器（使用指定的权重路径）
-            current_app.logger.info(f"初始化YOLO分割器...")
-            segmentor = TumorSegmentation(weight_path=weight_path)
+            # 保存掩码和叠加图到文件
+            uploads_dir = current_app.config.get('UPLOADS_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', 'medical_images'))
+            uploads_root = os.path.dirname(uploads_dir)
+            masks_dir = os.path.join(uploads_root, 'masks')
+            os.makedirs(masks_dir, exist_ok=True)
             
-            # 执行分割（添加imgsz参数，参考参考文件）
-            current_app.logger.info(f"开始YOLO分割，置信度={conf}")
-            result = segmentor.segment_and_analyze(image_np, conf=conf, imgsz=256)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            mask_filename = f"mask_{image_id}_{timestamp}.png"
+            overlay_filename = f"overlay_{image_id}_{timestamp}.png"
             
-            if not result['success']:
-                current_app.logger.warning("分割未成功，使用占位符")
-                pred_mask = np.zeros((h, w), dtype=np.uint8)
-                has_tumor = False
-                num_instances = 0
-                tumor_ratio = 0.0
-                avg_confidence = 0.0
-                instances_info = []
-            else:
-                seg_result = result['segmentation_result']
-                metrics = result['metrics']
-                
-                current_app.logger.info(f"分割成功: {metrics}")
-                
-                # 提取掩码和置信度
-                masks = seg_result.get('masks', None)
-                confidences = seg_result.get('confidences', [])
-                boxes = seg_result.get('boxes', [])
-                
-                if masks is not None and len(masks) > 0:
-                    # 合并所有掩码
-                    pred_mask = np.zeros((h, w), dtype=np.uint8)
-                    for mask in masks:
-                        if mask.shape != (h, w):
-                            mask_resized = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
-                        else:
-                            mask_resized = mask
-                        pred_mask = np.maximum(pred_mask, (mask_resized > 0.5).astype(np.uint8))
-                    
-                    has_tumor = True
-                    num_instances = metrics.get('num_instances', len(masks))
-                    tumor_ratio = metrics.get('tumor_ratio', 0.0)  # 已经是百分比
-                    avg_confidence = metrics.get('avg_confidence', 0.0)
-                    
-                    # 构建实例详情列表（参考参考文件）
-                    instances_info = []
-                    for i in range(len(masks)):
-                        instance = {
-                            'id': i + 1,
-                            'confidence': float(confidences[i]) if i < len(confidences) else 0.0,
-                            'area': int(np.sum(masks[i] > 0.5))
-                        }
-                        if i < len(boxes):
-                            instance['bbox'] = boxes[i].tolist()
-                        instances_info.append(instance)
-                    
-                    current_app.logger.info(f"检测到 {num_instances} 个肿瘤实例，平均置信度={avg_confidence:.3f}")
-                else:
-                    pred_mask = np.zeros((h, w), dtype=np.uint8)
-                    has_tumor = False
-                    num_instances = 0
-                    tumor_ratio = 0.0
-                    avg_confidence = 0.0
-                    instances_info = []
-
-        except Exception as e:
-            current_app.logger.exception("模型推理失败，使用占位符")
-            pred_mask = np.zeros((h, w), dtype=np.uint8)
-            has_tumor = False
-            num_instances = 0
-            tumor_ratio = 0.0
-            avg_confidence = 0.0
-            instances_info = []
-
-        # =============================
-        # 6️⃣ 计算风险等级和手术可达性
-        # =============================
-        # 风险等级判断
-        # 肿瘤位置（简化）
-        tumor_location = medical_image.body_part or '脑部中央区域'
-
-        # 从 metrics 中获取更精确的值（tumor_ratio: 百分比，tumor_area_ratio: 小数）
-        tumor_ratio_pct = metrics.get('tumor_ratio', 0.0) if isinstance(metrics, dict) else 0.0
-        tumor_area_ratio = metrics.get('tumor_area_ratio', 0.0) if isinstance(metrics, dict) else 0.0
-        tumor_pixels = metrics.get('tumor_pixels', 0) if isinstance(metrics, dict) else 0
-
-        # 计算风险等级（基于小数形式的 tumor_area_ratio）
-        risk_level = 'low'
-        if has_tumor:
-            if tumor_area_ratio > 0.15:  # 面积占比超过15%
-                risk_level = 'high'
-            elif tumor_area_ratio > 0.05:  # 面积占比5%-15%
-                risk_level = 'medium'
-
-        # 手术可达性（简化判断，基于小数形式）
-        surgical_accessibility = 'moderate'
-        if has_tumor:
-            if tumor_area_ratio < 0.05:
-                surgical_accessibility = 'easy'
-            elif tumor_area_ratio > 0.15:
-                surgical_accessibility = 'difficult'
-
-        segmentation_metrics = {
+            mask_path = os.path.join(masks_dir, mask_filename)
+            overlay_path = os.path.join(masks_dir, overlay_filename)
+            
+            # 保存掩码图（黑白）
+            cv2.imwrite(mask_path, pred_mask * 255)
+            # 保存叠加图（彩色）
+            cv2.imwrite(overlay_path, overlay_np.astype(np.uint8))
+            
+            current_app.logger.info(f"已保存分割结果: {mask_path}, {overlay_path}")
+    except Exception as e:
+        current_app.logger.exception(f"overlay 生成或保存失败: {e}")
+
+    if progress:
+        progress(4, 6)
+
+    # =============================
+    # 8️⃣ 手术规划（与定量分析、影像组学共享特征上下文）
+    # =============================
+    mask_255 = pred_mask * 255
+    surgical_plan = generate_surgical_plan(
+        quantitative_report,
+        {
+            'age': medical_image.age or 50,
+            'tumor_type': 'unknown',
+            'tumor_location': medical_image.body_part or 'brain'
+        },
+        mask_255,
+        context=feature_context
+    )
+
+    # =============================
+    # 9️⃣ 返回前端（包含完整的肿瘤检测数据）
+    # =============================
+    response = {
+        'image_info': medical_image.to_dict(),
+        'segmentation_result': {
+            'success': has_tumor,
+            'overlay': overlay_data_url,
+            # ⭐ 重要：添加所有肿瘤详细信息，供前端WorkbenchView显示
             'has_tumor': has_tumor,
             'num_instances': num_instances,
-            'tumor_ratio': tumor_ratio_pct,  # 百分比
+            'tumor_ratio': tumor_ratio_pct,  # 使用正确的百分比变量
             'avg_confidence': avg_confidence,
             'risk_level': risk_level,
             'surgical_accessibility': surgical_accessibility,
             'location': tumor_location,
-            'tumor_count': num_instances,
-            'tumor_area_ratio': tumor_area_ratio,  # 小数形式
-            'total_tumor_pixels': int(tumor_pixels)
-        }
-
-        # =============================
-        # 7️⃣ overlay 生成并保存
-        # =============================
-        overlay_data_url = None
-        mask_filename = None
-        overlay_filename = None
+            'instances': instances_info  # ⭐ 添加每个实例的详细信息
+        },
+        'quantitative_analysis': quantitative_report,
+        'radiomics_features': radiomics_features,
+        'surgical_plan': surgical_plan,
+        'analysis_timestamp': datetime.utcnow().isoformat()
+    }
+
+    if progress:
+        progress(5, 6)
+
+    # =============================
+    # 🔟 数据库存储（完整YOLO检测结果）
+    # =============================
+    # 保存YOLO检测结果到数据库（新增一条检测记录）
+    run = DetectionRun(image=medical_image, model_type='yolo', source='analysis')
+    run.has_tumor = has_tumor
+    run.num_instances = num_instances
+    run.avg_confidence = avg_confidence
+    run.tumor_ratio = tumor_ratio_pct  # 百分比
+    run.tumor_pixels = int(tumor_pixels)
+    run.total_pixels = h * w
+    
+    # 保存实例级别详细信息
+    if instances_info:
+        run.instances = json.dumps(instances_info, ensure_ascii=False)
+    
+    # 保存风险评估结果
+    run.risk_level = risk_level
+    run.surgical_accessibility = surgical_accessibility
+    run.location_description = tumor_location
+    
+    # 保存掩码和叠加图路径
+    if mask_filename and overlay_filename:
+        run.mask_path = f'/uploads/masks/{mask_filename}'
+        run.mask_overlay_path = f'/uploads/masks/{overlay_filename}'
+        current_app.logger.info(f"已设置掩码路径: {run.mask_overlay_path}")
+    
+    # 计算肿瘤中心点和边界框（如果有检测结果）
+    if has_tumor and len(boxes) > 0:
+        # 使用第一个检测框的坐标
+        run.tumor_bbox_x1 = float(boxes[0][0])
+        run.tumor_bbox_y1 = float(boxes[0][1])
+        run.tumor_bbox_x2 = float(boxes[0][2])
+        run.tumor_bbox_y2 = float(boxes[0][3])
         
-        try:
-            # 生成叠加图
-            overlay_np = visualize_segmentation_result(
-                image_np, {'masks': [pred_mask]}
-            )
-            ok, buf = cv2.imencode('.png', overlay_np.astype(np.uint8))
-            if ok:
-                overlay_data_url = (
-                    "data:image/png;base64," +
-                    base64.b64encode(buf).decode()
-                )
-                
-                # 保存掩码和叠加图到文件
-                uploads_dir = current_app.config.get('UPLOADS_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', 'medical_images'))
-                uploads_root = os.path.dirname(uploads_dir)
-                masks_dir = os.path.join(uploads_root, 'masks')
-                os.makedirs(masks_dir, exist_ok=True)
-                
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                mask_filename = f"mask_{image_id}_{timestamp}.png"
-                overlay_filename = f"overlay_{image_id}_{timestamp}.png"
-                
-                mask_path = os.path.join(masks_dir, mask_filename)
-                overlay_path = os.path.join(masks_dir, overlay_filename)
-                
-                # 保存掩码图（黑白）
-                cv2.imwrite(mask_path, pred_mask * 255)
-                # 保存叠加图（彩色）
-                cv2.imwrite(overlay_path, overlay_np.astype(np.uint8))
-                
-                current_app.logger.info(f"已保存分割结果: {mask_path}, {overlay_path}")
-        except Exception as e:
-            current_app.logger.exception(f"overlay 生成或保存失败: {e}")
-
-        # =============================
-        # 8️⃣ 定量分析 / 影像组学 / 手术规划
-        # =============================
-        analyzer = TumorQuantitativeAnalyzer()
-        mask_255 = pred_mask * 255
-
-        quantitative_report = analyzer.create_quantitative_report(
-            image_np, mask_255, {'masks': [pred_mask]}
-        )
-
-        radiomics_features = extract_radiomics_features(image_np, mask_255)
-
-        surgical_plan = generate_surgical_plan(
-            quantitative_report,
-            {
-                'age': medical_image.age or 50,
-                'tumor_type': 'unknown',
-                'tumor_location': medical_image.body_part or 'brain'
-            },
-            mask_255
-        )
-
-        # =============================
-        # 9️⃣ 返回前端（包含完整的肿瘤检测数据）
-        # =============================
-        response = {
-            'image_info': medical_image.to_dict(),
-            'segmentation_result': {
-                'success': has_tumor,
-                'overlay': overlay_data_url,
-                # ⭐ 重要：添加所有肿瘤详细信息，供前端WorkbenchView显示
-                'has_tumor': has_tumor,
-                'num_instances': num_instances,
-                'tumor_ratio': tumor_ratio_pct,  # 使用正确的百分比变量
-                'avg_confidence': avg_confidence,
-                'risk_level': risk_level,
-                'surgical_accessibility': surgical_accessibility,
-                'location': tumor_location,
-                'instances': instances_info  # ⭐ 添加每个实例的详细信息
-            },
-            'quantitative_analysis': quantitative_report,
-            'radiomics_features': radiomics_features,
-            'surgical_plan': surgical_plan,
-            'analysis_timestamp': datetime.utcnow().isoformat()
+        # 计算中心点
+        run.tumor_centroid_x = (boxes[0][0] + boxes[0][2]) / 2
+        run.tumor_centroid_y = (boxes[0][1] + boxes[0][3]) / 2
+    
+    db.session.add(run)
+    
+    # 保存旧的detection_result字段（向后兼容）
+    db_result = {
+        'segmentation': {
+            'tumor_detected': has_tumor,
+            'metrics': segmentation_metrics,
+            'instances': instances_info
+        },
+        'quantitative_analysis': quantitative_report,
+        'analysis_timestamp': datetime.utcnow().isoformat()
+    }
+    
+    medical_image.tumor_detected = has_tumor
+    medical_image.detection_result = json.dumps(db_result, ensure_ascii=False)
+    medical_image.status = 'completed'
+    
+    try:
+        db.session.commit()
+        current_app.logger.info(f"成功保存检测结果到数据库，影像ID: {image_id}")
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"保存检测结果失败: {e}")
+
+    return response, 200
+
+
+def load_analysis_image(filepath):
+    """
+    读取待分析影像为RGB uint8数组（DICOM/NIfTI归一化到0-255，NIfTI取中间切片）
+
+    Raises:
+        读取失败时抛出原始异常
+    """
+    from PIL import Image
+
+    ext = os.path.splitext(filepath)[1].lower()
+    is_nii = filepath.lower().endswith(('.nii', '.nii.gz'))
+
+    if ext == '.dcm':
+        import pydicom
+        ds = pydicom.dcmread(filepath)
+        arr = ds.pixel_array.astype(np.float32)
+        arr = (arr - arr.min()) / (arr.max() - arr.min() + 1e-6)
+        arr = (arr * 255).astype(np.uint8)
+        return np.stack([arr] * 3, axis=-1)
+
+    if is_nii:
+        from utils.nifti_volume import open_nifti
+        # 只读取中间切片，不加载整个体积
+        with open_nifti(filepath) as nifti:
+            slice2d = nifti.middle_slice().astype(np.float64)
+        slice2d = (slice2d - slice2d.min()) / (slice2d.max() - slice2d.min() + 1e-6)
+        arr = (slice2d * 255).astype(np.uint8)
+        return np.stack([arr] * 3, axis=-1)
+
+    return np.array(Image.open(filepath).convert('RGB'))
+
+
+def compute_image_analysis(filepath, image_np, conf=0.25, weight_path=None, progress=None):
+    """
+    分割、定量分析与影像组学（分析接口与上传预计算共用）
+
+    同一文件、权重与阈值的结果保存在结果缓存中，命中时跳过推理与特征提取。
+
+    Returns:
+        {'segmentation', 'quantitative_analysis', 'radiomics_features', 'context', 'cached'}
+    """
+    from utils.segmentation import TumorSegmentation
+    
+    # 初始化分割器（使用指定的权重路径，模型经注册表复用，不会重复加载权重）
+    current_app.logger.info(f"初始化YOLO分割器...")
+    segmentor = TumorSegmentation(weight_path=weight_path)
+    
+    result_cache = get_result_cache()
+    cache_key = result_cache.key_for('image_analysis', filepath, segmentor.weight_file, conf=conf, imgsz=256)
+    cached = result_cache.get(cache_key)
+    if cached:
+        current_app.logger.info(f"分析结果缓存命中: {filepath}")
+        cached_arrays, cached_meta = cached
+        segmentation = {
+            'ok': True,
+            'pred_mask': cached_arrays['pred_mask'],
+            'boxes': cached_arrays['boxes'],
+            **cached_meta['segmentation']
         }
+    else:
+        segmentation = _segment_image(segmentor, image_np, conf)
+    
+    if progress:
+        progress(2, 6)
+
+    pred_mask = segmentation['pred_mask']
+    mask_255 = pred_mask * 255
+    # 定量分析、影像组学与手术规划共享灰度图、轮廓、排序像素、直方图等公共预处理
+    feature_context = FeatureContext(image_np, mask_255)
+
+    if cached:
+        quantitative_report = cached_meta['quantitative_analysis']
+        radiomics_features = cached_meta['radiomics_features']
+    else:
+        quantitative_report = TumorQuantitativeAnalyzer().create_quantitative_report(
+            image_np, mask_255, {'masks': [pred_mask]}, context=feature_context
+        )
 
-        # =============================
-        # 🔟 数据库存储（完整YOLO检测结果）
-        # =============================
-        # 保存YOLO检测结果到数据库
-        medical_image.yolo_has_tumor = has_tumor
-        medical_image.yolo_num_instances = num_instances
-        medical_image.yolo_avg_confidence = avg_confidence
-        medical_image.yolo_tumor_ratio = tumor_ratio_pct  # 百分比
-        medical_image.yolo_tumor_pixels = int(tumor_pixels)
-        medical_image.yolo_total_pixels = h * w
+        radiomics_features = extract_radiomics_features(image_np, mask_255, context=feature_context)
+
+        # 推理出错或特征族超时的结果不缓存
+        if segmentation['ok'] and 'failed_families' not in radiomics_features and 'error' not in radiomics_features:
+            result_cache.put(cache_key, {'pred_mask': pred_mask, 'boxes': segmentation['boxes']}, {
+                'segmentation': {k: segmentation[k] for k in (
+                    'has_tumor', 'num_instances', 'avg_confidence', 'instances_info', 'metrics'
+                )},
+                'quantitative_analysis': quantitative_report,
+                'radiomics_features': radiomics_features
+            })
+
+    if progress:
+        progress(3, 6)
+
+    return {
+        'segmentation': segmentation,
+        'quantitative_analysis': quantitative_report,
+        'radiomics_features': radiomics_features,
+        'context': feature_context,
+        'cached': bool(cached)
+    }
+
+
+def _segment_image(segmentor, image_np, conf):
+    """
+    YOLO分割并合并实例掩码
+
+    Returns:
+        dict: pred_mask, boxes, has_tumor, num_instances, avg_confidence, instances_info, metrics,
+            ok（推理未出错，结果可缓存）
+    """
+    h, w = image_np.shape[:2]
+    empty = {
+        'ok': True,
+        'pred_mask': np.zeros((h, w), dtype=np.uint8),
+        'boxes': np.zeros((0, 4), dtype=np.float32),
+        'has_tumor': False,
+        'num_instances': 0,
+        'avg_confidence': 0.0,
+        'instances_info': [],
+        'metrics': {}
+    }
+    try:
+        # 执行分割（添加imgsz参数，参考参考文件）
+        current_app.logger.info(f"开始YOLO分割，置信度={conf}")
+        result = segmentor.segment_and_analyze(image_np, conf=conf, imgsz=256)
         
-        # 保存实例级别详细信息
-        if instances_info:
-            medical_image.yolo_instances = json.dumps(instances_info, ensure_ascii=False)
+        if not result['success']:
+            current_app.logger.warning("分割未成功，使用占位符")
+            return {**empty, 'ok': False}
         
-        # 保存风险评估结果
-        medical_image.yolo_risk_level = risk_level
-        medical_image.yolo_surgical_accessibility = surgical_accessibility
-        medical_image.yolo_location_description = tumor_location
+        seg_result = result['segmentation_result']
+        metrics = result['metrics']
         
-        # 保存掩码和叠加图路径
-        if mask_filename and overlay_filename:
-            medical_image.yolo_mask_path = f'/uploads/masks/{mask_filename}'
-            medical_image.yolo_mask_overlay_path = f'/uploads/masks/{overlay_filename}'
-            current_app.logger.info(f"已设置掩码路径: {medical_image.yolo_mask_overlay_path}")
+        current_app.logger.info(f"分割成功: {metrics}")
         
-        # 计算肿瘤中心点和边界框（如果有检测结果）
-        if has_tumor and len(boxes) > 0:
-            # 使用第一个检测框的坐标
-            medical_image.yolo_tumor_bbox_x1 = float(boxes[0][0])
-            medical_image.yolo_tumor_bbox_y1 = float(boxes[0][1])
-            medical_image.yolo_tumor_bbox_x2 = float(boxes[0][2])
-            medical_image.yolo_tumor_bbox_y2 = float(boxes[0][3])
-            
-            # 计算中心点
-            medical_image.yolo_tumor_centroid_x = (boxes[0][0] + boxes[0][2]) / 2
-            medical_image.yolo_tumor_centroid_y = (boxes[0][1] + boxes[0][3]) / 2
+        # 提取掩码和置信度
+        masks = seg_result.get('masks', None)
+        confidences = seg_result.get('confidences', [])
+        boxes = seg_result.get('boxes', [])
         
-        # 保存旧的detection_result字段（向后兼容）
-        db_result = {
-            'segmentation': {
-                'tumor_detected': has_tumor,
-                'metrics': segmentation_metrics,
-                'instances': instances_info
-            },
-            'quantitative_analysis': quantitative_report,
-            'analysis_timestamp': datetime.utcnow().isoformat()
-        }
+        if masks is None or len(masks) == 0:
+            return {**empty, 'metrics': metrics}
         
-        medical_image.tumor_detected = has_tumor
-        medical_image.detection_result = json.dumps(db_result, ensure_ascii=False)
-        medical_image.status = 'completed'
+        # 合并所有掩码
+        pred_mask = np.zeros((h, w), dtype=np.uint8)
+        for mask in masks:
+            if mask.shape != (h, w):
+                mask_resized = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+            else:
+                mask_resized = mask
+            pred_mask = np.maximum(pred_mask, (mask_resized > 0.5).astype(np.uint8))
         
-        try:
-            db.session.commit()
-            current_app.logger.info(f"成功保存检测结果到数据库，影像ID: {image_id}")
-        except Exception as e:
-            db.session.rollback()
-            current_app.logger.error(f"保存检测结果失败: {e}")
+        num_instances = metrics.get('num_instances', len(masks))
+        avg_confidence = metrics.get('avg_confidence', 0.0)
+        
+        # 构建实例详情列表（参考参考文件）
+        instances_info = []
+        for i in range(len(masks)):
+            instance = {
+                'id': i + 1,
+                'confidence': float(confidences[i]) if i < len(confidences) else 0.0,
+                'area': int(np.sum(masks[i] > 0.5))
+            }
+            if i < len(boxes):
+                instance['bbox'] = boxes[i].tolist()
+            instances_info.append(instance)
+        
+        current_app.logger.info(f"检测到 {num_instances} 个肿瘤实例，平均置信度={avg_confidence:.3f}")
+        return {
+            'ok': True,
+            'pred_mask': pred_mask,
+            'boxes': np.asarray(boxes, dtype=np.float32).reshape(-1, 4),
+            'has_tumor': True,
+            'num_instances': num_instances,
+            'avg_confidence': avg_confidence,
+            'instances_info': instances_info,
+            'metrics': metrics
+        }
 
-        return jsonify(response), 200
+    except Exception:
+        current_app.logger.exception("模型推理失败，使用占位符")
+        return {**empty, 'ok': False}
 
-    except Exception as e:
-        current_app.logger.exception("分析医学影像失败")
-        return jsonify({'error': f'分析失败: {str(e)}'}), 500
+
+@register_job_handler('image_analysis')
+def run_image_analysis_job(ctx):
+    """后台任务：医学影像分析"""
+    ctx.update(1, '加载影像', force=True)
+    return run_image_analysis(
+        ctx.params['image_id'], ctx.user_id, ctx.params.get('options') or {},
+        progress=ctx.stage(5, 95, '分析中')
+    )
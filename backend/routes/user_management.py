@@ -1,10 +1,13 @@
 """
 用户管理路由模块
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.user import User, db
 from utils.auth import admin_required
+from utils.identity_cache import invalidate_identity
+from utils.inference_telemetry import model_info_payload
+from utils.metrics_sampler import monitor_payload
 from werkzeug.security import generate_password_hash
 import re
 import os
@@ -154,6 +157,7 @@ def update_user(user_id):
             user.is_admin = bool(data['is_admin'])
         
         db.session.commit()
+        invalidate_identity(user.id)
         
         return jsonify({
             'message': '用户信息更新成功',
@@ -189,6 +193,7 @@ def delete_user(user_id):
         
         db.session.delete(user)
         db.session.commit()
+        invalidate_identity(user_id)
         
         return jsonify({'message': '用户删除成功'}), 200
         
@@ -202,9 +207,7 @@ def delete_user(user_id):
 @admin_required
 def get_model_info():
     try:
-        version = 'YOLO11'
-        performance = 'AUC=0.89'
-        return jsonify({'version': version, 'performance': performance}), 200
+        return jsonify(model_info_payload(current_app.config.get('MODEL_PATH'))), 200
     except Exception as e:
         return jsonify({'message': '获取模型信息失败', 'error': str(e)}), 500
 
@@ -214,9 +217,7 @@ def get_model_info():
 def update_model():
     try:
         # 这里可集成实际的模型更新逻辑
-        version = 'YOLO11'
-        performance = 'AUC=0.90'
-        return jsonify({'version': version, 'performance': performance}), 200
+        return jsonify(model_info_payload(current_app.config.get('MODEL_PATH'))), 200
     except Exception as e:
         return jsonify({'message': '更新模型失败', 'error': str(e)}), 500
 
@@ -235,11 +236,10 @@ def backup_data():
 @jwt_required()
 @admin_required
 def system_monitor():
+    """系统监控：返回后台采样器的最新快照与近期历史（history 参数指定历史样本数）"""
     try:
-        server_status = 'running'
-        storage_usage = 35
-        api_calls = 128
-        return jsonify({'serverStatus': server_status, 'storageUsage': storage_usage, 'apiCalls': api_calls}), 200
+        history = request.args.get('history', 60, type=int)
+        return jsonify(monitor_payload(history)), 200
     except Exception as e:
         return jsonify({'message': '获取监控信息失败', 'error': str(e)}), 500
 
@@ -300,6 +300,7 @@ def update_profile():
             user.email = email
         
         db.session.commit()
+        invalidate_identity(user.id)
         
         return jsonify({
             'message': '用户资料更新成功',
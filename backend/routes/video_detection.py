@@ -9,6 +9,7 @@ from models import db
 from models.user import User
 from models.medical_image import MedicalImage
 from utils.video_processing import VideoProcessor, analyze_video_summary
+from utils.job_queue import register_job_handler, get_job_queue, wants_async, job_accepted_response
 from werkzeug.utils import secure_filename
 import os
 import json
@@ -91,59 +92,25 @@ def upload_video():
         video_path = os.path.join(video_folder, unique_filename)
         file.save(video_path)
         
-        # 获取视频信息
-        processor = get_video_processor()
-        video_info = processor.get_video_info(video_path)
-        
-        # 提取关键帧并检测
-        frame_results = []
-        for frame_num, frame in processor.extract_frames(
-            video_path, 
-            frame_interval=frame_interval,
-            max_frames=100
-        ):
-            detection = processor.detect_frame(frame, conf_threshold)
-            frame_results.append({
-                'frame': frame_num,
-                **detection
-            })
-        
-        # 生成摘要
-        summary = analyze_video_summary(frame_results)
-        
-        # 创建医学影像记录
-        medical_image = MedicalImage(
-            filename=filename,
-            original_filename=file.filename,
-            filepath=video_path,
-            file_size=os.path.getsize(video_path),
-            mime_type=file.content_type,
-            patient_id=patient_id,
-            patient_name=patient_name,
-            modality='Video',
-            body_part='Brain',
-            scan_date=datetime.utcnow().date(),
-            status='completed',
-            tumor_detected=summary['frames_with_tumor'] > 0,
-            confidence_score=summary['avg_confidence'],
-            detection_result=json.dumps({
-                'video_info': video_info,
-                'summary': summary,
-                'frame_results': frame_results[:10]  # 只保存前10帧详情
-            }),
-            uploaded_by=current_user_id
+        # 异步模式：立即返回任务ID，逐帧检测在后台任务中执行
+        if wants_async():
+            job = get_job_queue().submit('video_detection', {
+                'video_path': video_path,
+                'filename': filename,
+                'original_filename': file.filename,
+                'mime_type': file.content_type,
+                'patient_id': patient_id,
+                'patient_name': patient_name,
+                'conf_threshold': conf_threshold,
+                'frame_interval': frame_interval
+            }, user_id=int(current_user_id))
+            return jsonify(job_accepted_response(job)), 202
+        
+        payload = process_uploaded_video(
+            video_path, filename, file.filename, file.content_type, current_user_id,
+            patient_id, patient_name, conf_threshold, frame_interval
         )
-        
-        db.session.add(medical_image)
-        db.session.commit()
-        
-        return jsonify({
-            'message': '视频上传并分析成功',
-            'image_id': medical_image.id,
-            'video_info': video_info,
-            'summary': summary,
-            'sample_frames': frame_results[:5]  # 返回前5帧结果
-        }), 201
+        return jsonify(payload), 201
     
     except Exception as e:
         db.session.rollback()
@@ -153,6 +120,90 @@ def upload_video():
         return jsonify({'error': f'上传失败: {str(e)}'}), 500
 
 
+def process_uploaded_video(video_path, filename, original_filename, mime_type, user_id,
+                           patient_id, patient_name, conf_threshold, frame_interval,
+                           progress=None, max_frames=100):
+    """
+    对已保存的视频抽帧检测并写入数据库（同步接口与后台任务共用）
+
+    Args:
+        progress: 可选的进度回调 progress(done, total)，每检测一帧调用一次
+
+    Returns:
+        响应数据字典
+    """
+    # 获取视频信息
+    processor = get_video_processor()
+    video_info = processor.get_video_info(video_path)
+    expected_frames = min(max_frames, -(-max(video_info['frame_count'], 1) // max(frame_interval, 1)))
+    
+    # 提取关键帧并检测
+    frame_results = []
+    for frame_num, frame in processor.extract_frames(
+        video_path, 
+        frame_interval=frame_interval,
+        max_frames=max_frames
+    ):
+        detection = processor.detect_frame(frame, conf_threshold)
+        frame_results.append({
+            'frame': frame_num,
+            **detection
+        })
+        if progress:
+            progress(len(frame_results), max(expected_frames, len(frame_results)))
+    
+    # 生成摘要
+    summary = analyze_video_summary(frame_results)
+    
+    # 创建医学影像记录
+    medical_image = MedicalImage(
+        filename=filename,
+        original_filename=original_filename,
+        filepath=video_path,
+        file_size=os.path.getsize(video_path),
+        mime_type=mime_type,
+        patient_id=patient_id,
+        patient_name=patient_name,
+        modality='Video',
+        body_part='Brain',
+        scan_date=datetime.utcnow().date(),
+        status='completed',
+        tumor_detected=summary['frames_with_tumor'] > 0,
+        confidence_score=summary['avg_confidence'],
+        detection_result=json.dumps({
+            'video_info': video_info,
+            'summary': summary,
+            'frame_results': frame_results[:10]  # 只保存前10帧详情
+        }),
+        uploaded_by=user_id
+    )
+    
+    db.session.add(medical_image)
+    db.session.commit()
+    
+    return {
+        'message': '视频上传并分析成功',
+        'image_id': medical_image.id,
+        'video_info': video_info,
+        'summary': summary,
+        'sample_frames': frame_results[:5]  # 返回前5帧结果
+    }
+
+
+@register_job_handler('video_detection')
+def run_video_detection_job(ctx):
+    """后台任务：视频抽帧检测"""
+    params = ctx.params
+    ctx.update(1, '读取视频', force=True)
+    payload = process_uploaded_video(
+        params['video_path'], params['filename'], params['original_filename'], params.get('mime_type'),
+        ctx.user_id, params.get('patient_id', ''), params.get('patient_name', ''),
+        params.get('conf_threshold', 0.25), params.get('frame_interval', 30),
+        progress=ctx.stage(2, 95, '逐帧检测中')
+    )
+    return payload, 201
+
+
 @video_detection_bp.route('/stream/detect', methods=['POST'])
 @jwt_required()
 def detect_stream_frame():
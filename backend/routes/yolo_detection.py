@@ -9,49 +9,55 @@ from functools import wraps
 import os
 import json
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import cv2
 import numpy as np
 
-from models import db, MedicalImage, User
-
-try:
-    from backend.utils.predictor import YOLO11TumorPredictor
-except ImportError:
-    try:
-        from backend.utils.predictor import YOLO11TumorPredictor
-    except ImportError:
-        # 如果自定义predictor不可用，使用基础的YOLO模型
-        from ultralytics import YOLO
-        YOLO11TumorPredictor = None
+from models import db, DetectionRun, MedicalImage, User
+from utils.model_registry import get_model_registry
+from utils.result_cache import get_result_cache
+from utils.segmentation import run_yolo_inference, run_yolo_inference_batch
 
 yolo_detection_bp = Blueprint('yolo_detection', __name__, url_prefix='/api/yolo')
 
 
+def get_yolo_model_path():
+    """当前配置的YOLO11权重路径（优先使用自定义的YOLO11脑肿瘤模型）"""
+    model_path = current_app.config.get('MODEL_PATH', 'backend/yolov8n.pt')
+    custom_model = current_app.config.get('YOLO11_TUMOR_MODEL', None)
+    if custom_model and os.path.exists(custom_model):
+        model_path = custom_model
+    return model_path
+
+
 def get_yolo_predictor():
-    """获取或初始化YOLO11预测器（单例模式）"""
-    if not hasattr(current_app, '_yolo_predictor'):
-        model_path = current_app.config.get('MODEL_PATH', 'backend/yolov8n.pt')
-        try:
-            # 尝试使用自定义的YOLO11脑肿瘤模型
-            if YOLO11TumorPredictor:
-                custom_model = current_app.config.get('YOLO11_TUMOR_MODEL', None)
-                if custom_model and os.path.exists(custom_model):
-                    model_path = custom_model
-                
-                current_app._yolo_predictor = YOLO11TumorPredictor(
-                    weight_path=model_path,
-                    conf_threshold=current_app.config.get('YOLO_CONF_THRESHOLD', 0.25),
-                    iou_threshold=current_app.config.get('YOLO_IOU_THRESHOLD', 0.7)
-                )
-            else:
-                # 使用基础YOLO模型
-                current_app._yolo_predictor = YOLO(model_path)
-        except Exception as e:
-            current_app.logger.error(f"YOLO模型加载失败: {e}")
-            current_app._yolo_predictor = None
-    
-    return current_app._yolo_predictor
+    """获取YOLO11模型（经模型注册表复用，与其他蓝图共享同一实例）"""
+    try:
+        return get_model_registry().get(get_yolo_model_path(), 'yolo')
+    except Exception as e:
+        current_app.logger.error(f"YOLO模型加载失败: {e}")
+        return None
+
+
+def run_detection(predictor, image):
+    """使用应用配置的阈值对单张图像执行一次推理"""
+    return run_yolo_inference(
+        predictor,
+        image,
+        imgsz=256,
+        conf=current_app.config.get('YOLO_CONF_THRESHOLD', 0.25),
+        iou=current_app.config.get('YOLO_IOU_THRESHOLD', 0.7)
+    )
+
+
+def detection_cache_key(filepath):
+    """检测结果缓存键：(文件哈希, 权重哈希, 模型类型, 阈值, 推理尺寸)"""
+    return get_result_cache().key_for(
+        'yolo_detection', filepath, get_yolo_model_path(), imgsz=256,
+        conf=current_app.config.get('YOLO_CONF_THRESHOLD', 0.25),
+        iou=current_app.config.get('YOLO_IOU_THRESHOLD', 0.7)
+    )
 
 
 def calculate_risk_level(tumor_ratio, num_instances):
@@ -154,26 +160,47 @@ def detect_tumor(image_id):
         if not os.path.exists(medical_image.filepath):
             return jsonify({'success': False, 'message': '文件不存在'}), 400
         
-        # 获取预测器
-        predictor = get_yolo_predictor()
-        if not predictor:
-            return jsonify({'success': False, 'message': 'YOLO模型未初始化'}), 500
+        # 同一文件、权重与阈值的检测结果命中缓存时跳过模型加载与推理
+        result_cache = get_result_cache()
+        cache_key = detection_cache_key(medical_image.filepath)
+        cached = result_cache.get(cache_key)
+        
+        if not cached:
+            # 获取预测器
+            predictor = get_yolo_predictor()
+            if not predictor:
+                return jsonify({'success': False, 'message': 'YOLO模型未初始化'}), 500
         
-        # 获取图像尺寸
+        # 读取图像（整个请求只解码一次）
         img = cv2.imread(medical_image.filepath)
         if img is None:
             return jsonify({'success': False, 'message': '无法读取图像'}), 400
         
         img_height, img_width = img.shape[:2]
         
-        # 执行检测
-        import time
-        start_time = time.time()
-        analysis = predictor.analyze_prediction(medical_image.filepath, imgsz=256)
-        inference_time = time.time() - start_time
-        
-        # 生成分割掩码
-        combined_mask, num_instances = predictor.get_combined_mask(medical_image.filepath, imgsz=256)
+        if cached:
+            cached_arrays, cached_meta = cached
+            analysis = cached_meta['analysis']
+            inference_time = cached_meta['inference_time']
+            combined_mask = cached_arrays['combined_mask']
+            boxes = cached_arrays['boxes']
+            confidences = cached_arrays['confidences']
+        else:
+            # 执行检测：单次前向推理同时得到指标、合并掩码、检测框和置信度
+            import time
+            start_time = time.time()
+            inference = run_detection(predictor, img)
+            inference_time = time.time() - start_time
+            
+            analysis = inference.analysis()
+            combined_mask = inference.combined_mask
+            boxes = inference.boxes
+            confidences = inference.confidences
+            result_cache.put(cache_key, {
+                'combined_mask': combined_mask,
+                'boxes': boxes,
+                'confidences': confidences
+            }, {'analysis': analysis, 'inference_time': inference_time})
         
         # 保存掩码
         uploads_dir = current_app.config.get('UPLOADS_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', 'medical_images'))
@@ -193,11 +220,6 @@ def detect_tumor(image_id):
         overlay_path = os.path.join(masks_dir, overlay_filename)
         cv2.imwrite(overlay_path, overlay_img)
         
-        # 获取详细预测结果（包括置信度和边界框）
-        results, masks, boxes, confidences = predictor.predict(
-            medical_image.filepath, imgsz=256
-        )
-        
         # 计算肿瘤中心和边界框
         centroid_x = None
         centroid_y = None
@@ -260,29 +282,31 @@ def detect_tumor(image_id):
                 'area': (x2 - x1) * (y2 - y1)
             })
         
-        # 更新医学影像记录
-        medical_image.yolo_has_tumor = analysis['has_tumor']
-        medical_image.yolo_num_instances = analysis['num_instances']
-        medical_image.yolo_avg_confidence = round(analysis['avg_confidence'], 4)
-        medical_image.yolo_tumor_ratio = round(analysis['tumor_ratio'], 2)
-        medical_image.yolo_tumor_pixels = analysis['tumor_pixels']
-        medical_image.yolo_total_pixels = analysis['total_pixels']
-        medical_image.yolo_mask_path = f'/uploads/masks/{mask_filename}'
-        medical_image.yolo_mask_overlay_path = f'/uploads/masks/{overlay_filename}'
-        medical_image.yolo_tumor_centroid_x = centroid_x
-        medical_image.yolo_tumor_centroid_y = centroid_y
-        medical_image.yolo_tumor_bbox_x1 = bbox_x1
-        medical_image.yolo_tumor_bbox_y1 = bbox_y1
-        medical_image.yolo_tumor_bbox_x2 = bbox_x2
-        medical_image.yolo_tumor_bbox_y2 = bbox_y2
-        medical_image.yolo_risk_level = risk_level
-        medical_image.yolo_surgical_accessibility = surgical_accessibility
-        medical_image.yolo_location_description = location_description
-        medical_image.yolo_instances = json.dumps(instances_data, ensure_ascii=False)
-        medical_image.yolo_segmentation_quality = 0.85  # 可根据实际情况调整
-        medical_image.yolo_model_version = '11n'
-        medical_image.yolo_inference_time = round(inference_time, 3)
-        medical_image.yolo_diagnostic_report = json.dumps(diagnostic_report, ensure_ascii=False)
+        # 保存本次检测记录
+        run = DetectionRun(image=medical_image, model_type='yolo', source='detection')
+        run.has_tumor = analysis['has_tumor']
+        run.num_instances = analysis['num_instances']
+        run.avg_confidence = round(analysis['avg_confidence'], 4)
+        run.tumor_ratio = round(analysis['tumor_ratio'], 2)
+        run.tumor_pixels = analysis['tumor_pixels']
+        run.total_pixels = analysis['total_pixels']
+        run.mask_path = f'/uploads/masks/{mask_filename}'
+        run.mask_overlay_path = f'/uploads/masks/{overlay_filename}'
+        run.tumor_centroid_x = centroid_x
+        run.tumor_centroid_y = centroid_y
+        run.tumor_bbox_x1 = bbox_x1
+        run.tumor_bbox_y1 = bbox_y1
+        run.tumor_bbox_x2 = bbox_x2
+        run.tumor_bbox_y2 = bbox_y2
+        run.risk_level = risk_level
+        run.surgical_accessibility = surgical_accessibility
+        run.location_description = location_description
+        run.instances = json.dumps(instances_data, ensure_ascii=False)
+        run.segmentation_quality = 0.85  # 可根据实际情况调整
+        run.model_version = '11n'
+        run.inference_time = round(inference_time, 3)
+        run.diagnostic_report = json.dumps(diagnostic_report, ensure_ascii=False)
+        db.session.add(run)
         medical_image.updated_at = datetime.utcnow()
         
         db.session.commit()
@@ -302,6 +326,7 @@ def detect_tumor(image_id):
                 'segmentation_mask_url': f'/uploads/masks/{mask_filename}',
                 'overlay_url': f'/uploads/masks/{overlay_filename}',
                 'inference_time': round(inference_time, 3),
+                'from_cache': bool(cached),
                 'instances': instances_data,
                 'diagnostic_report': diagnostic_report
             }
@@ -326,37 +351,41 @@ def get_detection_results(image_id):
         if not medical_image:
             return jsonify({'success': False, 'message': '医学影像不存在'}), 404
         
+        run = medical_image.latest_run('yolo', with_blobs=True)
+        if run is None:
+            run = DetectionRun(model_type='yolo', has_tumor=False, num_instances=0)
+        
         return jsonify({
             'success': True,
             'data': {
                 'image_id': image_id,
-                'has_tumor': medical_image.yolo_has_tumor,
-                'num_instances': medical_image.yolo_num_instances,
-                'avg_confidence': medical_image.yolo_avg_confidence,
-                'tumor_ratio': medical_image.yolo_tumor_ratio,
-                'tumor_pixels': medical_image.yolo_tumor_pixels,
-                'total_pixels': medical_image.yolo_total_pixels,
-                'risk_level': medical_image.yolo_risk_level,
-                'surgical_accessibility': medical_image.yolo_surgical_accessibility,
-                'location': medical_image.yolo_location_description,
+                'has_tumor': run.has_tumor,
+                'num_instances': run.num_instances,
+                'avg_confidence': run.avg_confidence,
+                'tumor_ratio': run.tumor_ratio,
+                'tumor_pixels': run.tumor_pixels,
+                'total_pixels': run.total_pixels,
+                'risk_level': run.risk_level,
+                'surgical_accessibility': run.surgical_accessibility,
+                'location': run.location_description,
                 'centroid': {
-                    'x': medical_image.yolo_tumor_centroid_x,
-                    'y': medical_image.yolo_tumor_centroid_y
+                    'x': run.tumor_centroid_x,
+                    'y': run.tumor_centroid_y
                 },
                 'bbox': {
-                    'x1': medical_image.yolo_tumor_bbox_x1,
-                    'y1': medical_image.yolo_tumor_bbox_y1,
-                    'x2': medical_image.yolo_tumor_bbox_x2,
-                    'y2': medical_image.yolo_tumor_bbox_y2
+                    'x1': run.tumor_bbox_x1,
+                    'y1': run.tumor_bbox_y1,
+                    'x2': run.tumor_bbox_x2,
+                    'y2': run.tumor_bbox_y2
                 },
-                'mask_url': medical_image.yolo_mask_path,
-                'overlay_url': medical_image.yolo_mask_overlay_path,
-                'instances': json.loads(medical_image.yolo_instances) if medical_image.yolo_instances else [],
-                'segmentation_quality': medical_image.yolo_segmentation_quality,
-                'model_version': medical_image.yolo_model_version,
-                'inference_time': medical_image.yolo_inference_time,
-                'diagnostic_report': json.loads(medical_image.yolo_diagnostic_report) if medical_image.yolo_diagnostic_report else None,
-                'detection_time': medical_image.updated_at.isoformat()
+                'mask_url': run.mask_path,
+                'overlay_url': run.mask_overlay_path,
+                'instances': json.loads(run.instances) if run.instances else [],
+                'segmentation_quality': run.segmentation_quality,
+                'model_version': run.model_version,
+                'inference_time': run.inference_time,
+                'diagnostic_report': json.loads(run.diagnostic_report) if run.diagnostic_report else None,
+                'detection_time': (run.created_at or medical_image.updated_at).isoformat()
             }
         }), 200
         
@@ -368,12 +397,23 @@ def get_detection_results(image_id):
         }), 500
 
 
+def _read_image(filepath):
+    """在线程池中解码图像（cv2解码释放GIL），失败返回None"""
+    try:
+        return cv2.imread(filepath)
+    except Exception:
+        return None
+
+
 @yolo_detection_bp.route('/batch-detect', methods=['POST'])
 @jwt_required()
 def batch_detect():
     """
     批量检测多个医学影像
-    
+
+    一次查询取出全部记录，线程池并行解码，按固定大小的mini-batch送入模型。
+    mini-batch大小由 YOLO_BATCH_SIZE 配置，解码线程数由 YOLO_DECODE_WORKERS 配置。
+
     Request:
         {
             "image_ids": [1, 2, 3, ...]
@@ -386,29 +426,71 @@ def batch_detect():
         if not image_ids:
             return jsonify({'success': False, 'message': '未提供图像ID'}), 400
         
-        results = []
+        predictor = get_yolo_predictor()
+        if not predictor:
+            return jsonify({
+                'success': True,
+                'message': '完成 0 个检测',
+                'data': []
+            }), 200
+        
+        # 一次查询取出全部记录，按请求顺序排列（跳过不存在的记录和文件）
+        normalized_ids = []
         for image_id in image_ids:
-            medical_image = MedicalImage.query.get(image_id)
+            try:
+                normalized_ids.append((image_id, int(image_id)))
+            except (TypeError, ValueError):
+                continue
+        records = MedicalImage.query.filter(
+            MedicalImage.id.in_({pk for _, pk in normalized_ids})
+        ).all() if normalized_ids else []
+        records_by_id = {record.id: record for record in records}
+        targets = []
+        for image_id, pk in normalized_ids:
+            medical_image = records_by_id.get(pk)
             if not medical_image or not os.path.exists(medical_image.filepath):
                 continue
-            
-            try:
-                predictor = get_yolo_predictor()
-                if not predictor:
+            targets.append((image_id, medical_image))
+        
+        batch_size = max(1, int(current_app.config.get('YOLO_BATCH_SIZE', 16)))
+        workers = max(1, int(current_app.config.get('YOLO_DECODE_WORKERS', 4)))
+        conf = current_app.config.get('YOLO_CONF_THRESHOLD', 0.25)
+        iou = current_app.config.get('YOLO_IOU_THRESHOLD', 0.7)
+        
+        results = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            chunks = [targets[i:i + batch_size] for i in range(0, len(targets), batch_size)]
+            # 预取下一个mini-batch的解码，与当前批次推理重叠；内存中最多保留两批图像
+            pending = executor.map(_read_image, [m.filepath for _, m in chunks[0]]) if chunks else None
+            for index, chunk in enumerate(chunks):
+                images = list(pending)
+                if index + 1 < len(chunks):
+                    pending = executor.map(_read_image, [m.filepath for _, m in chunks[index + 1]])
+                
+                decoded = [(target, img) for target, img in zip(chunk, images) if img is not None]
+                if not decoded:
                     continue
                 
-                analysis = predictor.analyze_prediction(medical_image.filepath)
-                results.append({
-                    'image_id': image_id,
-                    'filename': medical_image.original_filename,
-                    'has_tumor': analysis['has_tumor'],
-                    'num_instances': analysis['num_instances'],
-                    'tumor_ratio': round(analysis['tumor_ratio'], 2),
-                    'avg_confidence': round(analysis['avg_confidence'], 4)
-                })
-            except Exception as e:
-                current_app.logger.error(f"批量检测 {image_id} 失败: {e}")
-                continue
+                try:
+                    inferences = run_yolo_inference_batch(
+                        predictor, [img for _, img in decoded], imgsz=256, conf=conf, iou=iou
+                    )
+                except Exception as e:
+                    current_app.logger.error(
+                        f"批量检测 {[image_id for (image_id, _), _ in decoded]} 失败: {e}"
+                    )
+                    continue
+                
+                for ((image_id, medical_image), _), inference in zip(decoded, inferences):
+                    analysis = inference.analysis()
+                    results.append({
+                        'image_id': image_id,
+                        'filename': medical_image.original_filename,
+                        'has_tumor': analysis['has_tumor'],
+                        'num_instances': analysis['num_instances'],
+                        'tumor_ratio': round(analysis['tumor_ratio'], 2),
+                        'avg_confidence': round(analysis['avg_confidence'], 4)
+                    })
         
         return jsonify({
             'success': True,
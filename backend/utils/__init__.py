@@ -2,14 +2,10 @@
 Utils package for tumor detection project
 """
 
-# 导入所有工具模块
-from . import segmentation
-from . import quantitative_analysis
-from . import surgical_planning
-from . import radiomics
-from . import image_processing
-from . import auth
+import importlib
 
+# 子模块按需导入（utils.segmentation 等属性访问时才加载）：
+# 特征计算工作进程只导入影像组学模块，不加载 torch / Flask
 __all__ = [
     'segmentation',
     'quantitative_analysis', 
@@ -17,4 +13,10 @@ __all__ = [
     'radiomics',
     'image_processing',
     'auth'
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,23 +1,18 @@
 from functools import wraps
 from flask import jsonify
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
-from models.user import User
+from utils.identity_cache import get_identity_cache
 
 def admin_required(f):
     """
-    管理员权限装饰器
+    管理员权限装饰器（用户标志来自身份缓存）
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
         verify_jwt_in_request()
-        current_user_id = get_jwt_identity()
-        try:
-            current_user_id = int(current_user_id)
-        except Exception:
-            pass
-        current_user = User.query.get(current_user_id)
+        identity = get_identity_cache().get(get_jwt_identity())
         
-        if not current_user or not hasattr(current_user, 'is_admin') or not current_user.is_admin:
+        if not identity or not identity.is_admin:
             return jsonify({'message': '需要管理员权限'}), 403
         
         return f(*args, **kwargs)
@@ -25,19 +20,14 @@ def admin_required(f):
 
 def login_required(f):
     """
-    登录验证装饰器
+    登录验证装饰器（用户标志来自身份缓存）
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
         verify_jwt_in_request()
-        current_user_id = get_jwt_identity()
-        try:
-            current_user_id = int(current_user_id)
-        except Exception:
-            pass
-        current_user = User.query.get(current_user_id)
+        identity = get_identity_cache().get(get_jwt_identity())
         
-        if not current_user or not current_user.is_active:
+        if not identity or not identity.is_active:
             return jsonify({'message': '用户未激活或不存在'}), 403
         
         return f(*args, **kwargs)
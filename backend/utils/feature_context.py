@@ -0,0 +1,117 @@
+"""
+单次分析共享的特征上下文
+定量分析、影像组学与手术规划对同一图像/掩码的公共预处理（灰度化、掩码二值化、
+包围盒、轮廓、ROI像素排序、直方图、纹理量化）只计算一次，按需惰性生成并缓存。
+"""
+
+from functools import cached_property
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils.texture_matrices import DEFAULT_LEVELS, mask_bounding_box, quantize_roi
+
+
+class FeatureContext:
+    """一次分析中图像与掩码的派生数据"""
+
+    def __init__(self, image, mask):
+        """
+        Args:
+            image: 原始图像（RGB或灰度，numpy数组或PIL图像）
+            mask: 肿瘤分割掩码（非零为肿瘤）
+        """
+        if isinstance(image, Image.Image):
+            image = np.array(image)
+        if isinstance(mask, Image.Image):
+            mask = np.array(mask)
+        self.image = image
+        # 与各模块原先的处理一致：二值化为 0/255 的uint8掩码
+        self.mask = (np.asarray(mask) > 0).astype(np.uint8) * 255
+
+    @classmethod
+    def ensure(cls, context: Optional['FeatureContext'], image, mask) -> 'FeatureContext':
+        """复用已有上下文，未提供时新建"""
+        return context if context is not None else cls(image, mask)
+
+    # ------------------------------------------------------------
+    # 图像与掩码
+    # ------------------------------------------------------------
+    @cached_property
+    def gray(self) -> np.ndarray:
+        """二维灰度图像"""
+        if len(self.image.shape) == 3:
+            return cv2.cvtColor(self.image, cv2.COLOR_RGB2GRAY)
+        return self.image
+
+    @cached_property
+    def roi(self) -> np.ndarray:
+        """布尔型肿瘤区域"""
+        return self.mask > 0
+
+    @cached_property
+    def tumor_pixel_count(self) -> int:
+        return int(np.count_nonzero(self.roi))
+
+    @cached_property
+    def bbox(self) -> Tuple[int, int, int, int]:
+        """肿瘤包围盒 (y0, y1, x0, x1)，无肿瘤时为整幅图像"""
+        return mask_bounding_box(self.mask, self.mask.shape)
+
+    @cached_property
+    def masked_gray(self) -> np.ndarray:
+        """肿瘤区域外置零的灰度图像"""
+        return np.where(self.roi, self.gray, 0)
+
+    # ------------------------------------------------------------
+    # 轮廓
+    # ------------------------------------------------------------
+    @cached_property
+    def contours(self):
+        """外轮廓列表（RETR_EXTERNAL + CHAIN_APPROX_SIMPLE）"""
+        contours, _ = cv2.findContours(self.mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return contours
+
+    @cached_property
+    def largest_contour(self):
+        """面积最大的轮廓，无轮廓时为None"""
+        return max(self.contours, key=cv2.contourArea) if len(self.contours) else None
+
+    # ------------------------------------------------------------
+    # ROI像素统计
+    # ------------------------------------------------------------
+    @cached_property
+    def roi_pixels(self) -> np.ndarray:
+        """肿瘤区域灰度值（原始类型，一维）"""
+        return self.gray[self.roi]
+
+    @cached_property
+    def sorted_roi_pixels(self) -> np.ndarray:
+        """排序后的肿瘤区域灰度值（float32），百分位数/中位数共用"""
+        return np.sort(self.roi_pixels.astype(np.float32))
+
+    def percentile(self, q: float) -> float:
+        """ROI灰度百分位数（线性插值，与 np.percentile 默认方法一致）"""
+        values = self.sorted_roi_pixels
+        if values.size == 0:
+            return 0.0
+        position = (values.size - 1) * q / 100.0
+        lower = int(np.floor(position))
+        upper = min(lower + 1, values.size - 1)
+        fraction = position - lower
+        return float(values[lower] + (values[upper] - values[lower]) * fraction)
+
+    @cached_property
+    def histogram(self) -> np.ndarray:
+        """ROI灰度直方图（256个bin，范围[0, 256)）"""
+        return np.histogram(self.roi_pixels, bins=256, range=(0, 256))[0]
+
+    # ------------------------------------------------------------
+    # 纹理
+    # ------------------------------------------------------------
+    @cached_property
+    def quantized(self) -> np.ndarray:
+        """纹理矩阵使用的量化ROI（裁剪到包围盒，ROI外为-1）"""
+        return quantize_roi(self.gray, self.mask, DEFAULT_LEVELS)
@@ -0,0 +1,284 @@
+"""
+特征计算进程池 - 影像组学各特征族的并行计算
+进程级可复用的工作进程池：图像/掩码数组通过共享内存传给工作进程（不经管道序列化）。
+工作进程由 forkserver（不支持时为 spawn）启动，不从加载了 torch/OpenCV 的多线程主进程直接 fork。
+每个特征族从开始在工作进程上运行时计时，超时的特征族返回空结果且不阻塞整体分析；
+超时只终止运行该特征族的工作进程（随后补充新进程），不影响其他请求正在运行的特征族。
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import wait as connection_wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.feature_worker import PRELOAD_MODULES, worker_main
+
+
+# 默认每个特征族的超时时间（秒）
+DEFAULT_FAMILY_TIMEOUT = 30.0
+
+# 有特征族排队等待空闲工作进程时，轮询结果的间隔（秒）
+_POLL_INTERVAL = 0.05
+
+
+class _Worker:
+    """一个工作进程及其管道"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn,),
+                                       name='feature-worker', daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+
+    def stop(self):
+        """正常退出（空闲进程）"""
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=1)
+        except (OSError, ValueError):
+            pass
+        self.kill()
+
+
+class FeaturePool:
+    """按特征族并行计算的进程池（工作进程懒创建，跨请求复用）"""
+
+    def __init__(self, max_workers: int = 2, timeout: float = DEFAULT_FAMILY_TIMEOUT):
+        self.max_workers = max(1, int(max_workers))
+        self.timeout = float(timeout)
+        self._context = None
+        self._idle: List[_Worker] = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def parallel(self) -> bool:
+        return self.max_workers > 1
+
+    # ------------------------------------------------------------
+    # 工作进程管理
+    # ------------------------------------------------------------
+    def _get_context(self):
+        if self._context is None:
+            methods = multiprocessing.get_all_start_methods()
+            if 'forkserver' in methods:
+                context = multiprocessing.get_context('forkserver')
+                # 只预先导入工作进程模块，不导入 __main__（应用入口）
+                context.set_forkserver_preload(PRELOAD_MODULES)
+            else:
+                context = multiprocessing.get_context('spawn')
+            # 先启动共享内存跟踪进程，使工作进程与主进程共用同一个跟踪进程
+            resource_tracker.ensure_running()
+            self._context = context
+        return self._context
+
+    def _acquire(self, block: bool) -> Optional[_Worker]:
+        """取一个空闲工作进程（不足 max_workers 时新建）；block=False 且无可用进程时返回None"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise OSError('特征进程池已关闭')
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_workers:
+                    self._size += 1
+                    context = self._get_context()
+                    break
+                if not block:
+                    return None
+                self._cond.wait()
+        try:
+            return _Worker(context)
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify_all()
+            raise
+
+    def _release(self, worker: _Worker, healthy: bool = True):
+        """归还工作进程；healthy=False（超时/异常退出）时终止该进程，下次按需补充"""
+        with self._cond:
+            if healthy and not self._closed:
+                self._idle.append(worker)
+                self._cond.notify_all()
+                return
+            self._size -= 1
+            self._cond.notify_all()
+        worker.kill()
+
+    # ------------------------------------------------------------
+    # 计算
+    # ------------------------------------------------------------
+    def run(self, tasks: Dict[str, Callable[..., Any]], arrays: Dict[str, np.ndarray],
+            local_kwargs: Optional[Dict[str, Any]] = None,
+            timeout: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        计算各特征族
+
+        Args:
+            tasks: 特征族名 -> 模块级函数（或其 functools.partial）func(**arrays)
+            arrays: 传给各函数的numpy数组
+            local_kwargs: 仅串行（进程内）执行时额外传入的参数，如共享的特征上下文
+            timeout: 每个特征族的超时时间（秒），None 使用池的默认值，<=0 表示不限时
+
+        Returns:
+            (results, failures): 各特征族结果（失败或超时为空字典）与失败原因
+        """
+        if not self.parallel or len(tasks) <= 1:
+            return self._run_serial(tasks, arrays, local_kwargs)
+
+        timeout = self.timeout if timeout is None else float(timeout)
+        blocks = []
+        try:
+            specs = {}
+            for key, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+                specs[key] = (block.name, array.shape, array.dtype.str)
+            results, failures = self._run_parallel(tasks, specs, timeout, arrays, local_kwargs)
+            return {name: results[name] for name in tasks}, failures
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def _run_parallel(self, tasks, specs, timeout, arrays, local_kwargs):
+        queued = list(tasks.items())
+        # 管道 -> (工作进程, 特征族名, 截止时间)
+        active: Dict[Any, Tuple[_Worker, str, Optional[float]]] = {}
+        results, failures = {}, {}
+        try:
+            while queued or active:
+                # 分派排队的特征族；已有运行中的特征族时不阻塞等待空闲进程
+                while queued:
+                    try:
+                        worker = self._acquire(block=not active)
+                    except OSError as e:
+                        print(f"特征进程池不可用，剩余特征族改为串行计算: {e}")
+                        serial_results, serial_failures = self._run_serial(dict(queued), arrays, local_kwargs)
+                        results.update(serial_results)
+                        failures.update(serial_failures)
+                        queued.clear()
+                        break
+                    if worker is None:
+                        break
+                    name, func = queued.pop(0)
+                    try:
+                        worker.conn.send((func, specs))
+                    except (OSError, ValueError) as e:
+                        self._release(worker, healthy=False)
+                        print(f"特征族 {name} 分派失败: {e}")
+                        results[name], failures[name] = {}, str(e)
+                        continue
+                    # 计时从特征族开始在工作进程上运行时起算
+                    deadline = time.monotonic() + timeout if timeout > 0 else None
+                    active[worker.conn] = (worker, name, deadline)
+
+                if not active:
+                    continue
+
+                deadlines = [deadline for _, _, deadline in active.values() if deadline is not None]
+                wait_for = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+                if queued:
+                    wait_for = _POLL_INTERVAL if wait_for is None else min(wait_for, _POLL_INTERVAL)
+
+                for conn in connection_wait(list(active), timeout=wait_for):
+                    worker, name, _ = active.pop(conn)
+                    try:
+                        ok, value = conn.recv()
+                    except (EOFError, OSError):
+                        self._release(worker, healthy=False)
+                        print(f"特征族 {name} 计算失败: 工作进程异常退出")
+                        results[name], failures[name] = {}, '工作进程异常退出'
+                        continue
+                    self._release(worker)
+                    if ok:
+                        results[name] = value
+                    else:
+                        print(f"特征族 {name} 计算失败: {value}")
+                        results[name], failures[name] = {}, value
+
+                now = time.monotonic()
+                for conn, (worker, name, deadline) in list(active.items()):
+                    if deadline is not None and now >= deadline:
+                        del active[conn]
+                        # 只终止运行该特征族的工作进程
+                        self._release(worker, healthy=False)
+                        print(f"特征族 {name} 超时（>{timeout:.0f}s），已跳过")
+                        results[name], failures[name] = {}, 'timeout'
+        finally:
+            # 异常退出（如任务被取消）时终止仍在运行的工作进程
+            for worker, _, _ in active.values():
+                self._release(worker, healthy=False)
+        return results, failures
+
+    @staticmethod
+    def _run_serial(tasks, arrays, local_kwargs):
+        results, failures = {}, {}
+        for name, func in tasks.items():
+            try:
+                results[name] = func(**arrays, **(local_kwargs or {}))
+            except Exception as e:
+                print(f"特征族 {name} 计算失败: {e}")
+                results[name], failures[name] = {}, str(e)
+        return results, failures
+
+    def close(self):
+        """关闭进程池：终止空闲工作进程，运行中的进程在归还时终止"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.stop()
+
+
+_feature_pool: Optional[FeaturePool] = None
+_feature_pool_lock = threading.Lock()
+
+
+def configure_feature_pool(max_workers: Optional[int] = None,
+                           timeout: Optional[float] = None) -> FeaturePool:
+    """
+    配置（或重新配置）进程级特征计算池
+
+    Args:
+        max_workers: 工作进程数，None时读取环境变量 RADIOMICS_WORKERS；<=1 时串行计算
+        timeout: 每个特征族的超时时间（秒），None时读取环境变量 RADIOMICS_FAMILY_TIMEOUT
+    """
+    global _feature_pool
+    if max_workers is None:
+        max_workers = int(os.getenv('RADIOMICS_WORKERS', '2'))
+    if timeout is None:
+        timeout = float(os.getenv('RADIOMICS_FAMILY_TIMEOUT', DEFAULT_FAMILY_TIMEOUT))
+    with _feature_pool_lock:
+        if _feature_pool is not None:
+            _feature_pool.close()
+        _feature_pool = FeaturePool(max_workers=max_workers, timeout=timeout)
+    return _feature_pool
+
+
+def get_feature_pool() -> FeaturePool:
+    """获取进程级特征计算池（单例）"""
+    if _feature_pool is None:
+        return configure_feature_pool()
+    return _feature_pool
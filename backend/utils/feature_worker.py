@@ -0,0 +1,57 @@
+"""
+特征计算工作进程入口
+由 forkserver（或 spawn）启动的工作进程只导入本模块与影像组学模块，不导入应用入口、torch 或 Flask；
+父进程经管道发送 (特征函数, 共享内存数组描述)，工作进程逐个计算并回传结果。
+"""
+
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+
+
+# (共享内存名, 形状, dtype字符串)
+ArraySpec = Tuple[str, Tuple[int, ...], str]
+
+# forkserver 预先导入的模块：子进程从已导入这些模块的服务进程 fork，无需逐个重新导入
+PRELOAD_MODULES = ['utils.feature_worker', 'utils.radiomics', 'utils.volumetric_radiomics']
+
+
+def attach_arrays(specs: Dict[str, ArraySpec]) -> Dict[str, np.ndarray]:
+    """按描述读取共享内存数组（复制后立即断开共享内存）"""
+    arrays = {}
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf).copy()
+        finally:
+            block.close()
+    return arrays
+
+
+def worker_main(conn):
+    """
+    工作进程主循环
+
+    接收 (func, specs) 执行 func(**arrays)，回传 (True, 结果) 或 (False, 错误信息)；
+    收到 None 或管道关闭时退出。
+    """
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        func, specs = message
+        try:
+            reply = (True, func(**attach_arrays(specs)))
+        except Exception as e:
+            reply = (False, f'{type(e).__name__}: {e}')
+        try:
+            conn.send(reply)
+        except (EOFError, OSError):
+            return
+        except Exception as e:
+            # 结果无法序列化
+            conn.send((False, f'结果序列化失败: {e}'))
@@ -0,0 +1,127 @@
+"""
+身份缓存 - 认证装饰器的用户状态缓存
+按用户ID在进程内缓存 is_active / is_admin 标志（短TTL），
+认证装饰器命中缓存时不再查询数据库；用户状态或资料变更时由用户管理接口主动失效。
+多进程部署时其他进程的缓存最迟在TTL到期后更新。
+"""
+
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+
+# 默认缓存有效期（秒）
+DEFAULT_TTL = 30.0
+
+
+class Identity(NamedTuple):
+    """缓存的用户身份（只含权限判断所需的标志）"""
+    id: int
+    is_active: bool
+    is_admin: bool
+
+
+class IdentityCache:
+    """用户身份的TTL缓存（线程安全）"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        """
+        Args:
+            ttl: 缓存有效期（秒），<=0 时禁用缓存（每次都查询数据库）
+        """
+        self.ttl = float(ttl)
+        self._entries: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _load(user_id) -> Optional[Identity]:
+        """从数据库读取用户标志（只查询需要的列）"""
+        from models.user import User, db
+        row = db.session.query(User.id, User.is_active, User.is_admin).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        return Identity(row.id, bool(row.is_active), bool(row.is_admin))
+
+    def get(self, user_id) -> Optional[Identity]:
+        """
+        获取用户身份（缓存未命中或过期时查询数据库）
+
+        Returns:
+            Identity；用户不存在时为None（不缓存，避免新建用户被误判）
+        """
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+        now = time.monotonic()
+        if self.ttl > 0:
+            with self._lock:
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[1] > now:
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+
+        identity = self._load(user_id)
+        if identity is not None and self.ttl > 0:
+            with self._lock:
+                self._entries[user_id] = (identity, now + self.ttl)
+        return identity
+
+    def invalidate(self, user_id):
+        """删除指定用户的缓存（用户状态、权限或资料变更后调用）"""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                'ttl': self.ttl,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+_identity_cache: Optional[IdentityCache] = None
+_identity_cache_lock = threading.Lock()
+
+
+def configure_identity_cache(ttl: Optional[float] = None) -> IdentityCache:
+    """
+    配置（或重新配置）进程级身份缓存
+
+    Args:
+        ttl: 缓存有效期（秒），None时读取环境变量 AUTH_CACHE_TTL；0 表示禁用
+    """
+    global _identity_cache
+    if ttl is None:
+        ttl = float(os.getenv('AUTH_CACHE_TTL', DEFAULT_TTL))
+    with _identity_cache_lock:
+        _identity_cache = IdentityCache(ttl)
+    return _identity_cache
+
+
+def get_identity_cache() -> IdentityCache:
+    """获取进程级身份缓存（单例）"""
+    if _identity_cache is None:
+        return configure_identity_cache()
+    return _identity_cache
+
+
+def invalidate_identity(user_id):
+    """使指定用户的身份缓存失效"""
+    get_identity_cache().invalidate(user_id)
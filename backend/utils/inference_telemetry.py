@@ -0,0 +1,276 @@
+"""
+推理遥测 - 各模型调用的分阶段耗时直方图与吞吐量统计
+每次模型调用（YOLO、UNet、视频帧、NIfTI切片批）按 (模型, 权重文件, 调用类型) 记录
+预处理 / 前向 / 后处理 / 总耗时，保存为固定桶的直方图，并累计处理的图像（帧/切片）数。
+管理接口返回各模型的平均耗时、分位数与吞吐量；/metrics 以 Prometheus 文本格式导出。
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 直方图桶上界（秒），最后隐含 +Inf；CPU上整批NIfTI切片的一次前向可达数十秒
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 记录的阶段（total 为各阶段之和）
+STAGES = ('preprocess', 'forward', 'postprocess', 'total')
+
+
+class Histogram:
+    """固定桶直方图（非线程安全，由 InferenceTelemetry 加锁）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶线性插值估计分位数（与 Prometheus histogram_quantile 一致）"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count > 0:
+                if i == len(self.buckets):
+                    # 落在 +Inf 桶时只能返回最大的有限上界
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Prometheus 累计桶 [(le, count)]"""
+        rows = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            rows.append((_format_bound(bound), total))
+        rows.append(('+Inf', self.count))
+        return rows
+
+    def summary(self) -> Dict[str, Any]:
+        """统计摘要（毫秒）"""
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            'count': self.count,
+            'mean_ms': ms(self.sum / self.count) if self.count else None,
+            'p50_ms': ms(self.quantile(0.5)),
+            'p95_ms': ms(self.quantile(0.95)),
+            'p99_ms': ms(self.quantile(0.99))
+        }
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def weight_label(source) -> str:
+    """
+    权重文件标签（文件名）
+
+    Args:
+        source: 权重路径，或带 ckpt_path / weight_path / weight_file 属性的模型对象
+    """
+    if source is None:
+        return 'unknown'
+    if not isinstance(source, (str, os.PathLike)):
+        for attr in ('weight_path', 'weight_file', 'ckpt_path'):
+            path = getattr(source, attr, None)
+            if path:
+                source = path
+                break
+        else:
+            return type(source).__name__
+    return os.path.basename(os.fspath(source)) or 'unknown'
+
+
+class _Series:
+    """一个 (模型, 权重, 调用类型) 的统计"""
+
+    def __init__(self, buckets):
+        self.stages = {stage: Histogram(buckets) for stage in STAGES}
+        self.items = 0
+        self.calls = 0
+        self.last_seen = None
+
+
+class InferenceTelemetry:
+    """推理耗时与吞吐量统计（线程安全）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, weight, kind: str = 'image', items: int = 1,
+               preprocess: Optional[float] = None, forward: Optional[float] = None,
+               postprocess: Optional[float] = None):
+        """
+        记录一次模型调用
+
+        Args:
+            model: 模型类型（'yolo' / 'unet'）
+            weight: 权重路径或模型对象（取文件名作为标签）
+            kind: 调用类型（'image' / 'batch' / 'video_frame' / 'nifti_slices'）
+            items: 本次调用处理的图像（帧/切片）数
+            preprocess / forward / postprocess: 各阶段耗时（秒），None 表示未测量
+        """
+        key = (model, weight_label(weight), kind)
+        durations = {'preprocess': preprocess, 'forward': forward, 'postprocess': postprocess}
+        measured = [value for value in durations.values() if value is not None]
+        durations['total'] = sum(measured) if measured else None
+
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.buckets)
+            for stage, value in durations.items():
+                if value is not None:
+                    series.stages[stage].observe(max(float(value), 0.0))
+            series.items += int(items)
+            series.calls += 1
+            series.last_seen = time.time()
+
+    def record_ultralytics(self, model: str, weight, results, kind: str = 'image'):
+        """
+        按 ultralytics Results.speed（每张图像的毫秒数）记录一次YOLO调用
+
+        批量推理时 speed 为整批的单张平均值，乘以图像数还原为整次调用耗时。
+        """
+        results = list(results or [])
+        if not results:
+            return
+        speed = getattr(results[0], 'speed', None) or {}
+        n = len(results)
+
+        def seconds(name):
+            value = speed.get(name)
+            return value * n / 1000.0 if value is not None else None
+
+        self.record(model, weight, kind=kind, items=n,
+                    preprocess=seconds('preprocess'),
+                    forward=seconds('inference'),
+                    postprocess=seconds('postprocess'))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """各 (模型, 权重, 调用类型) 的统计摘要"""
+        with self._lock:
+            rows = []
+            for (model, weight, kind), series in sorted(self._series.items()):
+                total = series.stages['total']
+                rows.append({
+                    'model': model,
+                    'weight': weight,
+                    'kind': kind,
+                    'calls': series.calls,
+                    'items': series.items,
+                    # 模型耗时内的吞吐量（图像/秒），不含排队与I/O
+                    'items_per_second': round(series.items / total.sum, 2) if total.sum > 0 else None,
+                    'latency_ms_per_item': round(total.sum * 1000 / series.items, 2) if series.items else None,
+                    'stages': {stage: hist.summary() for stage, hist in series.stages.items()},
+                    'last_seen': series.last_seen
+                })
+            return rows
+
+    def model_summary(self, model: str) -> Dict[str, Any]:
+        """单个模型类型（跨权重与调用类型）的汇总：单张平均耗时与吞吐量"""
+        with self._lock:
+            items = calls = 0
+            seconds = 0.0
+            for (name, _, _), series in self._series.items():
+                if name != model:
+                    continue
+                items += series.items
+                calls += series.calls
+                seconds += series.stages['total'].sum
+        return {
+            'calls': calls,
+            'items': items,
+            'latency_ms': round(seconds * 1000 / items, 2) if items else None,
+            'items_per_second': round(items / seconds, 2) if seconds > 0 else None
+        }
+
+    def prometheus_text(self) -> str:
+        """Prometheus 文本格式（exposition format 0.0.4）"""
+        lines = [
+            '# HELP inference_stage_seconds Model inference stage duration per call.',
+            '# TYPE inference_stage_seconds histogram'
+        ]
+        counters = []
+        with self._lock:
+            for (model, weight, kind), series in sorted(self._series.items()):
+                base = f'model="{_escape_label(model)}",weight="{_escape_label(weight)}",kind="{_escape_label(kind)}"'
+                for stage, hist in series.stages.items():
+                    if hist.count == 0:
+                        continue
+                    labels = f'{base},stage="{stage}"'
+                    for le, count in hist.cumulative():
+                        lines.append(f'inference_stage_seconds_bucket{{{labels},le="{le}"}} {count}')
+                    lines.append(f'inference_stage_seconds_sum{{{labels}}} {hist.sum!r}')
+                    lines.append(f'inference_stage_seconds_count{{{labels}}} {hist.count}')
+                counters.append((base, series.items, series.calls))
+
+        lines.append('# HELP inference_items_total Images, frames or slices processed by the model.')
+        lines.append('# TYPE inference_items_total counter')
+        lines.extend(f'inference_items_total{{{base}}} {items}' for base, items, _ in counters)
+        lines.append('# HELP inference_calls_total Model calls.')
+        lines.append('# TYPE inference_calls_total counter')
+        lines.extend(f'inference_calls_total{{{base}}} {calls}' for base, _, calls in counters)
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+_telemetry = InferenceTelemetry()
+
+
+def get_inference_telemetry() -> InferenceTelemetry:
+    """获取进程级推理遥测（单例）"""
+    return _telemetry
+
+
+def model_info_payload(weights_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    模型信息接口的响应体（兼容旧字段 version / performance）
+
+    Args:
+        weights_path: 当前默认YOLO权重路径
+    """
+    telemetry = get_inference_telemetry()
+    models = {name: telemetry.model_summary(name) for name in ('yolo', 'unet')}
+    performance = [
+        f"{name.upper()} {summary['latency_ms']}ms/张, {summary['items_per_second']}张/秒"
+        for name, summary in models.items() if summary['items']
+    ]
+    return {
+        'version': weight_label(weights_path) if weights_path else 'unknown',
+        'weights_path': weights_path,
+        'performance': '; '.join(performance) or '暂无推理数据',
+        'latency_ms': models['yolo']['latency_ms'],
+        'models': models,
+        'telemetry': telemetry.snapshot()
+    }
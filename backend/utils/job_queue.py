@@ -0,0 +1,528 @@
+"""
+后台任务队列 - 耗时分析任务的本地执行与持久化
+任务记录保存在数据库（analysis_jobs 表），由进程内有界工作线程执行，无需外部消息中间件。
+支持进度上报、取消、按任务ID获取结果。
+多进程部署（如gunicorn多worker）时每个任务通过条件UPDATE原子领取，只会被一个进程执行；
+执行进程定期写入心跳，心跳超时（进程退出或失联）的运行中任务由其他进程重新排队。
+交互任务（异步提交的分析任务）优先于后台预计算任务；预计算任务按用户限制并发，
+且始终为交互任务保留一个工作线程（max_workers 为 1 时额外启动一个线程，后台任务最多占用其中一个）。
+未指定 async=true 的同步分析请求（如 /api/results/analyze）在请求线程中执行，不经过本队列，不受上述调度影响。
+"""
+
+import bisect
+import itertools
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import and_, func, or_, select
+
+from models import db, AnalysisJob
+
+
+# 任务类型 -> 处理函数；处理函数签名 handler(ctx: JobContext) -> (payload, http_status)
+_handlers: Dict[str, Callable[['JobContext'], Tuple[Any, int]]] = {}
+
+# 任务优先级（数值越小越先执行）：用户发起的交互任务 / 上传后的后台预计算
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# 任务类型 -> 优先级（由任务类型决定，服务重启恢复时无需额外持久化）
+_priorities: Dict[str, int] = {}
+
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+# 心跳间隔与判定执行进程失联的超时（秒）
+DEFAULT_HEARTBEAT_INTERVAL = 10.0
+DEFAULT_STALE_TIMEOUT = 60.0
+
+
+class JobCancelled(BaseException):
+    """
+    任务被取消
+
+    继承 BaseException 而非 Exception：分析流程中大量 `except Exception` 兜底，
+    取消信号需要穿透这些兜底直达任务执行器。
+    """
+
+
+def register_job_handler(job_type: str, priority: int = PRIORITY_INTERACTIVE):
+    """
+    注册任务处理函数的装饰器
+
+    Args:
+        job_type: 任务类型
+        priority: 优先级，>= PRIORITY_BACKGROUND 的任务按后台任务调度
+    """
+    def decorator(func):
+        _handlers[job_type] = func
+        _priorities[job_type] = priority
+        return func
+    return decorator
+
+
+class JobContext:
+    """传给任务处理函数的上下文：参数、进度上报与取消检查"""
+
+    # 进度写库的最小间隔（秒），避免逐切片/逐帧循环频繁写库
+    PROGRESS_INTERVAL = 0.5
+    # 从数据库检查取消请求的最小间隔（秒）；其他进程收到的取消请求只写入数据库
+    CANCEL_CHECK_INTERVAL = 1.0
+
+    def __init__(self, queue: 'JobQueue', job_id: str, params: Dict[str, Any], user_id: Optional[int]):
+        self.queue = queue
+        self.job_id = job_id
+        self.params = params
+        self.user_id = user_id
+        self._last_write = 0.0
+        self._last_cancel_check = time.monotonic()
+
+    def check_cancelled(self):
+        """若任务已被请求取消（或已不再由本进程执行）则抛出 JobCancelled"""
+        now = time.monotonic()
+        check_db = now - self._last_cancel_check >= self.CANCEL_CHECK_INTERVAL
+        if check_db:
+            self._last_cancel_check = now
+        if self.queue.is_cancel_requested(self.job_id, check_db=check_db):
+            raise JobCancelled()
+
+    def update(self, progress: float, message: Optional[str] = None, force: bool = False):
+        """
+        上报进度（0-100），同时检查取消请求
+
+        Args:
+            progress: 进度百分比
+            message: 当前阶段描述
+            force: 忽略写库间隔限制
+        """
+        self.check_cancelled()
+        now = time.monotonic()
+        if not force and now - self._last_write < self.PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        values = {'progress': max(0.0, min(100.0, float(progress))), 'heartbeat_at': datetime.utcnow()}
+        if message is not None:
+            values['message'] = message[:255]
+        self.queue.update_job(self.job_id, owned=True, **values)
+
+    def stage(self, start: float, end: float, message: Optional[str] = None):
+        """
+        返回把子步骤进度 (done, total) 映射到 [start, end] 区间的回调，
+        可直接传给逐切片/逐帧循环
+        """
+        def callback(done, total):
+            fraction = done / total if total else 1.0
+            self.update(start + (end - start) * fraction, message)
+        return callback
+
+
+class JobQueue:
+    """数据库持久化 + 进程内有界工作线程的优先级任务队列"""
+
+    def __init__(self, app, max_workers: int = 2, background_per_user: int = 1,
+                 heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+                 stale_timeout: float = DEFAULT_STALE_TIMEOUT, recovery: bool = True):
+        """
+        Args:
+            app: Flask应用（工作线程内需要推入应用上下文）
+            max_workers: 并发执行的任务数上限（为 1 时额外启动一个线程，后台任务最多占用其中一个）
+            background_per_user: 每个用户同时运行的后台任务数上限
+            heartbeat_interval: 运行中任务的心跳间隔（秒）
+            stale_timeout: 心跳超过该时间未更新的运行中任务视为执行进程已失联（秒）
+            recovery: 是否恢复失联/遗留的任务（数据库脚本等离线进程应关闭）
+        """
+        self.app = app
+        # 本进程的执行者标识，写入领取的任务记录
+        self.worker_id = f'{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.heartbeat_interval = max(1.0, float(heartbeat_interval))
+        self.stale_timeout = max(self.heartbeat_interval * 2, float(stale_timeout))
+        self.recovery = recovery
+        self.max_workers = max(1, int(max_workers))
+        self.background_per_user = max(1, int(background_per_user))
+        # 后台任务最多占用 max_workers-1 个工作线程（至少一个），工作线程数至少比它多一个，
+        # 保证后台任务占满时仍有线程执行交互任务
+        self.background_slots = max(1, self.max_workers - 1)
+        thread_count = max(self.max_workers, self.background_slots + 1)
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        # 待执行任务，按 (优先级, 入队序号) 排序
+        self._pending: List[Tuple[int, int, str, Optional[int]]] = []
+        self._sequence = itertools.count()
+        self._background_running = 0
+        self._running = 0
+        self._background_by_user: Dict[Optional[int], int] = defaultdict(int)
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'analysis-job-{i}', daemon=True)
+            for i in range(thread_count)
+        ]
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='analysis-job-heartbeat',
+                                                  daemon=True)
+        for thread in self._threads:
+            thread.start()
+        self._heartbeat_thread.start()
+
+    # ------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------
+    def submit(self, job_type: str, params: Dict[str, Any], user_id: Optional[int] = None) -> AnalysisJob:
+        """创建任务记录并排队执行"""
+        if job_type not in _handlers:
+            raise ValueError(f"未注册的任务类型: {job_type}")
+
+        job = AnalysisJob(
+            id=uuid.uuid4().hex,
+            job_type=job_type,
+            status='queued',
+            progress=0.0,
+            message='排队中',
+            params=current_app.json.dumps(params),
+            created_by=user_id
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._enqueue(job.id, job_type, user_id)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        请求取消任务：排队中的任务直接标记为已取消，运行中的任务在下一次进度上报时停止
+
+        Returns:
+            是否接受了取消请求（已结束的任务返回False）
+        """
+        job = AnalysisJob.query.get(job_id)
+        if job is None or job.status in FINAL_STATUSES:
+            return False
+
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+
+        # 取消标志写入数据库：任务可能由其他进程执行，执行进程在进度上报时读取
+        table = AnalysisJob.__table__
+        self.update_job(job_id, cancel_requested=True)
+        self.update_job_where(job_id, table.c.status == 'queued',
+                              status='cancelled', message='已取消', finished_at=datetime.utcnow())
+        db.session.expire(job)
+        return True
+
+    def is_cancel_requested(self, job_id: str, check_db: bool = False) -> bool:
+        """
+        任务是否已被请求取消
+
+        Args:
+            check_db: 同时读取数据库中的取消标志（取消请求可能由其他进程接收）；
+                任务已不再由本进程执行（心跳超时被重新排队）时同样视为取消
+        """
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is not None and event.is_set():
+            return True
+        if not check_db:
+            return False
+
+        table = AnalysisJob.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.cancel_requested, table.c.worker_id).where(table.c.id == job_id)
+            ).first()
+        cancelled = row is None or bool(row.cancel_requested) or row.worker_id != self.worker_id
+        if cancelled and event is not None:
+            event.set()
+        return cancelled
+
+    def update_job(self, job_id: str, owned: bool = False, **values) -> int:
+        """
+        更新任务记录的部分字段
+
+        使用独立连接直接执行UPDATE，不经过工作线程的 db.session，
+        避免把处理函数尚未提交的业务修改提前提交。
+
+        Args:
+            owned: 只更新由本进程领取的任务
+
+        Returns:
+            更新的行数
+        """
+        table = AnalysisJob.__table__
+        condition = table.c.id == job_id
+        if owned:
+            condition = and_(condition, table.c.worker_id == self.worker_id)
+        with db.engine.begin() as conn:
+            return conn.execute(table.update().where(condition).values(**values)).rowcount
+
+    def recover(self) -> int:
+        """
+        将失联的运行中任务重新排队，并把数据库中排队中的任务放入本进程队列
+
+        多个进程同时恢复是安全的：同一任务只会被一个进程领取执行。
+
+        Returns:
+            放入本进程队列的任务数
+        """
+        self.requeue_stale()
+        queued = db.session.query(AnalysisJob.id, AnalysisJob.job_type, AnalysisJob.created_by) \
+            .filter(AnalysisJob.status == 'queued') \
+            .order_by(AnalysisJob.created_at.asc()).all()
+        for job_id, job_type, user_id in queued:
+            self._enqueue(job_id, job_type, user_id)
+        db.session.commit()
+        return len(queued)
+
+    def requeue_stale(self) -> int:
+        """
+        将心跳超时（执行进程已退出或失联）的运行中任务重新排队；已请求取消的直接标记为已取消
+
+        Returns:
+            重新排队并放入本进程队列的任务数
+        """
+        table = AnalysisJob.__table__
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_timeout)
+        stale = and_(
+            table.c.status == 'running',
+            or_(
+                table.c.heartbeat_at < cutoff,
+                and_(table.c.heartbeat_at.is_(None), func.coalesce(table.c.started_at, table.c.created_at) < cutoff)
+            )
+        )
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.job_type, table.c.created_by, table.c.cancel_requested).where(stale)
+            ).all()
+
+        requeued = 0
+        for row in rows:
+            # 条件UPDATE：期间恢复心跳或已被其他进程重新排队的任务不受影响
+            if row.cancel_requested:
+                self.update_job_where(row.id, stale, status='cancelled', message='已取消',
+                                      finished_at=datetime.utcnow())
+                continue
+            if self.update_job_where(row.id, stale, status='queued', progress=0.0, worker_id=None,
+                                     heartbeat_at=None, message='执行进程失联，重新排队'):
+                self._enqueue(row.id, row.job_type, row.created_by)
+                requeued += 1
+        if requeued:
+            print(f"[任务队列] 已重新排队 {requeued} 个失联任务")
+        return requeued
+
+    def update_job_where(self, job_id: str, condition, **values) -> int:
+        """带附加条件的任务记录更新，返回更新的行数（用于原子领取/状态切换）"""
+        table = AnalysisJob.__table__
+        with db.engine.begin() as conn:
+            return conn.execute(
+                table.update().where(table.c.id == job_id, condition).values(**values)
+            ).rowcount
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def running_count(self) -> int:
+        with self._lock:
+            return self._running
+
+    def shutdown(self, wait: bool = False):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._heartbeat_stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            self._heartbeat_thread.join()
+
+    # ------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------
+    def _enqueue(self, job_id: str, job_type: str, user_id: Optional[int] = None):
+        priority = _priorities.get(job_type, PRIORITY_INTERACTIVE)
+        with self._cond:
+            if job_id in self._cancel_events:
+                # 已在本进程排队或运行中
+                return
+            self._cancel_events[job_id] = threading.Event()
+            bisect.insort(self._pending, (priority, next(self._sequence), job_id, user_id))
+            self._cond.notify_all()
+
+    def _take_locked(self) -> Optional[Tuple[int, int, str, Optional[int]]]:
+        """取出优先级最高且满足并发限制的任务（调用方持有锁）"""
+        for index, item in enumerate(self._pending):
+            priority, _, _, user_id = item
+            if priority >= PRIORITY_BACKGROUND:
+                if (self._background_running >= self.background_slots
+                        or self._background_by_user[user_id] >= self.background_per_user):
+                    continue
+                self._background_running += 1
+                self._background_by_user[user_id] += 1
+            del self._pending[index]
+            return item
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                item = self._take_locked()
+                while item is None and not self._stopped:
+                    self._cond.wait()
+                    item = self._take_locked()
+                if item is None:
+                    return
+                self._running += 1
+            priority, _, job_id, user_id = item
+            try:
+                self._run(job_id)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    if priority >= PRIORITY_BACKGROUND:
+                        self._background_running -= 1
+                        self._background_by_user[user_id] -= 1
+                        if self._background_by_user[user_id] <= 0:
+                            del self._background_by_user[user_id]
+                        self._cond.notify_all()
+
+    def _heartbeat_loop(self):
+        """为本进程运行中的任务写心跳，并重新排队其他进程遗留的失联任务"""
+        while not self._heartbeat_stop.wait(self.heartbeat_interval):
+            try:
+                with self.app.app_context():
+                    if self.running_count():
+                        table = AnalysisJob.__table__
+                        with db.engine.begin() as conn:
+                            conn.execute(
+                                table.update()
+                                .where(table.c.worker_id == self.worker_id, table.c.status == 'running')
+                                .values(heartbeat_at=datetime.utcnow())
+                            )
+                    if self.recovery:
+                        self.requeue_stale()
+            except Exception as e:
+                print(f"[任务队列] 心跳失败: {e}")
+
+    def _claim(self, job_id: str) -> bool:
+        """原子领取排队中的任务：只有条件UPDATE命中的进程执行该任务"""
+        table = AnalysisJob.__table__
+        now = datetime.utcnow()
+        claimable = and_(
+            table.c.status == 'queued',
+            or_(table.c.cancel_requested.is_(None), table.c.cancel_requested == False)  # noqa: E712
+        )
+        return self.update_job_where(
+            job_id, claimable,
+            status='running', message='运行中', worker_id=self.worker_id,
+            started_at=now, heartbeat_at=now,
+            attempts=func.coalesce(table.c.attempts, 0) + 1
+        ) == 1
+
+    def _run(self, job_id: str):
+        with self.app.app_context():
+            try:
+                self._execute(job_id)
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._cancel_events.pop(job_id, None)
+
+    def _execute(self, job_id: str):
+        if not self._claim(job_id):
+            # 已被其他进程领取，或排队期间被请求取消
+            table = AnalysisJob.__table__
+            self.update_job_where(
+                job_id, and_(table.c.status == 'queued', table.c.cancel_requested == True),  # noqa: E712
+                status='cancelled', message='已取消', finished_at=datetime.utcnow()
+            )
+            return
+
+        job = AnalysisJob.query.get(job_id)
+        handler = _handlers.get(job.job_type)
+        if handler is None:
+            self._finish(job_id, status='failed', error=f"未注册的任务类型: {job.job_type}")
+            return
+        ctx = JobContext(self, job_id, job.get_params(), job.created_by)
+
+        try:
+            payload, status_code = handler(ctx)
+        except JobCancelled:
+            db.session.rollback()
+            self._finish(job_id, status='cancelled', message='已取消')
+            current_app.logger.info(f"任务 {job_id} 已取消")
+            return
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"任务 {job_id} 执行失败: {traceback.format_exc()}")
+            self._finish(job_id, status='failed', error=str(e), message='执行失败')
+            return
+
+        failed = status_code >= 400
+        self._finish(
+            job_id,
+            status='failed' if failed else 'completed',
+            progress=None if failed else 100.0,
+            message='执行失败' if failed else '已完成',
+            result=current_app.json.dumps(payload),
+            result_status=status_code,
+            error=(payload.get('error') if isinstance(payload, dict) else None) if failed else None
+        )
+
+    def _finish(self, job_id: str, status: str, progress: Optional[float] = None, **values):
+        values = {k: v for k, v in values.items() if v is not None}
+        if progress is not None:
+            values['progress'] = progress
+        # 任务已因失联被重新排队时不覆盖新的执行结果
+        self.update_job(job_id, owned=True, status=status, finished_at=datetime.utcnow(), **values)
+
+
+def init_job_queue(app, max_workers: int = 2, background_per_user: int = 1,
+                   heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+                   stale_timeout: float = DEFAULT_STALE_TIMEOUT, recovery: bool = True) -> JobQueue:
+    """创建应用的任务队列；recovery 为True时恢复失联与遗留的排队任务"""
+    queue = JobQueue(app, max_workers=max_workers, background_per_user=background_per_user,
+                     heartbeat_interval=heartbeat_interval, stale_timeout=stale_timeout, recovery=recovery)
+    app.extensions['job_queue'] = queue
+    if not recovery:
+        return queue
+    with app.app_context():
+        try:
+            recovered = queue.recover()
+            if recovered:
+                app.logger.info(f"已重新排队 {recovered} 个未完成任务")
+        except Exception as e:
+            # 数据库或任务表尚未初始化时跳过恢复
+            db.session.rollback()
+            app.logger.warning(f"任务恢复跳过: {e}")
+    return queue
+
+
+def get_job_queue() -> JobQueue:
+    """获取当前应用的任务队列"""
+    return current_app.extensions['job_queue']
+
+
+def wants_async() -> bool:
+    """请求是否选择异步执行（查询参数或表单字段 async=true/1）"""
+    from flask import request
+    value = request.args.get('async') or request.form.get('async') or ''
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def job_accepted_response(job: AnalysisJob):
+    """异步提交后的统一响应体 (202)"""
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/api/jobs/{job.id}',
+        'result_url': f'/api/jobs/{job.id}/result'
+    }
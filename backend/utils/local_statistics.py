@@ -0,0 +1,86 @@
+"""
+滑动窗口局部统计模块
+基于盒式滤波（积分图/滑动和，每像素开销与窗口大小无关）一次性计算任意窗口大小的
+局部均值与局部标准差图，供影像组学与定量分析模块复用。
+"""
+
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+def local_mean_std(image: np.ndarray, window_size: int = 5,
+                   valid_only: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算局部均值图与局部标准差图（总体标准差，与 np.std(patch) 一致）
+
+    先减去全局均值再计算 E[x²]-E[x]²，降低float32下的相消误差；
+    中间结果只保留两张float32图像。
+
+    Args:
+        image: 2D图像
+        window_size: 窗口边长（奇数）
+        valid_only: True 时只返回窗口完全落在图像内的区域（尺寸 H-w+1, W-w+1），
+            False 时返回原尺寸，边缘按反射延拓
+
+    Returns:
+        (mean, std): float32 局部均值图与局部标准差图
+    """
+    if window_size < 1 or window_size % 2 == 0:
+        raise ValueError(f"window_size 必须为正奇数: {window_size}")
+
+    data = np.asarray(image, dtype=np.float32)
+    offset = float(data.mean()) if data.size else 0.0
+    centered = data - offset
+    ksize = (window_size, window_size)
+
+    mean = cv2.boxFilter(centered, cv2.CV_32F, ksize, normalize=True, borderType=cv2.BORDER_REFLECT)
+    np.multiply(centered, centered, out=centered)
+    variance = cv2.boxFilter(centered, cv2.CV_32F, ksize, normalize=True, borderType=cv2.BORDER_REFLECT)
+    del centered
+
+    variance -= mean * mean
+    np.maximum(variance, 0, out=variance)
+    std = np.sqrt(variance, out=variance)
+    mean += offset
+
+    if valid_only:
+        half = window_size // 2
+        h, w = data.shape[:2]
+        if h < window_size or w < window_size:
+            empty = np.zeros((0, 0), dtype=np.float32)
+            return empty, empty
+        mean = mean[half:h - half, half:w - half]
+        std = std[half:h - half, half:w - half]
+    return mean, std
+
+
+def summarize_local_statistics(image: np.ndarray, window_size: int = 5,
+                               mask: Optional[np.ndarray] = None,
+                               valid_only: bool = True) -> Dict[str, float]:
+    """
+    局部均值/标准差图的汇总统计
+
+    Args:
+        mask: 可选掩码，只汇总窗口中心位于掩码内的位置
+
+    Returns:
+        {'local_mean_mean', 'local_mean_std', 'local_std_mean', 'local_std_std'}
+    """
+    mean, std = local_mean_std(image, window_size=window_size, valid_only=valid_only)
+    if mask is not None:
+        select = np.asarray(mask) > 0
+        if valid_only:
+            half = window_size // 2
+            select = select[half:half + mean.shape[0], half:half + mean.shape[1]]
+        mean, std = mean[select], std[select]
+
+    if mean.size == 0:
+        return {'local_mean_mean': 0, 'local_mean_std': 0, 'local_std_mean': 0, 'local_std_std': 0}
+    return {
+        'local_mean_mean': float(mean.mean(dtype=np.float64)),
+        'local_mean_std': float(mean.std(dtype=np.float64)),
+        'local_std_mean': float(std.mean(dtype=np.float64)),
+        'local_std_std': float(std.std(dtype=np.float64))
+    }
@@ -0,0 +1,197 @@
+"""
+网格简化与多级细节（LOD）模块
+基于二次误差度量（QEM）的顶点聚类简化：按网格单元合并顶点，
+代表点取使单元内平面二次误差最小的位置，全部步骤为NumPy向量运算。
+"""
+
+import numpy as np
+
+from utils.mesh_metrics import triangle_corners, face_cross_products
+
+
+DEFAULT_LOD_RATIOS = (1.0, 0.25, 0.05)
+
+
+def weld_vertices(vertices, faces, tolerance=1e-5):
+    """
+    合并重合顶点（坐标量化到 tolerance 后去重），并去除退化面与未引用顶点
+
+    Returns:
+        (vertices, faces)
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if len(vertices) == 0:
+        return vertices, faces
+
+    keys = np.round(vertices / tolerance).astype(np.int64)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return compact_mesh(vertices[first], inverse.reshape(-1)[faces])
+
+
+def compact_mesh(vertices, faces):
+    """去除退化面、重复面和未引用顶点，重新编号"""
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    faces = faces[valid]
+    if len(faces) == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+
+    # 顶点集合相同的面（含方向相反）只保留第一个
+    _, keep = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    faces = faces[np.sort(keep)]
+
+    used, remap = np.unique(faces, return_inverse=True)
+    return vertices[used], remap.reshape(-1, 3)
+
+
+def vertex_normals(vertices, faces):
+    """面积加权的顶点法向量（单位化）"""
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    cross = face_cross_products(triangle_corners(vertices, faces))
+    normals = np.zeros_like(vertices)
+    for k in range(3):
+        np.add.at(normals, faces[:, k], cross)
+    return normals / (np.linalg.norm(normals, axis=1, keepdims=True) + 1e-8)
+
+
+def cluster_decimate(vertices, faces, cell_size):
+    """
+    QEM顶点聚类简化
+
+    Args:
+        vertices: (N, 3) 顶点
+        faces: (M, 3) 三角面
+        cell_size: 聚类网格单元边长（与顶点坐标同单位，越大越粗糙）
+
+    Returns:
+        (vertices, faces) 简化后的网格
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+
+    # 顶点所属网格单元
+    cells = np.floor((vertices - vertices.min(axis=0)) / cell_size).astype(np.int64)
+    _, cluster, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    cluster = cluster.reshape(-1)
+    n_clusters = len(counts)
+
+    # 每个面的平面二次型 K = p·pᵀ，p = [n, -n·v0]，按面积加权
+    cross = face_cross_products(triangle_corners(vertices, faces))
+    double_area = np.linalg.norm(cross, axis=1)
+    normal = cross / (double_area[:, None] + 1e-12)
+    plane = np.concatenate([normal, -np.einsum('ij,ij->i', normal, vertices[faces[:, 0]])[:, None]], axis=1)
+    quadric = (0.5 * double_area)[:, None, None] * plane[:, :, None] * plane[:, None, :]
+
+    # 面的二次型累加到三个顶点所在单元（只用上三角10个分量做bincount）
+    iu = np.triu_indices(4)
+    face_q = quadric[:, iu[0], iu[1]]
+    cluster_q = np.zeros((n_clusters, len(iu[0])))
+    for k in range(3):
+        target = cluster[faces[:, k]]
+        for j in range(len(iu[0])):
+            cluster_q[:, j] += np.bincount(target, weights=face_q[:, j], minlength=n_clusters)
+    Q = np.zeros((n_clusters, 4, 4))
+    Q[:, iu[0], iu[1]] = cluster_q
+    Q[:, iu[1], iu[0]] = cluster_q
+
+    # 单元顶点均值作为退路
+    mean = np.stack([
+        np.bincount(cluster, weights=vertices[:, d], minlength=n_clusters) for d in range(3)
+    ], axis=1) / counts[:, None]
+
+    # 求解 A·x = -b 得到最优代表点；病态或越出单元范围时使用均值
+    A = Q[:, :3, :3]
+    b = -Q[:, :3, 3]
+    scale = np.abs(A).max(axis=(1, 2)) + 1e-12
+    well_posed = np.linalg.det(A / scale[:, None, None]) > 1e-6
+    optimal = mean.copy()
+    if np.any(well_posed):
+        optimal[well_posed] = np.linalg.solve(A[well_posed], b[well_posed][:, :, None])[:, :, 0]
+    too_far = np.linalg.norm(optimal - mean, axis=1) > cell_size
+    optimal[too_far] = mean[too_far]
+
+    return compact_mesh(optimal, cluster[faces])
+
+
+def decimate_to_ratio(vertices, faces, ratio, max_iterations=8, tolerance=0.15):
+    """
+    将网格简化到约 ratio × 原面数
+
+    按曲面面数约与单元边长平方成反比估计初始单元大小，再在对数空间迭代修正。
+
+    Args:
+        ratio: 目标面数比例 (0, 1]
+        max_iterations: 最大迭代次数
+        tolerance: 面数相对误差容忍度
+
+    Returns:
+        (vertices, faces)
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if ratio >= 1.0 or len(faces) < 8:
+        return vertices, faces
+
+    target = max(4, int(len(faces) * ratio))
+    corners = triangle_corners(vertices, faces)
+    mean_edge = float(np.linalg.norm(corners[:, 1] - corners[:, 0], axis=1).mean()) or 1.0
+    cell = mean_edge / np.sqrt(ratio)
+
+    best = None
+    for _ in range(max_iterations):
+        result = cluster_decimate(vertices, faces, cell)
+        count = len(result[1])
+        if best is None or abs(count - target) < abs(len(best[1]) - target):
+            best = result
+        if count == 0 or abs(count - target) <= tolerance * target:
+            break
+        cell *= np.sqrt(max(count, 1) / target)
+    return best
+
+
+def build_lod_levels(vertices, faces, ratios=DEFAULT_LOD_RATIOS, weld=True):
+    """
+    生成多级细节网格
+
+    Args:
+        vertices, faces: 原始网格
+        ratios: 各级面数比例，1.0 为原始精度
+        weld: 简化前是否合并重合顶点
+
+    Returns:
+        [{'ratio', 'vertices', 'faces', 'normals'}, ...] 按 ratio 从小（粗糙）到大（精细）排序
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if weld:
+        vertices, faces = weld_vertices(vertices, faces)
+
+    levels = []
+    for ratio in sorted(set(float(r) for r in ratios)):
+        lod_vertices, lod_faces = decimate_to_ratio(vertices, faces, ratio)
+        levels.append({
+            'ratio': ratio,
+            'vertices': lod_vertices.astype(np.float32),
+            'faces': lod_faces.astype(np.uint32),
+            'normals': vertex_normals(lod_vertices, lod_faces).astype(np.float32)
+        })
+    return levels
+
+
+def parse_lod_ratios(value, default=DEFAULT_LOD_RATIOS):
+    """
+    解析LOD比例参数："true"/"1" 使用默认比例，"1,0.25,0.05" 为显式比例，空/"false" 返回None
+    """
+    if value is None:
+        return None
+    value = str(value).strip().lower()
+    if value in ('', '0', 'false', 'no'):
+        return None
+    if value in ('1', 'true', 'yes'):
+        return tuple(default)
+    ratios = tuple(float(part) for part in value.split(',') if part.strip())
+    if not ratios or any(r <= 0 or r > 1 for r in ratios):
+        raise ValueError(f"LOD比例必须在(0, 1]范围内: {value}")
+    return ratios
@@ -0,0 +1,138 @@
+"""
+三角网格几何度量模块
+表面积、体积、质心、包围盒、球形度等指标对全部三角面一次性做NumPy向量运算，
+并提供二进制STL的结构化数组构建与写出。
+"""
+
+import numpy as np
+
+
+# 二进制STL单个三角面记录：法向量、三个顶点（均为little-endian float32）和2字节属性，共50字节
+STL_FACET_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2')
+])
+
+
+def triangle_corners(vertices, faces):
+    """
+    取出每个三角面的三个顶点坐标
+
+    Returns:
+        corners: (M, 3, 3) float64数组，corners[:, k] 为第k个顶点
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    return vertices[faces]
+
+
+def face_cross_products(corners):
+    """每个三角面的边向量叉积 (v1-v0)×(v2-v0)，模长为面积的两倍"""
+    return np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+
+def face_normals(vertices, faces):
+    """每个三角面的单位法向量 (M, 3)"""
+    cross = face_cross_products(triangle_corners(vertices, faces))
+    return cross / (np.linalg.norm(cross, axis=1, keepdims=True) + 1e-8)
+
+
+def surface_area(vertices, faces):
+    """网格表面积"""
+    if len(faces) == 0:
+        return 0.0
+    cross = face_cross_products(triangle_corners(vertices, faces))
+    return float(0.5 * np.linalg.norm(cross, axis=1).sum())
+
+
+def mesh_volume(vertices, faces):
+    """
+    网格包围体积（散度定理：各三角面与原点构成的有向四面体体积之和）
+
+    marching cubes 输出的闭合网格结果可靠；非闭合网格仅作近似。
+    """
+    if len(faces) == 0:
+        return 0.0
+    corners = triangle_corners(vertices, faces)
+    signed = np.einsum('ij,ij->i', corners[:, 0], np.cross(corners[:, 1], corners[:, 2]))
+    return float(abs(signed.sum()) / 6.0)
+
+
+def sphericity(volume, area):
+    """球形度 π^(1/3)·(6V)^(2/3)/A，球体为1，形状越不规则越小"""
+    if area <= 0 or volume <= 0:
+        return 0.0
+    return float(np.pi ** (1 / 3) * (6 * volume) ** (2 / 3) / area)
+
+
+def compute_mesh_metrics(vertices, faces, volume=None):
+    """
+    计算网格的几何度量
+
+    Args:
+        vertices: (N, 3) 顶点
+        faces: (M, 3) 三角面索引
+        volume: 可选，已知体积（如体素计数体积），为None时由网格计算
+
+    Returns:
+        {
+            'surface_area', 'mesh_volume', 'volume', 'centroid',
+            'bounding_box': {'min', 'max'}, 'bbox_volume', 'compactness', 'sphericity'
+        }
+        centroid 为顶点均值；compactness 为体积与包围盒体积之比
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    area = surface_area(vertices, faces)
+    enclosed = mesh_volume(vertices, faces)
+    volume = enclosed if volume is None else float(volume)
+
+    if len(vertices):
+        centroid = vertices.mean(axis=0)
+        bbox_min = vertices.min(axis=0)
+        bbox_max = vertices.max(axis=0)
+    else:
+        centroid = bbox_min = bbox_max = np.zeros(3)
+    bbox_volume = float(np.prod(bbox_max - bbox_min))
+
+    return {
+        'surface_area': area,
+        'mesh_volume': enclosed,
+        'volume': volume,
+        'centroid': centroid,
+        'bounding_box': {'min': bbox_min, 'max': bbox_max},
+        'bbox_volume': bbox_volume,
+        'compactness': volume / bbox_volume if bbox_volume > 0 else 0.0,
+        'sphericity': sphericity(volume, area)
+    }
+
+
+def build_stl_array(vertices, faces):
+    """
+    构建二进制STL三角面结构化数组（一次性填充，不逐面循环）
+
+    Returns:
+        facets: STL_FACET_DTYPE 结构化数组，长度为三角面数
+    """
+    corners = triangle_corners(vertices, faces)
+    cross = face_cross_products(corners)
+    facets = np.zeros(len(corners), dtype=STL_FACET_DTYPE)
+    facets['normal'] = cross / (np.linalg.norm(cross, axis=1, keepdims=True) + 1e-8)
+    facets['vertices'] = corners
+    return facets
+
+
+def write_binary_stl(facets, output_path, header='tumor'):
+    """
+    写出二进制STL：80字节头 + uint32三角面数 + 三角面记录
+
+    Args:
+        facets: build_stl_array 返回的结构化数组
+        output_path: 输出路径
+        header: 文件头文本（截断/补齐到80字节）
+    """
+    header_bytes = header.encode('ascii', errors='replace')[:80].ljust(80, b' ')
+    with open(output_path, 'wb') as f:
+        f.write(header_bytes)
+        f.write(np.uint32(len(facets)).astype('<u4').tobytes())
+        f.write(facets.tobytes())
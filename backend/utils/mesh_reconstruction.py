@@ -7,11 +7,13 @@ import os
 import cv2
 import json
 import numpy as np
-import nibabel as nib
 from scipy import ndimage
 from skimage import measure
 import base64
 
+from utils.nifti_volume import open_nifti
+from utils.mesh_metrics import build_stl_array, write_binary_stl
+
 
 def refine_segmentation_smooth(mask_volume, connectivity_kernel_size=3, sigma=1.0):
     """
@@ -116,16 +118,71 @@ def reconstruct_3d_from_slices(mask_slices, spacing=(1.0, 1.0, 1.0), smooth=True
         return None, None, None, 0
 
 
-def extract_brain_outline(volume, spacing=(1.0, 1.0, 1.0)):
+def compute_brain_threshold(volume):
+    """
+    计算脑组织阈值（10%百分位，过低时退化为均值的10%；体素过少时退化为5%百分位）
+
+    Args:
+        volume: 3D MRI体积数据
+
+    Returns:
+        threshold_value: 脑组织强度阈值
+    """
+    vol_mean = float(volume.mean())
+    threshold_value = float(np.percentile(volume, 10))
+    if threshold_value < vol_mean * 0.05:
+        threshold_value = vol_mean * 0.1
+    if np.count_nonzero(volume > threshold_value) < 1000:
+        threshold_value = float(np.percentile(volume, 5))
+    return threshold_value
+
+
+def find_brain_roi(volume, threshold_value=None, margin=8, min_tissue_voxels=50, axis=2):
+    """
+    预扫描体积，找出脑组织的包围盒以及含组织的切片
+
+    Args:
+        volume: 3D MRI体积数据
+        threshold_value: 脑组织阈值，None时调用 compute_brain_threshold
+        margin: 包围盒在切片平面内向外扩展的体素数
+        min_tissue_voxels: 切片内组织体素数低于该值视为空切片
+        axis: 切片所在轴
+
+    Returns:
+        roi: {'rows': (r0, r1), 'cols': (c0, c1), 'slice_indices': ndarray}，
+             无组织时返回None
+    """
+    if threshold_value is None:
+        threshold_value = compute_brain_threshold(volume)
+
+    tissue = np.moveaxis(volume, axis, 2) > threshold_value
+    per_slice = np.count_nonzero(tissue, axis=(0, 1))
+    slice_indices = np.flatnonzero(per_slice >= min_tissue_voxels)
+    if slice_indices.size == 0:
+        return None
+
+    footprint = np.any(tissue[:, :, slice_indices], axis=2)
+    rows = np.flatnonzero(footprint.any(axis=1))
+    cols = np.flatnonzero(footprint.any(axis=0))
+    H, W = footprint.shape
+    return {
+        'rows': (max(0, int(rows[0]) - margin), min(H, int(rows[-1]) + margin + 1)),
+        'cols': (max(0, int(cols[0]) - margin), min(W, int(cols[-1]) + margin + 1)),
+        'slice_indices': slice_indices
+    }
+
+
+def extract_brain_outline(volume, spacing=(1.0, 1.0, 1.0), threshold_value=None):
     """
     提取脑部轮廓作为背景参考（基于demo实现）
     
     Args:
         volume: 3D MRI体积数据
         spacing: 体素间距 (x, y, z)
+        threshold_value: 预先计算的脑组织阈值（None时按10%百分位计算）
         
     Returns:
-        brain_data: 包含vertices和faces的字典，失败返回None
+        brain_data: 包含vertices和faces（numpy数组）的字典，失败返回None
     """
     import sys
     try:
@@ -138,25 +195,13 @@ def extract_brain_outline(volume, spacing=(1.0, 1.0, 1.0)):
         print(f"   体积数据范围: min={vol_min:.2f}, max={vol_max:.2f}, mean={vol_mean:.2f}")
         
         # 1. 简单的阈值处理（使用10%百分位，与demo一致）
-        threshold_value = np.percentile(volume, 10)
-        
-        # 自适应调整：如果阈值太低，使用均值的10%
-        if threshold_value < vol_mean * 0.05:
-            threshold_value = vol_mean * 0.1
-            print(f"   [警告] 10%百分位过低，使用均值的10%作为阈值")
+        if threshold_value is None:
+            threshold_value = compute_brain_threshold(volume)
         
         brain_mask = (volume > threshold_value).astype(np.float32)
         brain_voxels = int(np.sum(brain_mask))
         print(f"   阈值: {threshold_value:.2f}, 脑组织体素数: {brain_voxels}")
         
-        # 检查是否有足够的体素
-        if brain_voxels < 1000:
-            print(f"   [错误] 脑组织体素数太少 ({brain_voxels} < 1000)，尝试降低阈值")
-            threshold_value = np.percentile(volume, 5)
-            brain_mask = (volume > threshold_value).astype(np.float32)
-            brain_voxels = int(np.sum(brain_mask))
-            print(f"   使用5%百分位: 阈值={threshold_value:.2f}, 体素数={brain_voxels}")
-        
         # 2. 清除边缘（防止出现方形外框）
         brain_mask[0:2, :, :] = 0
         brain_mask[-2:, :, :] = 0
@@ -201,8 +246,8 @@ def extract_brain_outline(volume, spacing=(1.0, 1.0, 1.0)):
         print(f"   顶点范围: min={b_verts.min(axis=0)}, max={b_verts.max(axis=0)}")
         
         return {
-            'vertices': b_verts.tolist(),
-            'faces': b_faces.tolist()
+            'vertices': b_verts,
+            'faces': b_faces
         }
     except Exception as e:
         print(f"[错误] 提取脑部轮廓失败: {e}")
@@ -212,44 +257,55 @@ def extract_brain_outline(volume, spacing=(1.0, 1.0, 1.0)):
         return None
 
 
-def reconstruct_3d_from_nii(nii_path, predictor, spacing=(1.0, 1.0, 1.0), include_brain_outline=True):
+def reconstruct_3d_from_nii(nii_path, predictor, spacing=(1.0, 1.0, 1.0), include_brain_outline=True,
+                            batch_size=16, crop_roi=True, roi_margin=8, progress_callback=None,
+                            return_mask=False):
     """
-    从NII文件重建3D模型（使用UNet逐切片预测）
+    从NII文件重建3D模型（使用UNet批量切片预测）
     
     Args:
         nii_path: NII文件路径
         predictor: UNet预测器实例 (BrainTumorPredictor)
         spacing: 体素间距 (x, y, z)
         include_brain_outline: 是否包含脑部轮廓
+        batch_size: 每次前向推理的切片数上限
+        crop_roi: 是否跳过无组织的切片并只将脑组织包围盒送入网络
+        roi_margin: 包围盒向外扩展的体素数
+        progress_callback: 可选回调 progress_callback(done, total)，按已预测切片数调用
+        return_mask: 是否在结果中附带 'mask_volume'（uint8 (H, W, D) 分割掩码，供3D影像组学使用）
         
     Returns:
-        reconstruction_data: 包含vertices, faces等的字典，失败返回None
+        reconstruction_data: 包含vertices, faces等（numpy数组）的字典，失败返回None；
+            JSON序列化前用 mesh_arrays_to_lists 转换
     """
     try:
-        # 加载NII文件
-        nii = nib.load(nii_path)
-        volume = nii.get_fdata()
-        H, W, D = volume.shape
+        # 加载NII文件（原始数据类型，不生成float64副本）
+        with open_nifti(nii_path) as nifti:
+            volume = nifti.read()
+        H, W, D = volume.shape[:3]
         
         print(f"NII文件尺寸: {H} x {W} x {D}")
         
-        # 逐切片预测
-        masks = []
-        for i in range(D):
-            slice_img = volume[:, :, i]
-            
-            # 归一化到0-255
-            slice_img = cv2.normalize(
-                slice_img, None, 0, 255, cv2.NORM_MINMAX
-            ).astype(np.uint8)
-            
-            # UNet预测
-            mask, _ = predictor.predict_array(slice_img)
-            masks.append(mask)
-            
-            # 进度日志
-            if (i + 1) % max(1, D // 10) == 0:
-                print(f"  UNet预测进度: {i+1}/{D}")
+        threshold_value = compute_brain_threshold(volume)
+        roi = find_brain_roi(volume, threshold_value, margin=roi_margin) if crop_roi else None
+        
+        # 批量切片预测（按batch_size堆叠成批张量，向量化预处理与二值化）
+        if roi is None:
+            mask_volume = predictor.predict_volume(volume, axis=2, batch_size=batch_size,
+                                                   progress_callback=progress_callback)
+            print(f"  UNet预测完成: {D} 个切片, 批大小={batch_size}")
+        else:
+            # 只预测含组织切片的脑部包围盒，其余切片保持全零掩码
+            (r0, r1), (c0, c1) = roi['rows'], roi['cols']
+            slice_indices = roi['slice_indices']
+            mask_volume = np.zeros((H, W, D), dtype=np.uint8)
+            mask_volume[r0:r1, c0:c1, slice_indices] = predictor.predict_volume(
+                volume[r0:r1, c0:c1, slice_indices], axis=2, batch_size=batch_size,
+                progress_callback=progress_callback
+            )
+            print(f"  UNet预测完成: {len(slice_indices)}/{D} 个切片 (跳过 {D - len(slice_indices)} 个空切片), "
+                  f"ROI={r1 - r0}x{c1 - c0}, 批大小={batch_size}")
+        masks = [mask_volume[:, :, i] for i in range(D)]
         
         # 3D重建肿瘤
         vertices, faces, normals, tumor_volume = reconstruct_3d_from_slices(
@@ -263,20 +319,22 @@ def reconstruct_3d_from_nii(nii_path, predictor, spacing=(1.0, 1.0, 1.0), includ
         print(f"肿瘤3D重建完成: 顶点数={len(vertices)}, 面数={len(faces)}, 体积={tumor_volume:.2f}mm³")
         
         result = {
-            'vertices': vertices.tolist(),
-            'faces': faces.tolist(),
-            'normals': normals.tolist(),
+            'vertices': vertices,
+            'faces': faces,
+            'normals': normals,
             'volume': float(tumor_volume),
             'dimensions': {'height': H, 'width': W, 'depth': D},
-            'voxel_count': int(np.sum(np.stack(masks, axis=2) > 127)),
+            'voxel_count': int(np.count_nonzero(mask_volume > 127)),
             'spacing': list(spacing)
         }
+        if return_mask:
+            result['mask_volume'] = mask_volume
         
         # 提取脑部轮廓
         if include_brain_outline:
             print("[信息] 准备提取脑部轮廓...")
             try:
-                brain_data = extract_brain_outline(volume, spacing)
+                brain_data = extract_brain_outline(volume, spacing, threshold_value=threshold_value)
                 if brain_data:
                     result['brain_outline'] = brain_data
                     print(f"[成功] 脑部轮廓已添加到结果中")
@@ -300,31 +358,14 @@ def reconstruct_3d_from_nii(nii_path, predictor, spacing=(1.0, 1.0, 1.0), includ
 
 def export_to_stl(vertices, faces, output_path):
     """
-    导出为STL文件格式
+    导出为二进制STL文件格式
     
     Args:
         vertices: 顶点数组
         faces: 面数组
         output_path: 输出路径
     """
-    with open(output_path, 'w') as f:
-        f.write('solid tumor\n')
-        
-        for face in faces:
-            # 计算法向量
-            v0, v1, v2 = vertices[face]
-            normal = np.cross(v1 - v0, v2 - v0)
-            normal = normal / (np.linalg.norm(normal) + 1e-8)
-            
-            f.write(f'  facet normal {normal[0]} {normal[1]} {normal[2]}\n')
-            f.write('    outer loop\n')
-            f.write(f'      vertex {v0[0]} {v0[1]} {v0[2]}\n')
-            f.write(f'      vertex {v1[0]} {v1[1]} {v1[2]}\n')
-            f.write(f'      vertex {v2[0]} {v2[1]} {v2[2]}\n')
-            f.write('    endloop\n')
-            f.write('  endfacet\n')
-        
-        f.write('endsolid tumor\n')
+    write_binary_stl(build_stl_array(vertices, faces), output_path, header='tumor')
 
 
 def mesh_to_json(vertices, faces, normals):
@@ -340,3 +381,119 @@ def mesh_to_json(vertices, faces, normals):
         'normals': normals.tolist() if isinstance(normals, np.ndarray) else normals,
     }
     return json.dumps(data)
+
+
+MESH_ARRAY_KEYS = ('vertices', 'faces', 'normals')
+
+
+def mesh_arrays_to_lists(reconstruction_data):
+    """
+    将重建结果中的网格数组转换为列表（JSON响应使用），包括嵌套的 brain_outline
+
+    Returns:
+        新字典，原字典不变
+    """
+    data = dict(reconstruction_data)
+    for key in MESH_ARRAY_KEYS:
+        if isinstance(data.get(key), np.ndarray):
+            data[key] = data[key].tolist()
+    if isinstance(data.get('brain_outline'), dict):
+        data['brain_outline'] = mesh_arrays_to_lists(data['brain_outline'])
+    return data
+
+
+def export_to_glb(meshes, output_path=None):
+    """
+    将一个或多个网格打包为glTF 2.0二进制格式（GLB）
+
+    顶点/法向量为float32，索引为uint32，前端可用 three.js GLTFLoader 直接加载，
+    或按bufferView偏移直接构建 Float32Array / Uint32Array。
+
+    Args:
+        meshes: [{'name': str, 'vertices': (N,3), 'faces': (M,3), 'normals': (N,3)可选}, ...]
+        output_path: 输出路径，None时只返回字节
+
+    Returns:
+        glb_bytes: GLB文件内容
+    """
+    import struct
+
+    binary_chunks = []
+    buffer_views = []
+    accessors = []
+    gltf_meshes = []
+    nodes = []
+    offset = 0
+
+    def add_view(array, target):
+        nonlocal offset
+        data = array.tobytes()
+        buffer_views.append({'buffer': 0, 'byteOffset': offset, 'byteLength': len(data), 'target': target})
+        binary_chunks.append(data)
+        offset += len(data)  # float32/uint32数据天然4字节对齐
+        return len(buffer_views) - 1
+
+    for mesh in meshes:
+        vertices = np.ascontiguousarray(mesh['vertices'], dtype=np.float32).reshape(-1, 3)
+        faces = np.ascontiguousarray(mesh['faces'], dtype=np.uint32).reshape(-1)
+        attributes = {}
+
+        accessors.append({
+            'bufferView': add_view(vertices, 34962),  # ARRAY_BUFFER
+            'componentType': 5126,  # FLOAT
+            'count': int(len(vertices)),
+            'type': 'VEC3',
+            'min': vertices.min(axis=0).tolist() if len(vertices) else [0.0, 0.0, 0.0],
+            'max': vertices.max(axis=0).tolist() if len(vertices) else [0.0, 0.0, 0.0]
+        })
+        attributes['POSITION'] = len(accessors) - 1
+
+        if mesh.get('normals') is not None and len(mesh['normals']) == len(vertices):
+            normals = np.ascontiguousarray(mesh['normals'], dtype=np.float32).reshape(-1, 3)
+            accessors.append({
+                'bufferView': add_view(normals, 34962),
+                'componentType': 5126,
+                'count': int(len(normals)),
+                'type': 'VEC3'
+            })
+            attributes['NORMAL'] = len(accessors) - 1
+
+        accessors.append({
+            'bufferView': add_view(faces, 34963),  # ELEMENT_ARRAY_BUFFER
+            'componentType': 5125,  # UNSIGNED_INT
+            'count': int(len(faces)),
+            'type': 'SCALAR'
+        })
+        gltf_meshes.append({
+            'name': mesh.get('name', f'mesh_{len(gltf_meshes)}'),
+            'primitives': [{'attributes': attributes, 'indices': len(accessors) - 1, 'mode': 4}]
+        })
+        nodes.append({'name': gltf_meshes[-1]['name'], 'mesh': len(gltf_meshes) - 1})
+
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'tumorDetection mesh_reconstruction'},
+        'scene': 0,
+        'scenes': [{'nodes': list(range(len(nodes)))}],
+        'nodes': nodes,
+        'meshes': gltf_meshes,
+        'accessors': accessors,
+        'bufferViews': buffer_views,
+        'buffers': [{'byteLength': offset}]
+    }
+
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    bin_chunk = b''.join(binary_chunks)
+    bin_chunk += b'\x00' * (-len(bin_chunk) % 4)
+
+    total_length = 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)
+    glb = b''.join([
+        struct.pack('<III', 0x46546C67, 2, total_length),  # 'glTF'
+        struct.pack('<II', len(json_chunk), 0x4E4F534A), json_chunk,  # 'JSON'
+        struct.pack('<II', len(bin_chunk), 0x004E4942), bin_chunk  # 'BIN\0'
+    ])
+
+    if output_path:
+        with open(output_path, 'wb') as f:
+            f.write(glb)
+    return glb
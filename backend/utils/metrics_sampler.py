@@ -0,0 +1,181 @@
+"""
+系统指标采样 - 系统监控接口的后台采样器
+后台线程按固定间隔采集 CPU、内存、磁盘、分析任务队列深度与请求速率，
+保存在环形缓冲区中；监控接口直接返回最新快照与近期历史，不在请求中阻塞采样。
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# 默认采样间隔（秒）与环形缓冲区长度（默认保留最近10分钟）
+DEFAULT_INTERVAL = 5.0
+DEFAULT_HISTORY = 120
+
+
+class MetricsSampler:
+    """后台指标采样器（守护线程 + 环形缓冲区）"""
+
+    def __init__(self, app, interval: float = DEFAULT_INTERVAL, history: int = DEFAULT_HISTORY,
+                 disk_path: Optional[str] = None):
+        """
+        Args:
+            app: Flask应用（读取任务队列）
+            interval: 采样间隔（秒），<=0 时不启动后台线程，由监控接口按需采样
+            history: 环形缓冲区保留的样本数
+            disk_path: 统计磁盘占用的路径（默认上传目录）
+        """
+        self.app = app
+        self.interval = float(interval)
+        self.disk_path = disk_path or '/'
+        self._samples = deque(maxlen=max(1, int(history)))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = psutil.Process(os.getpid()) if psutil is not None else None
+        # 请求计数（由 before_request / after_request 钩子累加）
+        self._requests = 0
+        self._errors = 0
+        self._last_requests = 0
+        self._last_errors = 0
+        self._last_time = time.monotonic()
+        if psutil is not None:
+            # cpu_percent(interval=None) 返回与上次调用之间的占用率，首次调用只建立基准
+            psutil.cpu_percent(interval=None)
+
+    # ------------------------------------------------------------
+    # 请求计数
+    # ------------------------------------------------------------
+    def record_request(self):
+        with self._lock:
+            self._requests += 1
+
+    def record_error(self):
+        with self._lock:
+            self._errors += 1
+
+    # ------------------------------------------------------------
+    # 采样
+    # ------------------------------------------------------------
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='metrics-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"指标采样失败: {e}")
+
+    def _queue_depth(self) -> Dict[str, Optional[int]]:
+        queue = self.app.extensions.get('job_queue')
+        if queue is None:
+            return {'queued_jobs': None, 'running_jobs': None}
+        return {'queued_jobs': queue.pending_count(), 'running_jobs': queue.running_count()}
+
+    def sample(self) -> Dict[str, Any]:
+        """采集一个样本并写入环形缓冲区（非阻塞）"""
+        now = time.monotonic()
+        with self._lock:
+            elapsed = max(now - self._last_time, 1e-6)
+            requests, errors = self._requests, self._errors
+            request_rate = (requests - self._last_requests) / elapsed
+            error_rate = (errors - self._last_errors) / elapsed
+            self._last_requests, self._last_errors, self._last_time = requests, errors, now
+
+        snapshot = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'cpu_percent': None,
+            'memory_percent': None,
+            'process_memory_mb': None,
+            'disk_percent': None,
+            **self._queue_depth(),
+            'requests_total': requests,
+            'request_rate': round(request_rate, 2),
+            'error_rate': round(error_rate, 3),
+        }
+        if psutil is not None:
+            snapshot['cpu_percent'] = psutil.cpu_percent(interval=None)
+            snapshot['memory_percent'] = psutil.virtual_memory().percent
+            snapshot['process_memory_mb'] = round(self._process.memory_info().rss / (1024 * 1024), 1)
+            try:
+                snapshot['disk_percent'] = psutil.disk_usage(self.disk_path).percent
+            except OSError:
+                pass
+
+        with self._lock:
+            self._samples.append(snapshot)
+        return snapshot
+
+    def latest(self) -> Dict[str, Any]:
+        """最新样本；尚无样本（或未启动后台线程）时立即采样一次"""
+        with self._lock:
+            if self._samples and self._thread is not None:
+                return self._samples[-1]
+        return self.sample()
+
+    def history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """近期样本（旧的在前）"""
+        with self._lock:
+            samples = list(self._samples)
+        return samples[-limit:] if limit else samples
+
+
+def init_metrics_sampler(app, interval: float = DEFAULT_INTERVAL, history: int = DEFAULT_HISTORY) -> MetricsSampler:
+    """创建应用的指标采样器，注册请求计数钩子并启动后台采样线程"""
+    sampler = MetricsSampler(app, interval=interval, history=history, disk_path=app.config.get('UPLOADS_DIR'))
+    app.extensions['metrics_sampler'] = sampler
+
+    @app.before_request
+    def _count_request():
+        sampler.record_request()
+
+    @app.after_request
+    def _count_error(response):
+        if response.status_code >= 500:
+            sampler.record_error()
+        return response
+
+    sampler.start()
+    return sampler
+
+
+def get_metrics_sampler() -> MetricsSampler:
+    """获取当前应用的指标采样器"""
+    return current_app.extensions['metrics_sampler']
+
+
+def monitor_payload(history_limit: Optional[int] = None) -> Dict[str, Any]:
+    """系统监控接口的响应体（兼容旧字段 serverStatus / storageUsage / apiCalls / cpu_percent / memory_percent）"""
+    sampler = get_metrics_sampler()
+    snapshot = sampler.latest()
+    return {
+        'serverStatus': 'running',
+        'storageUsage': snapshot['disk_percent'],
+        'apiCalls': snapshot['requests_total'],
+        'cpu_percent': snapshot['cpu_percent'],
+        'memory_percent': snapshot['memory_percent'],
+        'snapshot': snapshot,
+        'history': sampler.history(history_limit),
+        'sample_interval': sampler.interval
+    }
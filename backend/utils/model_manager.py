@@ -7,6 +7,9 @@ import cv2
 import numpy as np
 from datetime import datetime
 
+from utils.inference_telemetry import get_inference_telemetry
+from utils.model_registry import inference_lock
+
 
 class ModelManager:
     """模型管理器 - 支持YOLO和UNet切换"""
@@ -71,22 +74,16 @@ class ModelManager:
         if model_type is None:
             model_type = self.detect_model_type(weight_path)
         
-        print(f"加载{model_type.upper()}模型: {weight_path}")
-        
-        if model_type == 'yolo':
-            from ultralytics import YOLO
-            model = YOLO(weight_path)
-            model.conf = conf_threshold
-            return model, 'yolo'
-        
-        elif model_type == 'unet':
-            from utils.unet_predictor import UNetPredictor
-            # UNet使用参考代码的默认阈值0.3，或用户指定的阈值
-            model = UNetPredictor(weight_path, device=device, threshold=conf_threshold)
-            return model, 'unet'
-        
-        else:
+        if model_type not in ('yolo', 'unet'):
             raise ValueError(f"不支持的模型类型: {model_type}")
+        
+        # 通过进程级注册表获取，命中时不再重复反序列化权重
+        from utils.model_registry import get_model_registry
+        # UNet使用参考代码的默认阈值0.3，或用户指定的阈值
+        model = get_model_registry().get(
+            weight_path, model_type, device=device, threshold=conf_threshold
+        )
+        return model, model_type
     
     def predict(self, model, model_type, image_path, **kwargs):
         """
@@ -101,16 +98,18 @@ class ModelManager:
         Returns:
             result: 统一格式的预测结果
         """
-        if model_type == 'yolo':
-            return self._predict_yolo(model, image_path, **kwargs)
-        elif model_type == 'unet':
-            return self._predict_unet(model, image_path, **kwargs)
-        else:
+        if model_type not in ('yolo', 'unet'):
             raise ValueError(f"不支持的模型类型: {model_type}")
+        # 模型实例由注册表在线程间共享，推理需串行
+        with inference_lock(model):
+            if model_type == 'yolo':
+                return self._predict_yolo(model, image_path, **kwargs)
+            return self._predict_unet(model, image_path, **kwargs)
     
     def _predict_yolo(self, model, image_path, imgsz=256):
         """YOLO模型预测"""
         results = model(image_path, imgsz=imgsz, verbose=False)
+        get_inference_telemetry().record_ultralytics('yolo', model, results)
         result = results[0]
         
         if result.masks is None or len(result.masks) == 0:
@@ -202,12 +201,14 @@ class ModelManager:
         h, w = image.shape[:2]
         
         # YOLO预测
-        yolo_result = self._predict_yolo(yolo_model, image_path)
+        with inference_lock(yolo_model):
+            yolo_result = self._predict_yolo(yolo_model, image_path)
         yolo_masks = yolo_result['segmentation_result']['masks']
         yolo_metrics = yolo_result['metrics']
         
         # UNet预测
-        unet_pred_mask, unet_pred_prob, unet_result = unet_model.predict(image_path)
+        with inference_lock(unet_model):
+            unet_pred_mask, unet_pred_prob, unet_result = unet_model.predict(image_path)
         unet_metrics = unet_result['metrics']
         
         # 生成可视化
@@ -0,0 +1,254 @@
+"""
+模型注册表 - 进程级共享的模型缓存
+按 (权重路径, 模型类型, 设备, 阈值) 缓存已加载的模型实例，
+按内存预算做LRU淘汰，首次加载时执行一次预热推理。
+
+同一模型实例被请求线程与后台任务线程共享；ultralytics YOLO.predict 会复用并改写
+实例上的 predictor（conf/imgsz 等参数），不是线程安全的。调用方推理时需持有
+inference_lock(model)。
+"""
+
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+# 默认内存预算（MB），可通过 configure_model_registry 或环境变量 MODEL_REGISTRY_MAX_MB 覆盖
+DEFAULT_MEMORY_BUDGET_MB = 2048
+
+# 模型实例 -> 推理锁（随模型实例回收；已被淘汰但仍在使用的实例保留同一把锁）
+_inference_locks: "weakref.WeakKeyDictionary[Any, threading.RLock]" = weakref.WeakKeyDictionary()
+_inference_locks_guard = threading.Lock()
+
+
+def inference_lock(model) -> threading.RLock:
+    """获取模型实例的推理锁，同一实例的推理调用需在锁内串行执行"""
+    with _inference_locks_guard:
+        lock = _inference_locks.get(model)
+        if lock is None:
+            lock = _inference_locks[model] = threading.RLock()
+        return lock
+
+
+class _RegistryEntry:
+    """注册表条目"""
+
+    def __init__(self, model, size_bytes: int):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.hits = 0
+
+
+class ModelRegistry:
+    """线程安全的模型注册表（LRU + 内存预算）"""
+
+    SUPPORTED_TYPES = ('yolo', 'unet', 'brain_unet')
+
+    def __init__(self, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, warmup: bool = True):
+        """
+        Args:
+            memory_budget_mb: 所有已缓存模型的内存上限（MB）
+            warmup: 首次加载后是否执行一次预热推理
+        """
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.warmup = warmup
+        self._entries: "OrderedDict[Tuple, _RegistryEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        # 每个key一把加载锁，避免并发请求重复反序列化同一份权重
+        self._load_locks: Dict[Tuple, threading.Lock] = {}
+
+    @staticmethod
+    def make_key(weight_path: str, model_type: str, device: str = 'cpu',
+                 threshold: Optional[float] = None) -> Tuple:
+        """构建缓存键"""
+        if os.path.exists(weight_path):
+            weight_path = os.path.abspath(weight_path)
+        threshold = None if threshold is None else round(float(threshold), 4)
+        return (weight_path, model_type, device, threshold)
+
+    def get(self, weight_path: str, model_type: str = 'yolo', device: str = 'cpu',
+            threshold: Optional[float] = None):
+        """
+        获取模型实例，未命中时加载并缓存
+
+        Args:
+            weight_path: 权重文件路径（或ultralytics内置模型名，如 'yolov8n-seg.pt'）
+            model_type: 'yolo' | 'unet' | 'brain_unet'
+            device: 'cpu' 或 'cuda'
+            threshold: 置信度/分割阈值；YOLO在推理时传conf的场景可传None
+
+        Returns:
+            model: 已加载（并预热）的模型实例
+        """
+        if model_type not in self.SUPPORTED_TYPES:
+            raise ValueError(f"不支持的模型类型: {model_type}")
+
+        key = self.make_key(weight_path, model_type, device, threshold)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                return entry.model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # 双重检查：等待期间可能已被其他线程加载
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    entry.hits += 1
+                    return entry.model
+
+            model = self._load(key[0], model_type, device, threshold)
+            if self.warmup:
+                with inference_lock(model):
+                    self._warmup(model, model_type)
+
+            entry = _RegistryEntry(model, self._estimate_size(model, key[0]))
+            with self._lock:
+                self._entries[key] = entry
+                self._evict_locked()
+                self._load_locks.pop(key, None)
+            print(f"[模型注册表] 已缓存 {model_type.upper()} 模型: {key[0]} "
+                  f"({entry.size_bytes / 1024 / 1024:.1f}MB)")
+            return model
+
+    def evict(self, weight_path: Optional[str] = None) -> int:
+        """
+        手动淘汰模型
+
+        Args:
+            weight_path: 仅淘汰该权重对应的条目；为None时清空全部
+
+        Returns:
+            淘汰的条目数
+        """
+        with self._lock:
+            if weight_path is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            target = os.path.abspath(weight_path) if os.path.exists(weight_path) else weight_path
+            keys = [k for k in self._entries if k[0] == target]
+            for k in keys:
+                del self._entries[k]
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回注册表状态（供监控使用）"""
+        with self._lock:
+            return {
+                'memory_budget_mb': round(self.memory_budget_bytes / 1024 / 1024, 1),
+                'memory_used_mb': round(sum(e.size_bytes for e in self._entries.values()) / 1024 / 1024, 1),
+                'models': [
+                    {
+                        'weight_path': key[0],
+                        'model_type': key[1],
+                        'device': key[2],
+                        'threshold': key[3],
+                        'size_mb': round(entry.size_bytes / 1024 / 1024, 1),
+                        'hits': entry.hits
+                    }
+                    for key, entry in self._entries.items()
+                ]
+            }
+
+    # ------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------
+    def _evict_locked(self):
+        """按LRU顺序淘汰，直到满足内存预算（至少保留最近使用的一个）"""
+        total = sum(e.size_bytes for e in self._entries.values())
+        while total > self.memory_budget_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            total -= entry.size_bytes
+            print(f"[模型注册表] 内存超出预算，淘汰模型: {key[0]} ({key[1]})")
+
+    @staticmethod
+    def _load(weight_path: str, model_type: str, device: str, threshold: Optional[float]):
+        """按类型构建模型实例"""
+        if model_type == 'yolo':
+            from ultralytics import YOLO
+            model = YOLO(weight_path)
+            if threshold is not None:
+                model.conf = threshold
+            return model
+        if model_type == 'unet':
+            from utils.unet_predictor import UNetPredictor
+            return UNetPredictor(weight_path, device=device,
+                                 threshold=0.3 if threshold is None else threshold)
+        # brain_unet: 3D重建使用的ResNeXtUNet推理器
+        from utils.predictor import BrainTumorPredictor
+        return BrainTumorPredictor(weight_path, device=device,
+                                   threshold=0.3 if threshold is None else threshold)
+
+    @staticmethod
+    def _warmup(model, model_type: str):
+        """首次加载后执行一次空白推理，摊销CUDA/算子初始化开销"""
+        try:
+            if model_type == 'yolo':
+                dummy = np.zeros((256, 256, 3), dtype=np.uint8)
+                model.predict(source=dummy, imgsz=256, verbose=False)
+            else:
+                import torch
+                with torch.no_grad():
+                    model.model(torch.zeros(1, 3, 256, 256, device=model.device))
+        except Exception as e:
+            print(f"[模型注册表] 预热失败（忽略）: {e}")
+
+    @staticmethod
+    def _estimate_size(model, weight_path: str) -> int:
+        """估算模型占用内存（参数+缓冲区字节数），失败时退化为权重文件大小"""
+        try:
+            module = getattr(model, 'model', None)
+            if module is not None and hasattr(module, 'parameters'):
+                size = sum(p.numel() * p.element_size() for p in module.parameters())
+                size += sum(b.numel() * b.element_size() for b in module.buffers())
+                if size > 0:
+                    return int(size)
+        except Exception:
+            pass
+        try:
+            return int(os.path.getsize(weight_path))
+        except OSError:
+            return 0
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def configure_model_registry(memory_budget_mb: Optional[float] = None, warmup: bool = True) -> ModelRegistry:
+    """
+    配置（或重新配置）进程级模型注册表
+
+    Args:
+        memory_budget_mb: 内存预算（MB），None时读取环境变量 MODEL_REGISTRY_MAX_MB
+        warmup: 是否预热
+    """
+    global _registry
+    if memory_budget_mb is None:
+        memory_budget_mb = float(os.getenv('MODEL_REGISTRY_MAX_MB', DEFAULT_MEMORY_BUDGET_MB))
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry(memory_budget_mb=memory_budget_mb, warmup=warmup)
+        else:
+            with _registry._lock:
+                _registry.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+                _registry.warmup = warmup
+                _registry._evict_locked()
+    return _registry
+
+
+def get_model_registry() -> ModelRegistry:
+    """获取进程级模型注册表（单例）"""
+    if _registry is None:
+        return configure_model_registry()
+    return _registry
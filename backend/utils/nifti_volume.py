@@ -0,0 +1,103 @@
+"""
+NIfTI体积按需读取模块
+基于 nibabel 的数组代理（ArrayProxy）与内存映射，按切片/切片块懒加载体积数据，
+保持原始数据类型（有缩放系数或float64数据时输出float32），避免 get_fdata() 生成整份float64副本。
+"""
+
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import nibabel as nib
+
+
+class NiftiVolume:
+    """NIfTI体积的懒加载访问层"""
+
+    def __init__(self, path: str, mmap: bool = True):
+        """
+        Args:
+            path: .nii 或 .nii.gz 文件路径
+            mmap: 未压缩文件是否使用内存映射
+        """
+        self.path = path
+        # keep_file_open=True：.nii.gz 连续读取切片块时复用同一个解压流，避免每次从头解压
+        self.image = nib.load(path, mmap=mmap, keep_file_open=True)
+        self.proxy = self.image.dataobj
+        self.shape: Tuple[int, ...] = tuple(int(n) for n in self.image.shape)
+        self.ndim = len(self.shape)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """释放底层文件句柄"""
+        file_like = getattr(self.proxy, '_opener', None)
+        if file_like is not None:
+            try:
+                file_like.close_if_mine()
+            except Exception:
+                pass
+        self.image.uncache()
+
+    # ------------------------------------------------------------
+    # 读取接口
+    # ------------------------------------------------------------
+    def slab(self, start: int, stop: int, axis: int = 2) -> np.ndarray:
+        """
+        读取 [start, stop) 范围的切片块（只读取这一部分数据）
+
+        4D体积只取第一个时间点。
+        """
+        slicer = [slice(None)] * self.ndim
+        slicer[axis] = slice(start, stop)
+        if self.ndim > 3:
+            slicer[3:] = [0] * (self.ndim - 3)
+        return self._as_output(self.proxy[tuple(slicer)])
+
+    def slice(self, index: int, axis: int = 2) -> np.ndarray:
+        """读取单个2D切片"""
+        return np.take(self.slab(index, index + 1, axis=axis), 0, axis=axis)
+
+    def middle_slice(self, axis: int = 2) -> np.ndarray:
+        """读取中间切片（预览与单切片分析使用）；非3D/4D数据退化为读取全部后squeeze"""
+        if self.ndim < 3:
+            return np.squeeze(self.read())
+        return self.slice(self.shape[axis] // 2, axis=axis)
+
+    def iter_slabs(self, slab_size: int = 16, axis: int = 2, start: int = 0,
+                   stop: Optional[int] = None) -> Iterator[Tuple[int, int, np.ndarray]]:
+        """
+        按切片块顺序迭代体积
+
+        Yields:
+            (start, stop, slab): 块在 axis 上的范围以及块数据
+        """
+        stop = self.shape[axis] if stop is None else min(stop, self.shape[axis])
+        slab_size = max(1, int(slab_size))
+        for begin in range(start, stop, slab_size):
+            end = min(begin + slab_size, stop)
+            yield begin, end, self.slab(begin, end, axis=axis)
+
+    def read(self) -> np.ndarray:
+        """读取整个体积（原始类型，不放大为float64）"""
+        if self.ndim > 3:
+            return self.slab(0, self.shape[2], axis=2)
+        return self._as_output(self.proxy[...])
+
+    # ------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------
+    @staticmethod
+    def _as_output(array) -> np.ndarray:
+        array = np.asanyarray(array)
+        if array.dtype == np.float64:
+            array = array.astype(np.float32)
+        return array
+
+
+def open_nifti(path: str, mmap: bool = True) -> NiftiVolume:
+    """打开NIfTI文件，返回懒加载体积对象"""
+    return NiftiVolume(path, mmap=mmap)
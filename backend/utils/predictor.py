@@ -4,12 +4,15 @@
 """
 
 import os
+import time
 import cv2
 import torch
 import numpy as np
 from torch import nn
 from torchvision.models import resnext50_32x4d
 
+from utils.inference_telemetry import get_inference_telemetry
+
 
 # =====================================================
 # 1. 模型定义（必须与训练时完全一致）
@@ -122,6 +125,7 @@ class BrainTumorPredictor:
         """
         self.device = device
         self.threshold = threshold
+        self.weight_path = weight_path
         
         # 初始化模型
         print(f"正在加载模型...")
@@ -173,6 +177,7 @@ class BrainTumorPredictor:
             pred_prob: 预测概率图 (256x256, numpy array)
         """
         # 读取图像
+        t0 = time.perf_counter()
         image = cv2.imread(image_path)
         if image is None:
             raise ValueError(f"无法读取图像: {image_path}")
@@ -185,11 +190,13 @@ class BrainTumorPredictor:
         img = img.astype(np.float32) / 255.0
         img = (img - self.mean) / self.std
         img_tensor = torch.from_numpy(img).float().permute(2, 0, 1).unsqueeze(0).to(self.device)
+        t1 = time.perf_counter()
         
         # 推理
         with torch.no_grad():
             pred_prob = self.model(img_tensor)
             pred_prob = pred_prob.cpu().numpy()[0, 0]
+        t2 = time.perf_counter()
         
         # 二值化
         pred_mask = np.copy(pred_prob)
@@ -200,6 +207,9 @@ class BrainTumorPredictor:
         # 调整回原始尺寸
         pred_mask = cv2.resize(pred_mask, (original_size[1], original_size[0]))
         pred_prob = cv2.resize(pred_prob, (original_size[1], original_size[0]))
+
+        get_inference_telemetry().record('unet', self.weight_path, kind='image', preprocess=t1 - t0,
+                                         forward=t2 - t1, postprocess=time.perf_counter() - t2)
         
         return pred_mask, pred_prob
 
@@ -217,6 +227,7 @@ class BrainTumorPredictor:
         if image_array is None:
             raise ValueError("image_array 不能为空")
 
+        t0 = time.perf_counter()
         img = image_array
 
         # 将浮点/其他类型归一化到0-255并转为uint8
@@ -237,6 +248,7 @@ class BrainTumorPredictor:
         img_resized = img_resized.astype(np.float32) / 255.0
         img_resized = (img_resized - self.mean) / self.std
         img_tensor = torch.from_numpy(img_resized).float().permute(2, 0, 1).unsqueeze(0).to(self.device)
+        t1 = time.perf_counter()
 
         # 推理
         with torch.no_grad():
@@ -246,6 +258,7 @@ class BrainTumorPredictor:
             print(f"  模型输出shape: {pred_prob.shape}, min={pred_prob.min():.4f}, max={pred_prob.max():.4f}, mean={pred_prob.mean():.4f}")
             
             pred_prob = pred_prob.cpu().numpy()[0, 0]
+        t2 = time.perf_counter()
             
         print(f"  预测概率图: min={pred_prob.min():.4f}, max={pred_prob.max():.4f}, >0.1的像素数={np.sum(pred_prob > 0.1)}")
 
@@ -259,4 +272,95 @@ class BrainTumorPredictor:
         pred_mask = cv2.resize(pred_mask, (original_size[1], original_size[0]))
         pred_prob = cv2.resize(pred_prob, (original_size[1], original_size[0]))
 
+        get_inference_telemetry().record('unet', self.weight_path, kind='image', preprocess=t1 - t0,
+                                         forward=t2 - t1, postprocess=time.perf_counter() - t2)
+
         return pred_mask, pred_prob
+
+    def predict_volume(self, volume, axis=2, batch_size=16, progress_callback=None):
+        """
+        批量预测整个体积的所有切片（用于NII三维重建）
+
+        每个切片按 min-max 归一化到0-255，再按 batch_size 分批堆叠成
+        (N, 3, 256, 256) 张量一次前向；缩放、标准化与二值化均对整批向量化执行，
+        结果与逐切片调用 predict_array 一致。显存/内存不足时自动减半批大小重试。
+
+        Args:
+            volume: 3D numpy数组
+            axis: 切片所在轴（NIfTI轴向切片为2）
+            batch_size: 每批切片数上限
+            progress_callback: 可选回调 progress_callback(done, total)，每批完成后调用
+
+        Returns:
+            pred_masks: 与 volume 同形状的uint8掩码（0-255）
+        """
+        if volume is None or volume.ndim != 3:
+            raise ValueError("volume 必须是3D数组")
+
+        slices = np.moveaxis(volume, axis, 0)
+        num_slices, height, width = slices.shape
+        pred_masks = np.empty((num_slices, height, width), dtype=np.uint8)
+        batch_size = max(1, int(batch_size))
+
+        start = 0
+        while start < num_slices:
+            stop = min(start + batch_size, num_slices)
+            try:
+                pred_masks[start:stop] = self._predict_slice_batch(slices[start:stop])
+            except RuntimeError as e:
+                if 'out of memory' not in str(e).lower() or batch_size == 1:
+                    raise
+                if str(self.device).startswith('cuda'):
+                    torch.cuda.empty_cache()
+                batch_size = max(1, batch_size // 2)
+                print(f"  内存不足，批大小降为 {batch_size}")
+                continue
+            start = stop
+            if progress_callback:
+                progress_callback(stop, num_slices)
+
+        return np.moveaxis(pred_masks, 0, axis)
+
+    def _predict_slice_batch(self, slices):
+        """对一批2D切片 (N, H, W) 执行一次前向，返回原尺寸uint8掩码 (N, H, W)"""
+        num, height, width = slices.shape
+        t0 = time.perf_counter()
+
+        # 逐切片 min-max 归一化到0-255（与 cv2.normalize(NORM_MINMAX) + astype(uint8) 一致）
+        batch = slices.astype(np.float64)
+        v_min = batch.min(axis=(1, 2), keepdims=True)
+        v_max = batch.max(axis=(1, 2), keepdims=True)
+        span = v_max - v_min
+        scale = np.where(span > np.finfo(np.float64).eps, 255.0 / np.where(span > 0, span, 1.0), 0.0)
+        batch = ((batch - v_min) * scale).astype(np.uint8)
+
+        # 以通道维堆叠后一次缩放（cv2单次最多处理512个通道）
+        resized = self._resize_channels(batch, self.resize_size, self.resize_size)
+
+        # 灰度复制为3通道并按ImageNet均值方差标准化
+        resized = resized.astype(np.float32) / 255.0
+        mean = self.mean.astype(np.float32).reshape(1, 3, 1, 1)
+        std = self.std.astype(np.float32).reshape(1, 3, 1, 1)
+        img_tensor = torch.from_numpy((resized[:, None, :, :] - mean) / std).to(self.device)
+        t1 = time.perf_counter()
+
+        with torch.no_grad():
+            pred_prob = self.model(img_tensor)[:, 0]
+            pred_mask = ((pred_prob >= self.threshold).to(torch.uint8) * 255).cpu().numpy()
+        t2 = time.perf_counter()
+
+        masks = self._resize_channels(pred_mask, width, height)
+        get_inference_telemetry().record('unet', self.weight_path, kind='nifti_slices', items=num,
+                                         preprocess=t1 - t0, forward=t2 - t1,
+                                         postprocess=time.perf_counter() - t2)
+        return masks
+
+    @staticmethod
+    def _resize_channels(stack, width, height):
+        """将 (N, h, w) 的切片栈缩放为 (N, height, width)"""
+        out = np.empty((stack.shape[0], height, width), dtype=stack.dtype)
+        for i in range(0, stack.shape[0], 512):
+            chunk = np.ascontiguousarray(np.moveaxis(stack[i:i + 512], 0, -1))
+            chunk = cv2.resize(chunk, (width, height))
+            out[i:i + 512] = chunk.reshape(height, width, -1).transpose(2, 0, 1)
+        return out
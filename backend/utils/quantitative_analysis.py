@@ -9,6 +9,10 @@ import base64
 from datetime import datetime
 from collections import defaultdict
 
+from utils.local_statistics import summarize_local_statistics
+from utils.feature_context import FeatureContext
+from utils.texture_matrices import glcm_features
+
 class TumorQuantitativeAnalyzer:
     def __init__(self):
         """
@@ -16,35 +20,30 @@ class TumorQuantitativeAnalyzer:
         """
         pass
     
-    def create_quantitative_report(self, original_image, mask, segmentation_result=None):
+    def create_quantitative_report(self, original_image, mask, segmentation_result=None, context=None):
         """
         创建定量分析报告
         :param original_image: 原始图像
         :param mask: 肿瘤分割掩码
         :param segmentation_result: 分割结果（可选）
+        :param context: 可选，同一次分析共享的 FeatureContext
         :return: 包含定量指标的报告
         """
         try:
-            # 确保输入是numpy数组
-            if isinstance(original_image, Image.Image):
-                original_image = np.array(original_image)
-            if isinstance(mask, Image.Image):
-                mask = np.array(mask)
-            
-            # 确保掩码是二值化的
-            mask = (mask > 0).astype(np.uint8) * 255
+            # 灰度化、掩码二值化、轮廓等在上下文中只计算一次
+            ctx = FeatureContext.ensure(context, original_image, mask)
             
             # 计算基本指标
-            basic_metrics = self._calculate_basic_metrics(original_image, mask)
+            basic_metrics = self._calculate_basic_metrics(ctx)
             
             # 计算形态学指标
-            morphological_metrics = self._calculate_morphological_metrics(mask)
+            morphological_metrics = self._calculate_morphological_metrics(ctx)
             
             # 计算纹理特征
-            texture_metrics = self._calculate_texture_metrics(original_image, mask)
+            texture_metrics = self._calculate_texture_metrics(ctx)
             
             # 计算强度特征
-            intensity_metrics = self._calculate_intensity_metrics(original_image, mask)
+            intensity_metrics = self._calculate_intensity_metrics(ctx)
             
             # 合并所有指标
             report = {
@@ -64,15 +63,15 @@ class TumorQuantitativeAnalyzer:
                 'analysis_timestamp': datetime.utcnow().isoformat()
             }
     
-    def _calculate_basic_metrics(self, original_image, mask):
+    def _calculate_basic_metrics(self, ctx):
         """
         计算基本指标
         """
         # 肿瘤区域像素数
-        tumor_pixels = np.sum(mask > 0)
+        tumor_pixels = ctx.tumor_pixel_count
         
         # 总像素数
-        total_pixels = mask.size
+        total_pixels = ctx.mask.size
         
         # 肿瘤面积占比
         area_ratio = tumor_pixels / total_pixels if total_pixels > 0 else 0
@@ -89,12 +88,12 @@ class TumorQuantitativeAnalyzer:
             'tumor_volume_mm3': float(tumor_area_mm2 * 1.0)  # 假设厚度为1mm
         }
     
-    def _calculate_morphological_metrics(self, mask):
+    def _calculate_morphological_metrics(self, ctx):
         """
         计算形态学指标
         """
-        # 查找轮廓
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # 外轮廓（上下文缓存）
+        contours = ctx.contours
         
         if len(contours) == 0:
             return {
@@ -107,7 +106,7 @@ class TumorQuantitativeAnalyzer:
             }
         
         # 选择最大的轮廓
-        largest_contour = max(contours, key=cv2.contourArea)
+        largest_contour = ctx.largest_contour
         
         # 计算轮廓面积和周长
         area = cv2.contourArea(largest_contour)
@@ -138,39 +137,31 @@ class TumorQuantitativeAnalyzer:
             'equivalent_diameter': float(equivalent_diameter)
         }
     
-    def _calculate_texture_metrics(self, original_image, mask):
+    def _calculate_texture_metrics(self, ctx):
         """
         计算纹理特征
         """
-        # 确保原始图像是灰度图
-        if len(original_image.shape) == 3:
-            gray_image = cv2.cvtColor(original_image, cv2.COLOR_RGB2GRAY)
-        else:
-            gray_image = original_image
-        
-        # 应用掩码到灰度图像
-        masked_image = np.where(mask > 0, gray_image, 0)
-        
         # 计算灰度共生矩阵(GLCM)特征
-        glcm_features = self._calculate_glcm_features(masked_image)
+        glcm_features = self._calculate_glcm_features(ctx)
         
         # 计算局部二值模式(LBP)特征
-        lbp_features = self._calculate_lbp_features(masked_image)
+        lbp_features = self._calculate_lbp_features(ctx.masked_gray)
+        
+        # 肿瘤区域内的局部异质性（5x5窗口局部均值/标准差）
+        local_features = summarize_local_statistics(ctx.gray, window_size=5, mask=ctx.mask, valid_only=False)
         
         return {
             'glcm_features': glcm_features,
-            'lbp_features': lbp_features
+            'lbp_features': lbp_features,
+            'local_heterogeneity': local_features
         }
     
-    def _calculate_glcm_features(self, image):
+    def _calculate_glcm_features(self, ctx):
         """
-        计算灰度共生矩阵特征
+        计算灰度共生矩阵特征（肿瘤区域为ROI，0/45/90/135四个方向取平均）
         """
-        # 这里简化实现，实际应用中可能需要更复杂的GLCM计算
-        # 对于医学影像，通常需要考虑多个方向和距离
         try:
-            # 计算图像的统计特征
-            non_zero_pixels = image[image > 0]
+            non_zero_pixels = ctx.roi_pixels[ctx.roi_pixels > 0]
             if len(non_zero_pixels) == 0:
                 return {
                     'mean': 0,
@@ -181,25 +172,14 @@ class TumorQuantitativeAnalyzer:
                     'correlation': 0
                 }
             
-            mean_val = float(np.mean(non_zero_pixels))
-            std_val = float(np.std(non_zero_pixels))
-            
-            # 简化的能量和对比度计算
-            energy = float(np.sum(non_zero_pixels ** 2))
-            contrast = float(np.var(non_zero_pixels))
-            
-            # 均匀性
-            hist, _ = np.histogram(non_zero_pixels, bins=256, range=(0, 256))
-            hist = hist.astype(float) / np.sum(hist)  # 归一化
-            homogeneity = float(np.sum(hist / (1 + np.arange(256))))
-            
+            glcm = glcm_features(ctx.quantized)
             return {
-                'mean': mean_val,
-                'std': std_val,
-                'energy': energy,
-                'contrast': contrast,
-                'homogeneity': homogeneity,
-                'correlation': 0  # 简化实现
+                'mean': float(np.mean(non_zero_pixels)),
+                'std': float(np.std(non_zero_pixels)),
+                'energy': glcm['energy'],
+                'contrast': glcm['contrast'],
+                'homogeneity': glcm['homogeneity'],
+                'correlation': glcm['correlation']
             }
         except:
             return {
@@ -233,18 +213,12 @@ class TumorQuantitativeAnalyzer:
         except:
             return {'uniformity': 0, 'complexity': 0}
     
-    def _calculate_intensity_metrics(self, original_image, mask):
+    def _calculate_intensity_metrics(self, ctx):
         """
         计算强度特征
         """
-        # 确保原始图像是灰度图
-        if len(original_image.shape) == 3:
-            gray_image = cv2.cvtColor(original_image, cv2.COLOR_RGB2GRAY)
-        else:
-            gray_image = original_image
-        
-        # 应用掩码获取肿瘤区域的像素值
-        tumor_pixels = gray_image[mask > 0]
+        # 肿瘤区域的像素值
+        tumor_pixels = ctx.roi_pixels
         
         if len(tumor_pixels) == 0:
             return {
@@ -260,7 +234,7 @@ class TumorQuantitativeAnalyzer:
             'std_intensity': float(np.std(tumor_pixels)),
             'min_intensity': float(np.min(tumor_pixels)),
             'max_intensity': float(np.max(tumor_pixels)),
-            'median_intensity': float(np.median(tumor_pixels))
+            'median_intensity': ctx.percentile(50)
         }
     
     def visualize_tumor_metrics(self, report):
@@ -5,66 +5,57 @@ from scipy import ndimage
 from scipy.stats import skew, kurtosis
 import pywt  # 需要安装PyWavelets: pip install PyWavelets
 from datetime import datetime
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional
 
-def extract_radiomics_features(image: np.ndarray, mask: np.ndarray) -> Dict:
+from utils.feature_context import FeatureContext
+from utils.feature_pool import get_feature_pool
+from utils.local_statistics import summarize_local_statistics
+from utils.texture_matrices import (
+    DEFAULT_LEVELS,
+    compute_texture_features,
+    glcm_features,
+    glrlm_features,
+    mask_bounding_box,
+    ngtdm_features,
+    quantize_roi
+)
+
+def extract_radiomics_features(image: np.ndarray, mask: np.ndarray,
+                               context: Optional[FeatureContext] = None) -> Dict:
     """
     提取影像组学特征
+
+    各特征族（一阶、形状、纹理、小波、高阶）由进程级特征计算池并行计算，
+    单个特征族超时或失败时该族返回空字典，并记录在 failed_families 中。
     :param image: 原始图像
     :param mask: 肿瘤分割掩码
+    :param context: 可选，同一次分析共享的特征上下文（灰度图、轮廓、排序像素等只计算一次）
     :return: 影像组学特征字典
     """
     try:
-        # 确保输入是numpy数组
-        if isinstance(image, Image.Image):
-            image = np.array(image)
-        if isinstance(mask, Image.Image):
-            mask = np.array(mask)
-        
-        # 确保掩码是二值化的
-        mask = (mask > 0).astype(np.uint8) * 255
-        
-        # 转为灰度图，确保后续处理为二维
-        if len(image.shape) == 3:
-            gray_image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        else:
-            gray_image = image
-        
-        # 提取肿瘤区域的像素值（一维向量）
-        tumor_pixels = gray_image[mask > 0]
-        tumor_pixels = np.asarray(tumor_pixels).astype(np.float32).flatten()
+        ctx = FeatureContext.ensure(context, image, mask)
         
-        if len(tumor_pixels) == 0:
+        if ctx.tumor_pixel_count == 0:
             return {
                 'first_order_features': {},
                 'shape_features': {},
                 'texture_features': {},
                 'wavelet_features': {},
+                'high_order_features': {},
                 'extraction_timestamp': datetime.utcnow().isoformat()
             }
         
-        # 灰度图已在上方计算
-        
-        # 提取一阶统计特征
-        first_order_features = extract_first_order_features(tumor_pixels)
-        
-        # 提取形状特征
-        shape_features = extract_shape_features(mask)
-        
-        # 提取纹理特征
-        texture_features = extract_texture_features(gray_image, mask)
-        
-        # 提取小波特征
-        wavelet_features = extract_wavelet_features(gray_image, mask)
+        # 工作进程只接收灰度图与二值掩码（共享内存）；串行时直接复用上下文
+        results, failures = get_feature_pool().run(
+            RADIOMICS_FAMILIES, {'image': ctx.gray, 'mask': ctx.mask}, local_kwargs={'context': ctx}
+        )
         
         # 组合所有特征
-        radiomics_features = {
-            'first_order_features': first_order_features,
-            'shape_features': shape_features,
-            'texture_features': texture_features,
-            'wavelet_features': wavelet_features,
-            'extraction_timestamp': datetime.utcnow().isoformat()
-        }
+        radiomics_features = dict(results)
+        if failures:
+            radiomics_features['failed_families'] = failures
+        radiomics_features['extraction_timestamp'] = datetime.utcnow().isoformat()
         
         return radiomics_features
         
@@ -75,9 +66,43 @@ def extract_radiomics_features(image: np.ndarray, mask: np.ndarray) -> Dict:
             'extraction_timestamp': datetime.utcnow().isoformat()
         }
 
-def extract_first_order_features(pixels: np.ndarray) -> Dict:
+# ------------------------------------------------------------
+# 特征族（模块级函数，可在特征计算池的工作进程中执行）
+# ------------------------------------------------------------
+def _first_order_family(image: np.ndarray, mask: np.ndarray, context: Optional[FeatureContext] = None) -> Dict:
+    ctx = FeatureContext.ensure(context, image, mask)
+    return extract_first_order_features(ctx.roi_pixels, context=ctx)
+
+def _shape_family(image: np.ndarray, mask: np.ndarray, context: Optional[FeatureContext] = None) -> Dict:
+    ctx = FeatureContext.ensure(context, image, mask)
+    return extract_shape_features(ctx.mask, contours=ctx.contours)
+
+def _texture_family(image: np.ndarray, mask: np.ndarray, context: Optional[FeatureContext] = None) -> Dict:
+    ctx = FeatureContext.ensure(context, image, mask)
+    return extract_texture_features(ctx.gray, ctx.mask, quantized=ctx.quantized)
+
+def _wavelet_family(image: np.ndarray, mask: np.ndarray, context: Optional[FeatureContext] = None) -> Dict:
+    ctx = FeatureContext.ensure(context, image, mask)
+    return extract_wavelet_features(ctx.gray, ctx.mask, masked_image=ctx.masked_gray)
+
+def _high_order_family(image: np.ndarray, mask: np.ndarray, context: Optional[FeatureContext] = None) -> Dict:
+    ctx = FeatureContext.ensure(context, image, mask)
+    return calculate_high_order_features(ctx.gray, ctx.mask)
+
+# 结果键 -> 特征族函数
+RADIOMICS_FAMILIES = {
+    'first_order_features': _first_order_family,
+    'shape_features': _shape_family,
+    'texture_features': _texture_family,
+    'wavelet_features': _wavelet_family,
+    'high_order_features': _high_order_family,
+}
+
+def extract_first_order_features(pixels: np.ndarray, context: Optional[FeatureContext] = None) -> Dict:
     """
     提取一阶统计特征
+
+    提供 context 时复用其排序像素与直方图计算中位数、百分位数和熵。
     """
     pixels = np.asarray(pixels).astype(np.float32).flatten()
     if pixels.size == 0:
@@ -86,7 +111,6 @@ def extract_first_order_features(pixels: np.ndarray) -> Dict:
     # 基本统计
     mean_val = float(np.mean(pixels))
     std_val = float(np.std(pixels))
-    median_val = float(np.median(pixels))
     min_val = float(np.min(pixels))
     max_val = float(np.max(pixels))
     range_val = float(max_val - min_val)
@@ -95,15 +119,19 @@ def extract_first_order_features(pixels: np.ndarray) -> Dict:
     skewness = float(skew(pixels))
     kurt = float(kurtosis(pixels))
     
-    # 百分位数
-    p10 = float(np.percentile(pixels, 10))
-    p90 = float(np.percentile(pixels, 90))
-    p25 = float(np.percentile(pixels, 25))
-    p75 = float(np.percentile(pixels, 75))
+    # 中位数与百分位数
+    if context is not None:
+        median_val, p10, p90, p25, p75 = (context.percentile(q) for q in (50, 10, 90, 25, 75))
+        hist = context.histogram
+    else:
+        median_val = float(np.median(pixels))
+        p10 = float(np.percentile(pixels, 10))
+        p90 = float(np.percentile(pixels, 90))
+        p25 = float(np.percentile(pixels, 25))
+        p75 = float(np.percentile(pixels, 75))
+        hist, _ = np.histogram(pixels, bins=256, range=(0, 256))
     
     # 能量和熵
-    # 计算直方图
-    hist, _ = np.histogram(pixels, bins=256, range=(0, 256))
     hist = hist.astype(float) / np.sum(hist)  # 归一化
     hist = hist[hist > 0]  # 移除零值
     
@@ -128,12 +156,13 @@ def extract_first_order_features(pixels: np.ndarray) -> Dict:
         'uniformity': float(np.sum(hist ** 2))  # 也称为uniformity
     }
 
-def extract_shape_features(mask: np.ndarray) -> Dict:
+def extract_shape_features(mask: np.ndarray, contours=None) -> Dict:
     """
     提取形状特征
     """
-    # 查找轮廓
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # 查找轮廓（可复用已计算的外轮廓）
+    if contours is None:
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
     if len(contours) == 0:
         return {}
@@ -197,70 +226,27 @@ def extract_shape_features(mask: np.ndarray) -> Dict:
         'bbox_ratio': float(bbox_ratio)
     }
 
-def extract_texture_features(image: np.ndarray, mask: np.ndarray) -> Dict:
+def extract_texture_features(image: np.ndarray, mask: np.ndarray, quantized: Optional[np.ndarray] = None) -> Dict:
     """
-    提取纹理特征
+    提取纹理特征（ROI只量化一次，GLCM/GLRLM/NGTDM共用）
     """
-    # 应用掩码到图像
-    masked_image = np.where(mask > 0, image, 0)
-    
-    # 计算灰度共生矩阵(GLCM)特征
-    glcm_features = calculate_glcm_features(masked_image)
-    
-    # 计算灰度游程矩阵(GRLM)特征
-    grlm_features = calculate_grlm_features(masked_image)
-    
-    # 计算邻域灰度差分矩阵(NGTDM)特征
-    ngtdm_features = calculate_ngtdm_features(masked_image)
-    
-    return {
-        'glcm_features': glcm_features,
-        'grlm_features': grlm_features,
-        'ngtdm_features': ngtdm_features
-    }
+    try:
+        return compute_texture_features(image, mask, quantized=quantized)
+    except Exception as e:
+        print(f"计算纹理特征时出错: {e}")
+        return {
+            'glcm_features': calculate_glcm_features(np.zeros((1, 1))),
+            'grlm_features': calculate_grlm_features(np.zeros((1, 1))),
+            'ngtdm_features': calculate_ngtdm_features(np.zeros((1, 1)))
+        }
 
-def calculate_glcm_features(image: np.ndarray, distances: List[int] = [1], angles: List[float] = [0, 45, 90, 135]) -> Dict:
+def calculate_glcm_features(image: np.ndarray, distances: List[int] = [1], angles: List[float] = [0, 45, 90, 135],
+                            levels: int = DEFAULT_LEVELS) -> Dict:
     """
-    计算灰度共生矩阵特征
+    计算灰度共生矩阵特征（以非零像素为ROI）
     """
-    # 简化实现，实际应用中可能需要更复杂的GLCM计算
     try:
-        # 获取非零像素
-        non_zero_pixels = image[image > 0]
-        non_zero_pixels = np.asarray(non_zero_pixels).astype(np.float32).flatten()
-        if non_zero_pixels.size == 0:
-            return {
-                'contrast': 0,
-                'correlation': 0,
-                'energy': 0,
-                'homogeneity': 0
-            }
-        
-        # 计算简化版本的GLCM特征
-        # 创建简化GLCM矩阵（使用直方图近似）
-        hist, _ = np.histogram(non_zero_pixels, bins=16, range=(0, 256))
-        hist = hist.astype(float) / np.sum(hist)  # 归一化
-        
-        # 计算能量（Energy）
-        energy = float(np.sum(hist ** 2))
-        
-        # 计算同质性（Homogeneity）
-        homogeneity = float(np.sum(hist / (1 + np.arange(len(hist)))))
-        
-        # 计算对比度（Contrast）- 简化版本
-        contrast = float(np.var(non_zero_pixels))
-        
-        # 计算相关性（Correlation）- 简化版本
-        mean_val = float(np.mean(non_zero_pixels))
-        std_val = float(np.std(non_zero_pixels))
-        correlation = float(1) if std_val == 0 else float(np.mean((non_zero_pixels - mean_val) ** 2) / std_val)
-        
-        return {
-            'contrast': contrast,
-            'correlation': correlation,
-            'energy': energy,
-            'homogeneity': homogeneity
-        }
+        return glcm_features(quantize_roi(image, levels=levels), levels, distances, angles)
     except Exception as e:
         print(f"计算GLCM特征时出错: {e}")
         return {
@@ -270,55 +256,12 @@ def calculate_glcm_features(image: np.ndarray, distances: List[int] = [1], angle
             'homogeneity': 0
         }
 
-def calculate_grlm_features(image: np.ndarray) -> Dict:
+def calculate_grlm_features(image: np.ndarray, levels: int = DEFAULT_LEVELS) -> Dict:
     """
-    计算灰度游程矩阵特征
+    计算灰度游程矩阵特征（以非零像素为ROI）
     """
     try:
-        # 简化实现
-        # 获取非零像素
-        non_zero_pixels = image[image > 0]
-        non_zero_pixels = np.asarray(non_zero_pixels).astype(np.float32).flatten()
-        if non_zero_pixels.size == 0:
-            return {
-                'short_run_emphasis': 0,
-                'long_run_emphasis': 0,
-                'gray_level_nonuniformity': 0,
-                'run_length_nonuniformity': 0
-            }
-        
-        # 计算简化版本的GRLM特征
-        # 将图像量化到较少的灰度级以简化计算
-        qmin = float(np.min(non_zero_pixels))
-        qmax = float(np.max(non_zero_pixels))
-        denom = (qmax - qmin) + 1e-10
-        quantized = np.floor((non_zero_pixels - qmin) / denom * 15).astype(int)
-        
-        # 计算游程长度特征
-        unique_vals, counts = np.unique(quantized, return_counts=True)
-        
-        if len(counts) == 0:
-            return {
-                'short_run_emphasis': 0,
-                'long_run_emphasis': 0,
-                'gray_level_nonuniformity': 0,
-                'run_length_nonuniformity': 0
-            }
-        
-        # 简化的游程特征
-        total_runs = np.sum(counts)
-        if total_runs == 0:
-            total_runs = 1
-        
-        short_run_emphasis = float(np.sum(counts * (1 / (np.arange(len(counts)) + 1)**2))) / total_runs
-        long_run_emphasis = float(np.sum(counts * (np.arange(len(counts)) + 1)**2)) / total_runs
-        
-        return {
-            'short_run_emphasis': short_run_emphasis,
-            'long_run_emphasis': long_run_emphasis,
-            'gray_level_nonuniformity': float(np.sum(counts**2)) / total_runs,
-            'run_length_nonuniformity': 0  # 简化
-        }
+        return glrlm_features(quantize_roi(image, levels=levels), levels)
     except Exception as e:
         print(f"计算GRLM特征时出错: {e}")
         return {
@@ -328,35 +271,12 @@ def calculate_grlm_features(image: np.ndarray) -> Dict:
             'run_length_nonuniformity': 0
         }
 
-def calculate_ngtdm_features(image: np.ndarray) -> Dict:
+def calculate_ngtdm_features(image: np.ndarray, levels: int = DEFAULT_LEVELS) -> Dict:
     """
-    计算邻域灰度差分矩阵特征
+    计算邻域灰度差分矩阵特征（以非零像素为ROI）
     """
     try:
-        # 简化实现
-        non_zero_pixels = image[image > 0]
-        non_zero_pixels = np.asarray(non_zero_pixels).astype(np.float32).flatten()
-        if non_zero_pixels.size == 0:
-            return {
-                'coarseness': 0,
-                'contrast': 0,
-                'busyness': 0,
-                'complexity': 0,
-                'strength': 0
-            }
-        
-        # 计算简化版本的NGTDM特征
-        # 使用局部邻域差异来计算
-        coarseness = float(np.mean(np.abs(np.diff(non_zero_pixels))))
-        contrast = float(np.std(non_zero_pixels))
-        
-        return {
-            'coarseness': coarseness,
-            'contrast': contrast,
-            'busyness': 0,  # 简化
-            'complexity': 0,  # 简化
-            'strength': 0  # 简化
-        }
+        return ngtdm_features(quantize_roi(image, levels=levels), levels)
     except Exception as e:
         print(f"计算NGTDM特征时出错: {e}")
         return {
@@ -367,13 +287,15 @@ def calculate_ngtdm_features(image: np.ndarray) -> Dict:
             'strength': 0
         }
 
-def extract_wavelet_features(image: np.ndarray, mask: np.ndarray) -> Dict:
+def extract_wavelet_features(image: np.ndarray, mask: np.ndarray, masked_image: Optional[np.ndarray] = None) -> Dict:
     """
     提取小波特征
     """
     try:
         # 应用掩码到图像
-        masked_image = np.where(mask > 0, image, 0).astype(np.float32)
+        if masked_image is None:
+            masked_image = np.where(mask > 0, image, 0)
+        masked_image = masked_image.astype(np.float32)
         
         # 执行小波变换
         coeffs = pywt.dwt2(masked_image, 'db4')
@@ -446,7 +368,7 @@ def calculate_high_order_features(image: np.ndarray, mask: np.ndarray) -> Dict:
         masked_image = np.where(mask > 0, image, 0)
         
         # 计算局部二值模式（LBP）特征
-        lbp_features = calculate_lbp_features(masked_image)
+        lbp_features = calculate_lbp_features(masked_image, mask=mask)
         
         # 计算局部图像特征（Local Image Features）
         lif_features = calculate_local_image_features(masked_image)
@@ -462,44 +384,111 @@ def calculate_high_order_features(image: np.ndarray, mask: np.ndarray) -> Dict:
             'local_image_features': {}
         }
 
-def calculate_lbp_features(image: np.ndarray, radius: int = 3, n_points: int = 24) -> Dict:
+@lru_cache(maxsize=None)
+def uniform_pattern_lut(n_points: int = 8) -> np.ndarray:
+    """
+    均匀模式查找表：lut[code] 为 code 的循环 0/1 跳变次数是否 <= 2
+
+    n_points=8 时为256项，由所有码值一次性按位旋转比较生成。
+    """
+    codes = np.arange(1 << n_points, dtype=np.int64)
+    rotated = (codes >> 1) | ((codes & 1) << (n_points - 1))
+    changed = codes ^ rotated
+    transitions = np.zeros_like(codes)
+    for bit in range(n_points):
+        transitions += (changed >> bit) & 1
+    return transitions <= 2
+
+
+def compute_lbp(image: np.ndarray, radius: float = 1, n_points: int = 8,
+                mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    计算圆形邻域LBP码（数组平移比较，非逐像素循环）
+
+    邻域点位于半径 radius 的圆上，非整数位置用双线性插值；
+    只在掩码包围盒内计算，图像边缘按边界值延拓。
+
+    Returns:
+        (codes, uniform, valid): 包围盒内的LBP码、是否均匀模式、是否属于掩码
+    """
+    image = np.asarray(image, dtype=np.float64)
+    y0, y1, x0, x1 = mask_bounding_box(mask, image.shape)
+    pad = int(np.ceil(radius)) + 1
+    padded = np.pad(image, pad, mode='edge')
+    h, w = y1 - y0, x1 - x0
+    center = image[y0:y1, x0:x1]
+
+    def shifted(dy, dx):
+        top, left = y0 + pad + dy, x0 + pad + dx
+        return padded[top:top + h, left:left + w]
+
+    codes = np.zeros((h, w), dtype=np.int64)
+    transitions = np.zeros((h, w), dtype=np.int64) if n_points > 16 else None
+    first_bit = previous_bit = None
+    for p in range(n_points):
+        theta = 2 * np.pi * p / n_points
+        dy = round(-radius * np.sin(theta), 6)
+        dx = round(radius * np.cos(theta), 6)
+        fy, fx = int(np.floor(dy)), int(np.floor(dx))
+        wy, wx = dy - fy, dx - fx
+        if wy == 0 and wx == 0:
+            sample = shifted(fy, fx)
+        else:
+            sample = ((1 - wy) * (1 - wx) * shifted(fy, fx) + (1 - wy) * wx * shifted(fy, fx + 1)
+                      + wy * (1 - wx) * shifted(fy + 1, fx) + wy * wx * shifted(fy + 1, fx + 1))
+        bit = sample >= center
+        codes |= bit.astype(np.int64) << p
+        if transitions is not None:
+            if previous_bit is None:
+                first_bit = bit
+            else:
+                transitions += bit != previous_bit
+            previous_bit = bit
+
+    if transitions is None:
+        uniform = uniform_pattern_lut(n_points)[codes]
+    else:
+        uniform = (transitions + (previous_bit != first_bit)) <= 2
+
+    valid = mask[y0:y1, x0:x1] > 0 if mask is not None else np.ones((h, w), dtype=bool)
+    return codes, uniform, valid
+
+
+def calculate_lbp_features(image: np.ndarray, radius: float = 1, n_points: int = 8,
+                           mask: Optional[np.ndarray] = None) -> Dict:
     """
     计算局部二值模式特征
+
+    Args:
+        image: 灰度图像
+        radius: 邻域半径
+        n_points: 邻域采样点数
+        mask: 可选掩码，只统计掩码内像素（计算范围限定在掩码包围盒）
     """
     try:
-        # 简化LBP实现
-        height, width = image.shape
-        lbp_image = np.zeros_like(image, dtype=np.uint8)
-        
-        # 使用简化的LBP算法
-        for i in range(1, height-1):
-            for j in range(1, width-1):
-                center = image[i, j]
-                code = 0
-                power = 1
-                
-                # 检查3x3邻域
-                for ni in [-1, -1, -1, 0, 1, 1, 1, 0]:
-                    for nj in [-1, 0, 1, 1, 1, 0, -1, -1]:
-                        neighbor = image[i+ni, j+nj]
-                        if neighbor >= center:
-                            code += power
-                        power *= 2
-                
-                lbp_image[i, j] = code % 256
-        
-        # 计算LBP直方图
-        hist, _ = np.histogram(lbp_image, bins=256, range=(0, 256))
-        
-        # 计算LBP特征
-        uniform_patterns = count_uniform_patterns(lbp_image)
-        uniform_ratio = uniform_patterns / (height * width) if height * width > 0 else 0
-        
+        codes, uniform, valid = compute_lbp(image, radius=radius, n_points=n_points, mask=mask)
+        codes, uniform = codes[valid], uniform[valid]
+        total = codes.size
+
+        # 旋转不变均匀模式(riu2)：均匀模式取1的个数，非均匀模式归为 n_points+1
+        ones = np.zeros_like(codes)
+        for bit in range(n_points):
+            ones += (codes >> bit) & 1
+        riu2 = np.where(uniform, ones, n_points + 1)
+        riu2_hist = np.bincount(riu2, minlength=n_points + 2)
+
+        # 直方图熵：n_points<=8 时按原始LBP码，否则按riu2码
+        hist = np.bincount(codes, minlength=1 << n_points) if n_points <= 8 else riu2_hist
+        prob = hist[hist > 0] / total if total else np.zeros(0)
+        uniform_patterns = int(np.count_nonzero(uniform))
+
         return {
-            'uniform_patterns': int(uniform_patterns),
-            'uniformity_ratio': float(uniform_ratio),
-            'histogram_entropy': float(-np.sum((hist[hist > 0] / np.sum(hist)) * 
-                                            np.log2(hist[hist > 0] / np.sum(hist) + 1e-10)))
+            'uniform_patterns': uniform_patterns,
+            'uniformity_ratio': float(uniform_patterns / total) if total else 0.0,
+            'histogram_entropy': float(-np.sum(prob * np.log2(prob + 1e-10))),
+            'riu2_histogram': (riu2_hist / total).tolist() if total else [],
+            'radius': radius,
+            'n_points': n_points
         }
     except Exception as e:
         print(f"计算LBP特征时出错: {e}")
@@ -509,54 +498,18 @@ def calculate_lbp_features(image: np.ndarray, radius: int = 3, n_points: int = 2
             'histogram_entropy': 0
         }
 
-def count_uniform_patterns(lbp_image: np.ndarray) -> int:
+def count_uniform_patterns(lbp_image: np.ndarray, n_points: int = 8) -> int:
     """
-    计算LBP中的均匀模式数量
+    计算LBP中的均匀模式数量（最多两个0-1或1-0转换），查表实现
     """
-    count = 0
-    height, width = lbp_image.shape
-    
-    for i in range(height):
-        for j in range(width):
-            # 检查是否为均匀模式（最多两个0-1或1-0转换）
-            binary_str = format(lbp_image[i, j], '08b')
-            transitions = 0
-            for k in range(len(binary_str)):
-                if binary_str[k] != binary_str[(k + 1) % len(binary_str)]:
-                    transitions += 1
-            
-            if transitions <= 2:
-                count += 1
-    
-    return count
+    return int(np.count_nonzero(uniform_pattern_lut(n_points)[np.asarray(lbp_image, dtype=np.int64)]))
 
-def calculate_local_image_features(image: np.ndarray) -> Dict:
+def calculate_local_image_features(image: np.ndarray, window_size: int = 5) -> Dict:
     """
-    计算局部图像特征
+    计算局部图像特征（滑动窗口局部均值与标准差的汇总，盒式滤波一次完成）
     """
     try:
-        # 计算局部统计特征
-        # 使用滑动窗口计算局部均值和标准差
-        window_size = 5
-        height, width = image.shape
-        
-        local_means = []
-        local_stds = []
-        
-        for i in range(window_size//2, height - window_size//2):
-            for j in range(window_size//2, width - window_size//2):
-                patch = image[i - window_size//2:i + window_size//2 + 1,
-                             j - window_size//2:j + window_size//2 + 1]
-                
-                local_means.append(np.mean(patch))
-                local_stds.append(np.std(patch))
-        
-        return {
-            'local_mean_mean': float(np.mean(local_means)) if local_means else 0,
-            'local_mean_std': float(np.std(local_means)) if local_means else 0,
-            'local_std_mean': float(np.mean(local_stds)) if local_stds else 0,
-            'local_std_std': float(np.std(local_stds)) if local_stds else 0
-        }
+        return summarize_local_statistics(image, window_size=window_size, valid_only=True)
     except Exception as e:
         print(f"计算局部图像特征时出错: {e}")
         return {
@@ -0,0 +1,230 @@
+"""
+分析结果缓存 - 按内容寻址的磁盘缓存
+以 (影像文件内容哈希, 权重文件哈希, 模型类型, 推理参数) 为键保存掩码、指标与特征，
+同一未修改文件以相同权重和阈值重复分析时直接返回，跳过推理与特征提取。
+缓存目录总大小超过上限时按最近访问时间（LRU）淘汰。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+# 缓存内容格式版本；计算逻辑或存储格式变化时递增，使旧条目自然失效
+CACHE_FORMAT_VERSION = 1
+
+# 默认缓存上限（MB）
+DEFAULT_MAX_MB = 512
+
+_META_KEY = '__meta__'
+
+
+@lru_cache(maxsize=1024)
+def _digest(path: str, size: int, mtime_ns: int) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def file_digest(path: Optional[str]) -> Optional[str]:
+    """
+    文件内容的sha256（按路径、大小、修改时间记忆，未修改的文件不重复读取）
+
+    路径不存在时（如由ultralytics按名称下载的模型）返回名称本身。
+    """
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return f'name:{path}'
+    return _digest(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+class ResultCache:
+    """磁盘结果缓存（每个条目一个 .npz 文件：numpy数组 + JSON元数据）"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Args:
+            directory: 缓存目录
+            max_bytes: 缓存总大小上限（字节），<=0 时禁用缓存
+        """
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(kind: str, **parts) -> str:
+        """由结果类型和各组成部分生成缓存键"""
+        payload = json.dumps({'version': CACHE_FORMAT_VERSION, 'kind': kind, **parts},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def key_for(self, kind: str, file_path: str, weight_path: Optional[str], **params) -> Optional[str]:
+        """
+        生成 (文件内容哈希, 权重哈希, 结果类型, 参数) 的缓存键
+
+        Returns:
+            缓存键；缓存禁用或文件不可读时为None
+        """
+        if not self.enabled:
+            return None
+        try:
+            return self.make_key(kind, file=file_digest(file_path), weights=file_digest(weight_path), **params)
+        except OSError as e:
+            print(f"结果缓存键生成失败: {e}")
+            return None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key: Optional[str]) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+        """
+        读取缓存条目
+
+        Returns:
+            (arrays, meta)；未命中时为None
+        """
+        if key is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files if name != _META_KEY}
+                meta = json.loads(str(data[_META_KEY]))
+            # 更新访问时间，作为LRU淘汰依据
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            print(f"结果缓存条目损坏，已删除: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arrays, meta
+
+    def put(self, key: Optional[str], arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> bool:
+        """写入缓存条目（先写临时文件再原子替换），并按上限淘汰旧条目"""
+        if key is None:
+            return False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, **arrays, **{_META_KEY: np.array(json.dumps(meta, default=_json_default))})
+            if os.path.getsize(tmp_path) > self.max_bytes:
+                self._remove(tmp_path)
+                return False
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入结果缓存失败: {e}")
+            if 'tmp_path' in locals():
+                self._remove(tmp_path)
+            return False
+
+        with self._lock:
+            self._evict_locked()
+        return True
+
+    def _evict_locked(self):
+        """总大小超过上限时删除最久未访问的条目"""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.npz'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        entries, total = 0, 0
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.npz'):
+                        entries += 1
+                        total += entry.stat().st_size
+        return {
+            'enabled': self.enabled,
+            'entries': entries,
+            'size_mb': round(total / (1024 * 1024), 2),
+            'max_mb': round(self.max_bytes / (1024 * 1024), 2),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def configure_result_cache(directory: Optional[str] = None, max_mb: Optional[float] = None) -> ResultCache:
+    """
+    配置（或重新配置）进程级结果缓存
+
+    Args:
+        directory: 缓存目录，None时读取环境变量 RESULT_CACHE_DIR（默认 ./cache/results）
+        max_mb: 缓存上限（MB），None时读取环境变量 RESULT_CACHE_MAX_MB；0 表示禁用
+    """
+    global _result_cache
+    if directory is None:
+        directory = os.getenv('RESULT_CACHE_DIR', os.path.join('cache', 'results'))
+    if max_mb is None:
+        max_mb = float(os.getenv('RESULT_CACHE_MAX_MB', DEFAULT_MAX_MB))
+    with _result_cache_lock:
+        _result_cache = ResultCache(directory, int(max_mb * 1024 * 1024))
+    return _result_cache
+
+
+def get_result_cache() -> ResultCache:
+    """获取进程级结果缓存（单例）"""
+    if _result_cache is None:
+        return configure_result_cache()
+    return _result_cache
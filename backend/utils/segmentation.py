@@ -2,10 +2,18 @@ import numpy as np
 import cv2
 from PIL import Image
 import torch
-from ultralytics import YOLO
 import os
 from datetime import datetime
 
+from utils.inference_telemetry import get_inference_telemetry
+from utils.model_registry import get_model_registry, inference_lock
+
+
+def _load_yolo(weight_path):
+    """通过进程级模型注册表获取YOLO模型（命中缓存时不重复加载权重）"""
+    return get_model_registry().get(weight_path, 'yolo')
+
+
 class TumorSegmentation:
     def __init__(self, weight_path: str | None = None):
         """
@@ -13,6 +21,8 @@ class TumorSegmentation:
         Args:
             weight_path: 权重文件路径（可以是相对路径如 'weights/Yolov11_best.pt' 或绝对路径）
         """
+        # 实际加载的权重文件（结果缓存键的一部分），未加载模型时为None
+        self.weight_file = None
         # 尝试加载预训练模型
         try:
             project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -34,19 +44,19 @@ class TumorSegmentation:
                 if resolved_path:
                     try:
                         print(f"加载权重文件: {resolved_path}")
-                        self.model = YOLO(resolved_path)
+                        self.model = self._load(resolved_path)
                         # 验证是否为分割模型
                         if self.model.task != 'segment':
                             print(f"警告: {resolved_path} 不是分割模型（任务类型: {self.model.task}）")
                             print("尝试加载默认分割模型...")
-                            self.model = YOLO('yolov8n-seg.pt')
+                            self.model = self._load('yolov8n-seg.pt')
                         else:
                             print(f"成功加载分割模型: {resolved_path}")
                     except Exception as e:
                         print(f"加载权重失败: {e}")
                         print("使用默认分割模型...")
                         try:
-                            self.model = YOLO('yolov8n-seg.pt')
+                            self.model = self._load('yolov8n-seg.pt')
                         except Exception:
                             self.model = None
                 else:
@@ -61,12 +71,12 @@ class TumorSegmentation:
                 if os.path.exists(yolo11_path):
                     try:
                         print(f"加载默认权重: {yolo11_path}")
-                        self.model = YOLO(yolo11_path)
+                        self.model = self._load(yolo11_path)
                         print(f"成功加载默认分割模型")
                     except Exception as e:
                         print(f"加载默认权重失败: {e}")
                         try:
-                            self.model = YOLO('yolov8n-seg.pt')
+                            self.model = self._load('yolov8n-seg.pt')
                         except Exception:
                             self.model = None
                 else:
@@ -74,10 +84,10 @@ class TumorSegmentation:
                     model_path = os.path.join(os.path.dirname(__file__), 'models', 'tumor_segmentation.pt')
                     if os.path.exists(model_path):
                         try:
-                            self.model = YOLO(model_path)
+                            self.model = self._load(model_path)
                         except Exception:
                             try:
-                                self.model = YOLO('yolov8n-seg.pt')
+                                self.model = self._load('yolov8n-seg.pt')
                             except Exception:
                                 self.model = None
                     else:
@@ -85,22 +95,30 @@ class TumorSegmentation:
                         backend_default = os.path.join(project_root, 'backend', 'yolov8n.pt')
                         if os.path.exists(backend_default):
                             try:
-                                self.model = YOLO(backend_default)
+                                self.model = self._load(backend_default)
                             except Exception:
                                 try:
-                                    self.model = YOLO('yolov8n-seg.pt')
+                                    self.model = self._load('yolov8n-seg.pt')
                                 except Exception:
                                     self.model = None
                         else:
                             # 使用Ultralytics提供的默认预训练分割模型
                             try:
-                                self.model = YOLO('yolov8n-seg.pt')
+                                self.model = self._load('yolov8n-seg.pt')
                             except Exception:
                                 print("无法加载任何YOLO分割模型，将使用传统分割算法")
                                 self.model = None
         except Exception as e:
             print(f"模型加载失败，使用基础分割算法: {e}")
             self.model = None
+        if self.model is None:
+            self.weight_file = None
+    
+    def _load(self, weight_path):
+        """加载YOLO模型并记录权重文件"""
+        model = _load_yolo(weight_path)
+        self.weight_file = weight_path
+        return model
     
     def segment_and_analyze(self, image, conf: float = 0.25, imgsz: int = 256):
         """
@@ -136,14 +154,16 @@ class TumorSegmentation:
                 print(f"YOLO推理: imgsz={imgsz}, conf={conf}")
                 
                 # ⭐ 参考 YOLO11TumorPredictor.predict() 的实现
-                results = self.model.predict(
-                    source=image,
-                    imgsz=imgsz,
-                    conf=conf,
-                    iou=0.7,  # NMS的IoU阈值
-                    save=False,
-                    verbose=False
-                )
+                with inference_lock(self.model):
+                    results = self.model.predict(
+                        source=image,
+                        imgsz=imgsz,
+                        conf=conf,
+                        iou=0.7,  # NMS的IoU阈值
+                        save=False,
+                        verbose=False
+                    )
+                get_inference_telemetry().record_ultralytics('yolo', self.weight_file or self.model, results)
                 
                 result = results[0]
                 
@@ -390,3 +410,134 @@ def visualize_segmentation_result(original_image, segmentation_result):
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
     
     return overlay
+
+
+class YOLOInferenceResult:
+    """
+    单次YOLO前向推理的结果封装（参考 YOLO11TumorPredictor 的 predict / get_combined_mask / analyze_prediction）
+
+    一次推理同时提供合并掩码、检测框、置信度与分析指标，避免对同一文件重复推理。
+    """
+
+    def __init__(self, masks, boxes, confidences, image_shape):
+        """
+        Args:
+            masks: 推理分辨率下的实例掩码 (N, h, w) float数组，无检测时为None
+            boxes: 原图坐标系下的检测框 (N, 4) xyxy
+            confidences: 置信度 (N,)
+            image_shape: 原图尺寸 (H, W[, C])
+        """
+        self.masks = masks
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.confidences = np.asarray(confidences, dtype=np.float32).reshape(-1)
+        self.image_shape = tuple(image_shape[:2])
+        self._combined_mask = None
+
+    @classmethod
+    def from_ultralytics(cls, result, image_shape):
+        """从 ultralytics 的 Results 对象构建"""
+        if result.masks is None or len(result.masks) == 0:
+            return cls(None, np.zeros((0, 4)), np.zeros(0), image_shape)
+        return cls(
+            result.masks.data.cpu().numpy(),
+            result.boxes.xyxy.cpu().numpy(),
+            result.boxes.conf.cpu().numpy(),
+            image_shape
+        )
+
+    @property
+    def num_instances(self):
+        return 0 if self.masks is None else len(self.masks)
+
+    @property
+    def has_tumor(self):
+        return self.num_instances > 0
+
+    @property
+    def combined_mask(self):
+        """所有实例合并后的二值掩码（原图尺寸，uint8，0或255）"""
+        if self._combined_mask is None:
+            h, w = self.image_shape
+            if self.masks is None:
+                self._combined_mask = np.zeros((h, w), dtype=np.uint8)
+            else:
+                # 先在推理分辨率下合并再整体缩放，最近邻插值下与逐实例缩放后合并等价
+                union = np.any(self.masks > 0.5, axis=0).astype(np.uint8) * 255
+                if union.shape != (h, w):
+                    union = cv2.resize(union, (w, h), interpolation=cv2.INTER_NEAREST)
+                self._combined_mask = union
+        return self._combined_mask
+
+    def analysis(self):
+        """分析指标（与 analyze_prediction 的返回格式一致）"""
+        h, w = self.image_shape
+        total_pixels = h * w
+        tumor_pixels = int(np.count_nonzero(self.combined_mask)) if self.has_tumor else 0
+        return {
+            'has_tumor': self.has_tumor,
+            'num_instances': self.num_instances,
+            'tumor_pixels': tumor_pixels,
+            'total_pixels': int(total_pixels),
+            'tumor_ratio': float(tumor_pixels / total_pixels * 100) if total_pixels > 0 else 0.0,
+            'avg_confidence': float(self.confidences.mean()) if self.confidences.size else 0.0
+        }
+
+
+def run_yolo_inference(model, image, imgsz: int = 256, conf: float = 0.25, iou: float = 0.7):
+    """
+    对单张图像执行一次YOLO推理
+
+    Args:
+        model: ultralytics YOLO 模型
+        image: BGR numpy数组（cv2.imread 的结果）
+        imgsz: 推理尺寸
+        conf: 置信度阈值
+        iou: NMS的IoU阈值
+
+    Returns:
+        YOLOInferenceResult
+    """
+    with inference_lock(model):
+        results = model.predict(
+            source=image,
+            imgsz=imgsz,
+            conf=conf,
+            iou=iou,
+            save=False,
+            verbose=False
+        )
+    get_inference_telemetry().record_ultralytics('yolo', model, results)
+    return YOLOInferenceResult.from_ultralytics(results[0], image.shape)
+
+
+def run_yolo_inference_batch(model, images, imgsz: int = 256, conf: float = 0.25, iou: float = 0.7):
+    """
+    对一组图像执行一次批量YOLO推理（一个mini-batch一次前向）
+
+    Args:
+        model: ultralytics YOLO 模型
+        images: BGR numpy数组列表
+        imgsz: 推理尺寸
+        conf: 置信度阈值
+        iou: NMS的IoU阈值
+
+    Returns:
+        List[YOLOInferenceResult]，与 images 顺序一致
+    """
+    if not images:
+        return []
+    with inference_lock(model):
+        results = model.predict(
+            source=list(images),
+            imgsz=imgsz,
+            conf=conf,
+            iou=iou,
+            batch=len(images),
+            save=False,
+            verbose=False
+        )
+    get_inference_telemetry().record_ultralytics('yolo', model, results, kind='batch')
+    return [
+        YOLOInferenceResult.from_ultralytics(result, image.shape)
+        for result, image in zip(results, images)
+    ]
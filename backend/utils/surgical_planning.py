@@ -5,6 +5,8 @@ import json
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
 
+from utils.feature_context import FeatureContext
+
 class SurgicalPlanning:
     def __init__(self):
         """
@@ -12,12 +14,14 @@ class SurgicalPlanning:
         """
         pass
 
-def generate_surgical_plan(quantitative_report: Dict, patient_data: Dict, mask: np.ndarray) -> Dict:
+def generate_surgical_plan(quantitative_report: Dict, patient_data: Dict, mask: np.ndarray,
+                           context: Optional[FeatureContext] = None) -> Dict:
     """
     生成手术计划
     :param quantitative_report: 定量分析报告
     :param patient_data: 患者数据
     :param mask: 肿瘤分割掩码
+    :param context: 可选，同一次分析共享的 FeatureContext（复用其轮廓）
     :return: 手术计划
     """
     try:
@@ -68,7 +72,7 @@ def generate_surgical_plan(quantitative_report: Dict, patient_data: Dict, mask:
                 basic_metrics, morph_metrics, patient_data
             ),
             'intraoperative_guidance': generate_intraoperative_guidance(
-                basic_metrics, morph_metrics, mask
+                basic_metrics, morph_metrics, mask, context=context
             ),
             'postoperative_monitoring': generate_postoperative_monitoring(
                 basic_metrics, morph_metrics
@@ -306,16 +310,17 @@ def generate_preoperative_considerations(basic_metrics: Dict, morph_metrics: Dic
     
     return considerations
 
-def generate_intraoperative_guidance(basic_metrics: Dict, morph_metrics: Dict, mask: np.ndarray) -> Dict:
+def generate_intraoperative_guidance(basic_metrics: Dict, morph_metrics: Dict, mask: np.ndarray,
+                                     context: Optional[FeatureContext] = None) -> Dict:
     """
     生成术中指导
     """
-    # 分析掩码以获取边界信息
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # 分析掩码以获取边界信息（轮廓由上下文缓存）
+    ctx = FeatureContext.ensure(context, mask, mask)
     
     boundary_info = {}
-    if contours:
-        largest_contour = max(contours, key=cv2.contourArea)
+    if ctx.largest_contour is not None:
+        largest_contour = ctx.largest_contour
         
         # 获取边界框
         x, y, w, h = cv2.boundingRect(largest_contour)
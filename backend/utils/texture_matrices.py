@@ -0,0 +1,307 @@
+"""
+纹理矩阵引擎
+对ROI只做一次灰度量化，按所有方向用 bincount 累加构建
+灰度共生矩阵(GLCM)、灰度游程矩阵(GLRLM)与邻域灰度差分矩阵(NGTDM)，
+并由矩阵计算标准纹理特征（定义与 IBSI / pyradiomics 一致，方向间取平均）。
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+DEFAULT_LEVELS = 32
+DEFAULT_ANGLES = (0, 45, 90, 135)
+
+
+def mask_bounding_box(mask: Optional[np.ndarray], shape: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """掩码非零区域的包围盒 (y0, y1, x0, x1)，无掩码或掩码为空时返回整幅图像"""
+    if mask is not None:
+        rows = np.flatnonzero(np.any(mask > 0, axis=1))
+        cols = np.flatnonzero(np.any(mask > 0, axis=0))
+        if rows.size and cols.size:
+            return int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+    return 0, shape[0], 0, shape[1]
+
+
+def quantize_roi(image: np.ndarray, mask: Optional[np.ndarray] = None,
+                 levels: int = DEFAULT_LEVELS) -> np.ndarray:
+    """
+    将ROI量化为 levels 个灰度级（固定灰度级数，按ROI内最小/最大值线性划分）
+
+    Args:
+        image: 2D灰度图像
+        mask: ROI掩码，None 时以非零像素为ROI
+        levels: 灰度级数
+
+    Returns:
+        q: 裁剪到ROI包围盒的int32数组，ROI内取值 0..levels-1，ROI外为 -1
+    """
+    image = np.asarray(image)
+    if mask is None:
+        mask = image > 0
+    y0, y1, x0, x1 = mask_bounding_box(mask, image.shape)
+    roi = np.asarray(image[y0:y1, x0:x1], dtype=np.float64)
+    valid = np.asarray(mask[y0:y1, x0:x1]) > 0
+
+    q = np.full(roi.shape, -1, dtype=np.int32)
+    if not np.any(valid):
+        return q
+    values = roi[valid]
+    vmin, vmax = float(values.min()), float(values.max())
+    if vmax > vmin:
+        q[valid] = np.clip(np.floor((values - vmin) / (vmax - vmin) * levels), 0, levels - 1).astype(np.int32)
+    else:
+        q[valid] = 0
+    return q
+
+
+def _angle_offset(distance: int, angle: float) -> Tuple[int, int]:
+    """角度（度）与距离对应的 (dy, dx)，图像坐标y向下"""
+    theta = np.deg2rad(angle)
+    return int(-round(distance * np.sin(theta))), int(round(distance * np.cos(theta)))
+
+
+def _pair_views(q: np.ndarray, dy: int, dx: int) -> Tuple[np.ndarray, np.ndarray]:
+    """q 中相距 (dy, dx) 的所有像素对（两个同形状视图）"""
+    h, w = q.shape
+    ys, yn = (slice(0, h - dy), slice(dy, h)) if dy >= 0 else (slice(-dy, h), slice(0, h + dy))
+    xs, xn = (slice(0, w - dx), slice(dx, w)) if dx >= 0 else (slice(-dx, w), slice(0, w + dx))
+    return q[ys, xs], q[yn, xn]
+
+
+# ------------------------------------------------------------
+# GLCM
+# ------------------------------------------------------------
+def glcm_matrices(q: np.ndarray, levels: int = DEFAULT_LEVELS, distances: Sequence[int] = (1,),
+                  angles: Sequence[float] = DEFAULT_ANGLES) -> np.ndarray:
+    """
+    对称灰度共生矩阵
+
+    Returns:
+        (n_offsets, levels, levels) 计数矩阵
+    """
+    matrices = []
+    for distance in distances:
+        for angle in angles:
+            a, b = _pair_views(q, *_angle_offset(distance, angle))
+            pair = (a >= 0) & (b >= 0)
+            counts = np.bincount(a[pair] * levels + b[pair], minlength=levels * levels)
+            matrix = counts.reshape(levels, levels).astype(np.float64)
+            matrices.append(matrix + matrix.T)
+    return np.stack(matrices)
+
+
+def glcm_features(q: np.ndarray, levels: int = DEFAULT_LEVELS, distances: Sequence[int] = (1,),
+                  angles: Sequence[float] = DEFAULT_ANGLES) -> Dict[str, float]:
+    """由GLCM计算纹理特征（各方向/距离取平均）"""
+    return glcm_features_from_matrices(glcm_matrices(q, levels, distances, angles), levels)
+
+
+def glcm_features_from_matrices(matrices: np.ndarray, levels: int = DEFAULT_LEVELS) -> Dict[str, float]:
+    """由一组GLCM计数矩阵 (n, levels, levels) 计算特征并取平均（2D/3D共用）"""
+    i, j = np.meshgrid(np.arange(1, levels + 1), np.arange(1, levels + 1), indexing='ij')
+    results = []
+    for matrix in matrices:
+        total = matrix.sum()
+        if total == 0:
+            continue
+        p = matrix / total
+        px = p.sum(axis=1)
+        mu = float(np.sum(np.arange(1, levels + 1) * px))
+        sigma = float(np.sqrt(np.sum((np.arange(1, levels + 1) - mu) ** 2 * px)))
+        diff = np.abs(i - j)
+        nz = p[p > 0]
+        results.append({
+            'contrast': float(np.sum(p * diff ** 2)),
+            'dissimilarity': float(np.sum(p * diff)),
+            'homogeneity': float(np.sum(p / (1 + diff ** 2))),
+            'energy': float(np.sum(p ** 2)),
+            'entropy': float(-np.sum(nz * np.log2(nz))),
+            'correlation': float(np.sum(p * (i - mu) * (j - mu)) / (sigma * sigma)) if sigma > 0 else 1.0,
+            'cluster_shade': float(np.sum(p * (i + j - 2 * mu) ** 3)),
+            'cluster_prominence': float(np.sum(p * (i + j - 2 * mu) ** 4))
+        })
+    return _average_features(results, ('contrast', 'dissimilarity', 'homogeneity', 'energy', 'entropy',
+                                       'correlation', 'cluster_shade', 'cluster_prominence'))
+
+
+# ------------------------------------------------------------
+# GLRLM
+# ------------------------------------------------------------
+def _direction_lines(q: np.ndarray, angle: float) -> np.ndarray:
+    """
+    把某一方向上的所有直线首尾相接展平为一维数组，直线之间以 -1 分隔
+
+    对角方向通过逐行错位把对角线变成列。
+    """
+    h, w = q.shape
+    if angle == 0:
+        return np.pad(q, ((0, 0), (0, 1)), constant_values=-1).ravel()
+    if angle == 90:
+        return np.pad(q, ((0, 1), (0, 0)), constant_values=-1).ravel(order='F')
+
+    skewed = np.full((h + 1, w + h), -1, dtype=q.dtype)
+    rows = np.arange(h)[:, None]
+    cols = np.arange(w)[None, :]
+    # 45°（右上方向）：i+j 相同的像素位于同一列；135°：j-i 相同的像素位于同一列
+    shift = rows if angle == 45 else (h - 1 - rows)
+    skewed[rows, cols + shift] = q
+    return skewed.ravel(order='F')
+
+
+def glrlm_matrices(q: np.ndarray, levels: int = DEFAULT_LEVELS,
+                   angles: Sequence[float] = DEFAULT_ANGLES) -> np.ndarray:
+    """
+    灰度游程矩阵
+
+    Returns:
+        (n_angles, levels, max_run) 计数矩阵，第 r 列对应游程长度 r+1
+    """
+    max_run = max(q.shape) if q.size else 1
+    matrices = []
+    for angle in angles:
+        line = _direction_lines(q, angle)
+        if line.size == 0:
+            matrices.append(np.zeros((levels, max_run)))
+            continue
+        starts = np.concatenate(([0], np.flatnonzero(line[1:] != line[:-1]) + 1))
+        lengths = np.diff(np.concatenate((starts, [line.size])))
+        values = line[starts]
+        keep = values >= 0
+        counts = np.bincount(values[keep] * max_run + lengths[keep] - 1, minlength=levels * max_run)
+        matrices.append(counts.reshape(levels, max_run).astype(np.float64))
+    return np.stack(matrices)
+
+
+def glrlm_features(q: np.ndarray, levels: int = DEFAULT_LEVELS,
+                   angles: Sequence[float] = DEFAULT_ANGLES) -> Dict[str, float]:
+    """由GLRLM计算游程特征（各方向取平均）"""
+    return glrlm_features_from_matrices(glrlm_matrices(q, levels, angles), levels, int(np.count_nonzero(q >= 0)))
+
+
+def glrlm_features_from_matrices(matrices, levels: int = DEFAULT_LEVELS, n_pixels: int = 0) -> Dict[str, float]:
+    """
+    由一组GLRLM计数矩阵（每个 (levels, max_run)）计算特征并取平均（2D/3D共用）
+
+    Args:
+        n_pixels: ROI像素/体素数（游程百分比的分母）
+    """
+    results = []
+    for matrix in matrices:
+        n_runs = matrix.sum()
+        if n_runs == 0:
+            continue
+        gray = np.arange(1, levels + 1, dtype=np.float64)
+        run = np.arange(1, matrix.shape[1] + 1, dtype=np.float64)
+        per_gray = matrix.sum(axis=1)
+        per_run = matrix.sum(axis=0)
+        results.append({
+            'short_run_emphasis': float(np.sum(per_run / run ** 2) / n_runs),
+            'long_run_emphasis': float(np.sum(per_run * run ** 2) / n_runs),
+            'gray_level_nonuniformity': float(np.sum(per_gray ** 2) / n_runs),
+            'run_length_nonuniformity': float(np.sum(per_run ** 2) / n_runs),
+            'run_percentage': float(n_runs / n_pixels) if n_pixels else 0.0,
+            'low_gray_level_run_emphasis': float(np.sum(per_gray / gray ** 2) / n_runs),
+            'high_gray_level_run_emphasis': float(np.sum(per_gray * gray ** 2) / n_runs)
+        })
+    return _average_features(results, ('short_run_emphasis', 'long_run_emphasis', 'gray_level_nonuniformity',
+                                       'run_length_nonuniformity', 'run_percentage',
+                                       'low_gray_level_run_emphasis', 'high_gray_level_run_emphasis'))
+
+
+# ------------------------------------------------------------
+# NGTDM
+# ------------------------------------------------------------
+def ngtdm_matrix(q: np.ndarray, levels: int = DEFAULT_LEVELS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    邻域灰度差分矩阵（3x3邻域，不含中心，只统计ROI内的邻居）
+
+    Returns:
+        (n, s): 每个灰度级的有效像素数 n_i 与差分和 s_i = Σ|i - Ā|
+    """
+    valid = (q >= 0).astype(np.float32)
+    gray = np.where(q >= 0, q + 1, 0).astype(np.float32)
+    kernel = np.ones((3, 3), dtype=np.float32)
+    kernel[1, 1] = 0
+    neighbor_sum = cv2.filter2D(gray, cv2.CV_32F, kernel, borderType=cv2.BORDER_CONSTANT)
+    neighbor_count = cv2.filter2D(valid, cv2.CV_32F, kernel, borderType=cv2.BORDER_CONSTANT)
+
+    use = (q >= 0) & (neighbor_count > 0)
+    levels_used = q[use]
+    diff = np.abs(gray[use] - neighbor_sum[use] / neighbor_count[use]).astype(np.float64)
+    n = np.bincount(levels_used, minlength=levels).astype(np.float64)
+    s = np.bincount(levels_used, weights=diff, minlength=levels)
+    return n, s
+
+
+def ngtdm_features(q: np.ndarray, levels: int = DEFAULT_LEVELS) -> Dict[str, float]:
+    """由NGTDM计算粗糙度、对比度、繁忙度、复杂度与强度"""
+    return ngtdm_features_from_matrix(*ngtdm_matrix(q, levels), levels=levels)
+
+
+def ngtdm_features_from_matrix(n: np.ndarray, s: np.ndarray, levels: int = DEFAULT_LEVELS) -> Dict[str, float]:
+    """由NGTDM的 n_i、s_i 计算特征（2D/3D共用）"""
+    n_valid = n.sum()
+    empty = {'coarseness': 0, 'contrast': 0, 'busyness': 0, 'complexity': 0, 'strength': 0}
+    if n_valid == 0:
+        return empty
+
+    present = n > 0
+    p = (n / n_valid)[present]
+    s = s[present]
+    gray = np.arange(1, levels + 1, dtype=np.float64)[present]
+    n_gray = int(present.sum())
+    ps = p * s
+    s_total = s.sum()
+
+    gi, gj = np.meshgrid(gray, gray, indexing='ij')
+    pi, pj = np.meshgrid(p, p, indexing='ij')
+    psi, psj = np.meshgrid(ps, ps, indexing='ij')
+
+    coarseness = 1.0 / ps.sum() if ps.sum() > 0 else 1e6
+    contrast = (float(np.sum(pi * pj * (gi - gj) ** 2)) / (n_gray * (n_gray - 1)) * s_total / n_valid) \
+        if n_gray > 1 else 0.0
+    busyness_denominator = np.sum(np.abs(gi * pi - gj * pj))
+    busyness = float(ps.sum() / busyness_denominator) if busyness_denominator > 0 else 0.0
+    complexity = float(np.sum(np.abs(gi - gj) * (psi + psj) / (pi + pj)) / n_valid)
+    strength = float(np.sum((pi + pj) * (gi - gj) ** 2) / s_total) if s_total > 0 else 0.0
+
+    return {
+        'coarseness': float(coarseness),
+        'contrast': float(contrast),
+        'busyness': busyness,
+        'complexity': complexity,
+        'strength': strength
+    }
+
+
+# ------------------------------------------------------------
+# 汇总
+# ------------------------------------------------------------
+def compute_texture_features(image: np.ndarray, mask: Optional[np.ndarray] = None,
+                             levels: int = DEFAULT_LEVELS, distances: Sequence[int] = (1,),
+                             angles: Sequence[float] = DEFAULT_ANGLES,
+                             quantized: Optional[np.ndarray] = None) -> Dict[str, Dict[str, float]]:
+    """
+    量化一次ROI，计算GLCM、GLRLM、NGTDM全部特征
+
+    Args:
+        quantized: 可选，已量化的ROI（如 FeatureContext.quantized），提供时跳过量化
+
+    Returns:
+        {'glcm_features': {...}, 'grlm_features': {...}, 'ngtdm_features': {...}}
+    """
+    q = quantized if quantized is not None else quantize_roi(image, mask, levels)
+    return {
+        'glcm_features': glcm_features(q, levels, distances, angles),
+        'grlm_features': glrlm_features(q, levels, angles),
+        'ngtdm_features': ngtdm_features(q, levels)
+    }
+
+
+def _average_features(results, keys) -> Dict[str, float]:
+    if not results:
+        return {key: 0 for key in keys}
+    return {key: float(np.mean([r[key] for r in results])) for key in keys}
@@ -0,0 +1,115 @@
+"""
+缩略图金字塔 - 医学影像的多尺寸预览
+上传后在后台任务中解码一次原始影像（DICOM/NIfTI中间切片/TIFF等），
+生成 64/256/1024 像素的缩略图（WebP，不支持时退回JPEG），
+列表页使用小尺寸缩略图，详情页使用最大一级作为预览图。
+"""
+
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image, features
+
+
+# 缩略图边长（长边像素）
+THUMBNAIL_SIZES = (64, 256, 1024)
+# 列表页使用的缩略图尺寸
+LIST_THUMBNAIL_SIZE = 256
+# 详情页预览图尺寸
+PREVIEW_SIZE = 1024
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+
+
+def thumbnail_format() -> str:
+    """缩略图格式：Pillow支持WebP时使用WebP，否则使用JPEG"""
+    return 'webp' if features.check('webp') else 'jpeg'
+
+
+def _extension(fmt: str) -> str:
+    return 'webp' if fmt == 'webp' else 'jpg'
+
+
+def thumbnail_path(filepath: str, size: int, fmt: Optional[str] = None) -> str:
+    """缩略图文件路径（与原图同目录：<原文件名>_thumb<size>.<ext>）"""
+    return f"{os.path.splitext(filepath)[0]}_thumb{size}.{_extension(fmt or thumbnail_format())}"
+
+
+def find_thumbnail(filepath: str, size: int) -> Optional[str]:
+    """查找已生成的指定尺寸缩略图，不存在时返回None"""
+    for fmt in ('webp', 'jpeg'):
+        path = thumbnail_path(filepath, size, fmt)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def all_thumbnail_paths(filepath: str) -> List[str]:
+    """所有可能的缩略图路径（删除影像时清理）"""
+    return [thumbnail_path(filepath, size, fmt) for size in THUMBNAIL_SIZES for fmt in ('webp', 'jpeg')]
+
+
+def _to_uint8(array: np.ndarray) -> np.ndarray:
+    """线性归一化到0-255"""
+    array = array.astype(np.float32)
+    mn, mx = float(array.min()), float(array.max())
+    norm = (array - mn) / (mx - mn + 1e-6)
+    return (norm * 255.0).clip(0, 255).astype(np.uint8)
+
+
+def load_preview_image(filepath: str) -> Image.Image:
+    """
+    解码影像为8位PIL图像（NIfTI取中间切片，4D取第一个时间点；DICOM与16位TIFF归一化）
+
+    Raises:
+        无法解码时抛出原始异常
+    """
+    lower_name = filepath.lower()
+    if lower_name.endswith(('.nii', '.nii.gz')):
+        from utils.nifti_volume import open_nifti
+        # 只读取中间切片，不加载整个体积
+        with open_nifti(filepath) as nifti:
+            return Image.fromarray(_to_uint8(nifti.middle_slice()))
+
+    if lower_name.endswith('.dcm'):
+        import pydicom
+        ds = pydicom.dcmread(filepath)
+        return Image.fromarray(_to_uint8(ds.pixel_array))
+
+    image = Image.open(filepath)
+    if image.mode in ('L', 'RGB'):
+        return image
+    if image.mode in ('RGBA', 'LA', 'P', 'PA', 'CMYK', 'YCbCr', '1'):
+        return image.convert('RGB')
+    # 16位/浮点灰度等
+    return Image.fromarray(_to_uint8(np.asarray(image)))
+
+
+def _save(image: Image.Image, path: str, fmt: str):
+    """写入临时文件后原子替换（缩略图目录对外提供静态访问，避免读到未写完的文件）"""
+    tmp_path = f"{path}.tmp"
+    if fmt == 'webp':
+        image.save(tmp_path, format='WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        image.save(tmp_path, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+
+def generate_thumbnails(filepath: str, sizes: Sequence[int] = THUMBNAIL_SIZES) -> Dict[int, str]:
+    """
+    生成缩略图金字塔（只解码一次，从大到小逐级缩放；小于目标尺寸的影像不放大）
+
+    Returns:
+        {尺寸: 缩略图路径}
+    """
+    fmt = thumbnail_format()
+    image = load_preview_image(filepath)
+    paths = {}
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.LANCZOS)
+        path = thumbnail_path(filepath, size, fmt)
+        _save(image, path, fmt)
+        paths[size] = path
+    return paths
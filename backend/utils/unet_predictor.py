@@ -4,12 +4,15 @@ UNet脑肿瘤分割预测器
 """
 
 import os
+import time
 import cv2
 import torch
 import numpy as np
 from torch import nn
 from torchvision.models import resnext50_32x4d
 
+from utils.inference_telemetry import get_inference_telemetry
+
 
 class ConvRelu(nn.Module):
     """卷积+ReLU模块"""
@@ -114,6 +117,7 @@ class UNetPredictor:
         """
         self.device = device
         self.threshold = threshold
+        self.weight_path = weight_path
         
         # 初始化模型
         print(f"加载UNet模型: {weight_path}")
@@ -174,6 +178,7 @@ class UNetPredictor:
             result: 结果字典（与YOLO格式兼容）
         """
         # 读取图像
+        t0 = time.perf_counter()
         image = cv2.imread(image_path)
         if image is None:
             raise ValueError(f"无法读取图像: {image_path}")
@@ -183,11 +188,13 @@ class UNetPredictor:
         
         # 预处理
         img_tensor, _ = self.preprocess_image(image)
+        t1 = time.perf_counter()
         
         # 推理
         with torch.no_grad():
             pred_prob = self.model(img_tensor)
             pred_prob = pred_prob.cpu().numpy()[0, 0]
+        t2 = time.perf_counter()
         
         # 二值化 - 与训练代码一致
         pred_mask = np.copy(pred_prob)
@@ -258,6 +265,9 @@ class UNetPredictor:
             'metrics': metrics,
             'tumor_detected': bool(tumor_pixels > (total_pixels * 0.001))  # 转换为Python bool
         }
+
+        get_inference_telemetry().record('unet', self.weight_path, kind='image', preprocess=t1 - t0,
+                                         forward=t2 - t1, postprocess=time.perf_counter() - t2)
         
         return pred_mask, pred_prob, result
     
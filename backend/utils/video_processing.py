@@ -11,6 +11,9 @@ import base64
 from PIL import Image
 import io
 
+from utils.inference_telemetry import get_inference_telemetry
+from utils.model_registry import inference_lock
+
 
 class VideoProcessor:
     """视频处理类"""
@@ -25,8 +28,8 @@ class VideoProcessor:
         self.model = None
         if model_path and os.path.exists(model_path):
             try:
-                from ultralytics import YOLO
-                self.model = YOLO(model_path)
+                from utils.model_registry import get_model_registry
+                self.model = get_model_registry().get(model_path, 'yolo')
                 print(f"[成功] YOLO模型加载成功: {model_path}")
             except Exception as e:
                 print(f"YOLO模型加载失败: {e}")
@@ -118,11 +121,13 @@ class VideoProcessor:
             }
         
         try:
-            results = self.model.predict(
-                source=frame,
-                conf=conf_threshold,
-                verbose=False
-            )
+            with inference_lock(self.model):
+                results = self.model.predict(
+                    source=frame,
+                    conf=conf_threshold,
+                    verbose=False
+                )
+            get_inference_telemetry().record_ultralytics('yolo', self.model, results, kind='video_frame')
             
             result = results[0]
             
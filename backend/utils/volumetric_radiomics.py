@@ -0,0 +1,357 @@
+"""
+三维体积影像组学模块
+对NIfTI肿瘤掩码提取3D形状、一阶统计与3D纹理（GLCM/GLRLM/NGTDM，13个方向、26邻域）特征。
+只读取掩码包围盒范围内的切片块；纹理矩阵按切片块（带1层重叠）与游程方向拆分为子任务，
+在进程级特征计算池（utils.feature_pool）中并行计算后累加。
+"""
+
+import os
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import ndimage
+from scipy.stats import kurtosis, skew
+from skimage import measure
+
+from utils.feature_pool import get_feature_pool
+from utils.mesh_metrics import compute_mesh_metrics
+from utils.nifti_volume import open_nifti
+from utils.texture_matrices import (
+    DEFAULT_LEVELS,
+    glcm_features_from_matrices,
+    glrlm_features_from_matrices,
+    ngtdm_features_from_matrix
+)
+
+
+# 3D的13个不重复方向 (dz, dy, dx)，与其反方向合起来覆盖26邻域
+DIRECTIONS_3D: Tuple[Tuple[int, int, int], ...] = tuple(
+    (dz, dy, dx)
+    for dz in (0, 1) for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+    if (dz, dy, dx) > (0, 0, 0)
+)
+
+# ROI包围盒体素数低于该值时串行计算（进程池启动开销大于收益）
+MIN_PARALLEL_VOXELS = 64 ** 3
+
+
+def extract_volumetric_radiomics(image_source, mask_volume: np.ndarray, spacing: Sequence[float] = (1.0, 1.0, 1.0),
+                                 levels: int = DEFAULT_LEVELS, slab_size: int = 32,
+                                 max_workers: int = 2) -> Optional[Dict]:
+    """
+    提取三维影像组学特征
+
+    Args:
+        image_source: NIfTI文件路径（按切片块只读取包围盒范围）或 (H, W, D) 体积数组
+        mask_volume: (H, W, D) 肿瘤掩码，非零为肿瘤
+        spacing: 与 (H, W, D) 三个轴对应的体素间距
+        levels: 纹理量化灰度级数
+        slab_size: 纹理子任务的切片块厚度
+        max_workers: <=1 时在当前进程串行计算；否则使用进程级特征计算池（大小由 RADIOMICS_WORKERS 配置）
+
+    Returns:
+        {'first_order_features', 'shape_features', 'texture_features', 'roi', 'extraction_timestamp'}，
+        掩码为空时返回None
+    """
+    roi_mask = np.asarray(mask_volume) > 0
+    bbox = _mask_bbox_3d(roi_mask)
+    if bbox is None:
+        return None
+    (r0, r1), (c0, c1), (z0, z1) = bbox
+
+    # (H, W, D) -> (D, H, W)，切片轴放在第0维便于按块拆分
+    image = np.moveaxis(_read_bbox(image_source, bbox), 2, 0)
+    roi = np.moveaxis(roi_mask[r0:r1, c0:c1, z0:z1], 2, 0)
+    voxel_spacing = (float(spacing[2]), float(spacing[0]), float(spacing[1]))
+
+    values = image[roi].astype(np.float64)
+    q = _quantize_volume(image, roi, values, levels)
+
+    texture = _texture_features_3d(q, levels, slab_size, max_workers)
+
+    return {
+        'first_order_features': _first_order_features_3d(values, q[roi], levels, float(np.prod(voxel_spacing))),
+        'shape_features': _shape_features_3d(roi, voxel_spacing),
+        'texture_features': texture,
+        'roi': {
+            'rows': [r0, r1],
+            'cols': [c0, c1],
+            'slices': [z0, z1],
+            'voxel_count': int(values.size),
+            'levels': levels
+        },
+        'extraction_timestamp': datetime.utcnow().isoformat()
+    }
+
+
+# ------------------------------------------------------------
+# 读取与量化
+# ------------------------------------------------------------
+def _mask_bbox_3d(roi_mask: np.ndarray):
+    """掩码非零区域包围盒 ((r0, r1), (c0, c1), (z0, z1))，空掩码返回None"""
+    ranges = []
+    for axis in range(3):
+        other = tuple(a for a in range(3) if a != axis)
+        present = np.flatnonzero(np.any(roi_mask, axis=other))
+        if present.size == 0:
+            return None
+        ranges.append((int(present[0]), int(present[-1]) + 1))
+    return tuple(ranges)
+
+
+def _read_bbox(image_source, bbox) -> np.ndarray:
+    """读取包围盒范围的体积数据；文件路径时只读取 [z0, z1) 切片块"""
+    (r0, r1), (c0, c1), (z0, z1) = bbox
+    if isinstance(image_source, np.ndarray):
+        return image_source[r0:r1, c0:c1, z0:z1]
+
+    crops = []
+    with open_nifti(image_source) as nifti:
+        for _, _, slab in nifti.iter_slabs(slab_size=16, axis=2, start=z0, stop=z1):
+            crops.append(np.array(slab[r0:r1, c0:c1, :]))
+    return np.concatenate(crops, axis=2)
+
+
+def _quantize_volume(image: np.ndarray, roi: np.ndarray, values: np.ndarray, levels: int) -> np.ndarray:
+    """ROI量化为 0..levels-1（固定灰度级数），ROI外为 -1"""
+    q = np.full(image.shape, -1, dtype=np.int16)
+    vmin, vmax = float(values.min()), float(values.max())
+    if vmax > vmin:
+        q[roi] = np.clip(np.floor((values - vmin) / (vmax - vmin) * levels), 0, levels - 1).astype(np.int16)
+    else:
+        q[roi] = 0
+    return q
+
+
+# ------------------------------------------------------------
+# 一阶与形状特征
+# ------------------------------------------------------------
+def _first_order_features_3d(values: np.ndarray, q_values: np.ndarray, levels: int,
+                             voxel_volume: float) -> Dict[str, float]:
+    """体素强度一阶统计；熵与均匀度基于量化灰度直方图（与原始强度范围无关）"""
+    p10, p25, median, p75, p90 = np.percentile(values, [10, 25, 50, 75, 90])
+    hist = np.bincount(q_values.astype(np.int64), minlength=levels).astype(np.float64)
+    prob = hist[hist > 0] / hist.sum()
+    energy = float(np.sum(values ** 2))
+    return {
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'median': float(median),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'range': float(values.max() - values.min()),
+        'skewness': float(skew(values)) if values.size > 2 else 0.0,
+        'kurtosis': float(kurtosis(values)) if values.size > 3 else 0.0,
+        'p10': float(p10),
+        'p25': float(p25),
+        'p75': float(p75),
+        'p90': float(p90),
+        'interquartile_range': float(p75 - p25),
+        'mean_absolute_deviation': float(np.mean(np.abs(values - values.mean()))),
+        'rms': float(np.sqrt(energy / values.size)),
+        'energy': energy,
+        'total_energy': energy * voxel_volume,
+        'entropy': float(-np.sum(prob * np.log2(prob))),
+        'uniformity': float(np.sum(prob ** 2))
+    }
+
+
+def _shape_features_3d(roi: np.ndarray, voxel_spacing: Tuple[float, float, float]) -> Dict[str, float]:
+    """三维形状特征：网格表面积/体积、球形度、最大直径、主轴长度等"""
+    voxel_volume = float(np.count_nonzero(roi) * np.prod(voxel_spacing))
+    features = {'voxel_volume': voxel_volume}
+
+    # 四周补一层背景保证等值面闭合
+    padded = np.pad(roi.astype(np.float32), 1)
+    try:
+        vertices, faces, _, _ = measure.marching_cubes(padded, level=0.5, spacing=voxel_spacing)
+        metrics = compute_mesh_metrics(vertices, faces)
+        area, mesh_volume = metrics['surface_area'], metrics['mesh_volume']
+        features.update({
+            'surface_area': area,
+            'mesh_volume': mesh_volume,
+            'surface_volume_ratio': area / mesh_volume if mesh_volume > 0 else 0.0,
+            'sphericity': metrics['sphericity'],
+            'compactness': float(36 * np.pi * mesh_volume ** 2 / area ** 3) if area > 0 else 0.0,
+            'maximum_3d_diameter': _maximum_diameter(vertices)
+        })
+    except (ValueError, RuntimeError) as e:
+        # 体素过少无法生成等值面
+        print(f"3D形状特征网格计算失败: {e}")
+
+    # 主成分分析得到主轴长度
+    coords = np.argwhere(roi).astype(np.float64) * np.asarray(voxel_spacing)
+    if len(coords) > 3:
+        eigen = np.sort(np.clip(np.linalg.eigvalsh(np.cov(coords, rowvar=False)), 0, None))[::-1]
+        major, minor, least = eigen
+        features.update({
+            'major_axis_length': float(4 * np.sqrt(major)),
+            'minor_axis_length': float(4 * np.sqrt(minor)),
+            'least_axis_length': float(4 * np.sqrt(least)),
+            'elongation': float(np.sqrt(minor / major)) if major > 0 else 0.0,
+            'flatness': float(np.sqrt(least / major)) if major > 0 else 0.0
+        })
+    return features
+
+
+def _maximum_diameter(vertices: np.ndarray, block: int = 1024) -> float:
+    """网格顶点间最大距离（先取凸包顶点，再分块计算两两距离）"""
+    from scipy.spatial import ConvexHull, QhullError
+
+    try:
+        points = vertices[ConvexHull(vertices).vertices]
+    except (QhullError, ValueError):
+        points = vertices
+    best = 0.0
+    for start in range(0, len(points), block):
+        chunk = points[start:start + block]
+        dist = np.sqrt(((chunk[:, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+        best = max(best, float(dist.max()))
+    return best
+
+
+# ------------------------------------------------------------
+# 3D纹理
+# ------------------------------------------------------------
+def _texture_features_3d(q: np.ndarray, levels: int, slab_size: int, max_workers: int) -> Dict[str, Dict]:
+    """拆分子任务（切片块：GLCM+NGTDM；游程方向：GLRLM），并行计算后累加并求特征"""
+    depth = q.shape[0]
+    slab_size = max(1, int(slab_size))
+    tasks = []
+    for start in range(0, depth, slab_size):
+        stop = min(start + slab_size, depth)
+        lo = max(start - 1, 0)
+        hi = min(stop + 1, depth)
+        # 前后各带1层重叠切片：邻域/像素对跨块时可见，但只统计本块拥有的切片
+        tasks.append((_slab_texture_task, (lo, hi), (start - lo, stop - lo, levels)))
+    for direction in DIRECTIONS_3D:
+        tasks.append((_glrlm_direction_task, None, (direction, levels)))
+
+    parallel = max_workers > 1 and (os.cpu_count() or 1) > 1 and q.size >= MIN_PARALLEL_VOXELS
+    results = _run_tasks(q, tasks, parallel)
+
+    n_slabs = len(tasks) - len(DIRECTIONS_3D)
+    glcm = sum(r[0] for r in results[:n_slabs])
+    n = sum(r[1] for r in results[:n_slabs])
+    s = sum(r[2] for r in results[:n_slabs])
+    glrlm = results[n_slabs:]
+
+    return {
+        'glcm_features': glcm_features_from_matrices(glcm + glcm.transpose(0, 2, 1), levels),
+        'grlm_features': glrlm_features_from_matrices(glrlm, levels, int(np.count_nonzero(q >= 0))),
+        'ngtdm_features': ngtdm_features_from_matrix(n, s, levels)
+    }
+
+
+def _call_task(func, z_range, args, volume):
+    """在量化体积上执行子任务；z_range 为None时使用整个体积"""
+    if z_range is not None:
+        volume = volume[z_range[0]:z_range[1]]
+    return func(volume, *args)
+
+
+def _run_tasks(q: np.ndarray, tasks: List, parallel: bool) -> List:
+    """
+    执行子任务（保持顺序）
+
+    并行时交给进程级特征计算池（量化体积经共享内存传递，子任务不限时）；
+    进程池中失败的子任务在当前进程重新计算，累加结果不缺块。
+    """
+    if not parallel:
+        return [_call_task(func, z_range, args, volume=q) for func, z_range, args in tasks]
+
+    named = {
+        f'texture_task_{i}': partial(_call_task, func, z_range, args)
+        for i, (func, z_range, args) in enumerate(tasks)
+    }
+    results, failures = get_feature_pool().run(named, {'volume': q}, timeout=0)
+    for name in failures:
+        results[name] = named[name](volume=q)
+    return [results[name] for name in named]
+
+
+def _shift(array: np.ndarray, offset: Sequence[int], fill) -> np.ndarray:
+    """out[p] = array[p - offset]，越界位置填充 fill"""
+    out = np.full(array.shape, fill, dtype=array.dtype)
+    src, dst = [], []
+    for size, o in zip(array.shape, offset):
+        if o >= 0:
+            src.append(slice(0, size - o))
+            dst.append(slice(o, size))
+        else:
+            src.append(slice(-o, size))
+            dst.append(slice(0, size + o))
+    out[tuple(dst)] = array[tuple(src)]
+    return out
+
+
+def _slab_texture_task(chunk: np.ndarray, lo: int, hi: int, levels: int):
+    """
+    子任务：切片块的13方向GLCM计数与NGTDM
+
+    Args:
+        chunk: 含前后重叠切片的量化块 (d, H, W)
+        lo, hi: 本块拥有的切片在 chunk 中的范围
+
+    Returns:
+        (glcm: (13, levels, levels) 非对称计数, n: (levels,), s: (levels,))
+    """
+    depth, height, width = chunk.shape
+    glcm = np.zeros((len(DIRECTIONS_3D), levels, levels), dtype=np.float64)
+    for k, (dz, dy, dx) in enumerate(DIRECTIONS_3D):
+        z_end = min(hi, depth - dz)
+        if z_end <= lo:
+            continue
+        ys, yn = (slice(0, height - dy), slice(dy, height)) if dy >= 0 else (slice(-dy, height), slice(0, height + dy))
+        xs, xn = (slice(0, width - dx), slice(dx, width)) if dx >= 0 else (slice(-dx, width), slice(0, width + dx))
+        a = chunk[lo:z_end, ys, xs]
+        b = chunk[lo + dz:z_end + dz, yn, xn]
+        pair = (a >= 0) & (b >= 0)
+        counts = np.bincount(a[pair].astype(np.int64) * levels + b[pair], minlength=levels * levels)
+        glcm[k] = counts.reshape(levels, levels)
+
+    # NGTDM：26邻域（不含中心）内ROI体素的平均灰度
+    valid = chunk >= 0
+    gray = np.where(valid, chunk + 1, 0).astype(np.float64)
+    kernel = np.ones((3, 3, 3))
+    kernel[1, 1, 1] = 0
+    neighbor_sum = ndimage.correlate(gray, kernel, mode='constant', cval=0.0)[lo:hi]
+    neighbor_count = ndimage.correlate(valid.astype(np.float64), kernel, mode='constant', cval=0.0)[lo:hi]
+    owned = chunk[lo:hi]
+    use = (owned >= 0) & (neighbor_count > 0)
+    level_index = owned[use].astype(np.int64)
+    diff = np.abs(gray[lo:hi][use] - neighbor_sum[use] / neighbor_count[use])
+    n = np.bincount(level_index, minlength=levels).astype(np.float64)
+    s = np.bincount(level_index, weights=diff, minlength=levels)
+    return glcm, n, s
+
+
+def _glrlm_direction_task(q: np.ndarray, direction: Tuple[int, int, int], levels: int) -> np.ndarray:
+    """
+    子任务：单一方向的3D灰度游程矩阵
+
+    把方向的第一个非零分量（+1）所在轴换到第0维，沿该轴从末端向前递推
+    每个体素到游程末尾的长度，再在游程起点（前一体素灰度不同或越界）处累加。
+
+    Returns:
+        (levels, max_run) 计数矩阵
+    """
+    max_run = max(q.shape)
+    axis = next(i for i, d in enumerate(direction) if d != 0)
+    order = (axis,) + tuple(i for i in range(3) if i != axis)
+    qt = np.transpose(q, order)
+    offset = tuple(direction[i] for i in order)
+
+    following = _shift(qt, tuple(-o for o in offset), -2)
+    same = (qt >= 0) & (qt == following)
+
+    lengths = np.ones(qt.shape, dtype=np.int32)
+    in_plane = tuple(-o for o in offset[1:])
+    for k in range(qt.shape[0] - 2, -1, -1):
+        lengths[k] = np.where(same[k], 1 + _shift(lengths[k + 1], in_plane, 0), 1)
+
+    starts = (qt >= 0) & ~_shift(same, offset, False)
+    counts = np.bincount(qt[starts].astype(np.int64) * max_run + lengths[starts] - 1, minlength=levels * max_run)
+    return counts.reshape(levels, max_run).astype(np.float64)